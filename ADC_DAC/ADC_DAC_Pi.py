@@ -6,8 +6,10 @@ Date: 21st November 2016
 '''
 
 
-from ABE_ADCDACPi import ADCDACPi
 import time
+import Clock_Service as Clock
+import Lazy_Import as Lazy
+ABE = Lazy.module('ABE_ADCDACPi')
 import numpy as np
 import sys
 
@@ -22,7 +24,7 @@ class DetectPi:
 		'''
 		
 		# Create instance of ADCDACPi, with gain set to 1
-		self.adcdac = ADCDACPi(1)
+		self.adcdac = ABE.ADCDACPi(1)
 		
 		# Set reference voltage to 3.3 V
 		self.adcdac.set_adc_refvoltage(3.3)
@@ -82,7 +84,7 @@ class DetectPi:
 		# Read voltage from channel <channel> in single ended mode
 		voltRead = self.adcdac.read_adc_voltage(channel, 0)
 		
-		return np.float(voltRead), time.time()
+		return np.float(voltRead), Clock.timestamp()
 		
 	
 	def streamRead(self, scanRate, scansPerRead, Port):
@@ -103,14 +105,14 @@ class DetectPi:
 		# Determine timing characteristics
 		duration = scansPerRead/float(scanRate)
 		dt = 1/float(scanRate)
-		StartingMoment = time.time()
+		StartingMoment = Clock.timestamp()
 		
 		# Allow for alternation between multiple ports
 		portIndex = 0
 		portLength = len(Port)
 		
 		# Loop for the duration
-		while (time.time()-StartingMoment) < duration:
+		while (Clock.timestamp()-StartingMoment) < duration:
 			# Read the ADC value and append to an array
 			voltRead = self.readPort(Port[portIndex])[0]
 			Read[0].append(voltRead)
@@ -118,12 +120,12 @@ class DetectPi:
 			
 			# Wait for the program to run at the correct frequency
 			lastReadTime = readTime
-			readTime = time.time()
+			readTime = Clock.timestamp()
 			if readTime - lastReadTime < dt:
 				time.sleep(dt - readTime + lastReadTime)
 			
 		# Calculate and print elapsed time
-		FinishingMoment = time.time()
+		FinishingMoment = Clock.timestamp()
 		print ('Elapsed time %f seconds' % (FinishingMoment - StartingMoment))
 		
 		return Read, StartingMoment, FinishingMoment
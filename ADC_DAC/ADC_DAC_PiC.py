@@ -8,12 +8,16 @@ Date: 14th December 2016
 
 import ctypes
 import time
+import Clock_Service as Clock
 import numpy as np
 import sys
 
 
 class DetectPi:
 	
+	# The only outputs of the ADC-DAC Pi (it has no digital ports)
+	Output_Ports = ['DAC0', 'DAC1']
+	
 	def __init__(self):
 		'''
 		Initialise ADC-DAC Pi. The DAC gain factor is set to 1, which allows 
@@ -85,6 +89,23 @@ class DetectPi:
 		return
 		
 	
+	def triggerPulse(self, Port, Pulse_Width = 0.0001):
+		'''
+		Generate a single 3.3 V pulse on a DAC pin, to be used as the 
+		trigger of an external device (e.g. the spectrometer). The ADC-DAC 
+		Pi has no digital ports, so a free DAC channel (see Output_Ports) 
+		must be used. Pulse_Width is in seconds. Returns the time of the rising edge.
+		'''
+		
+		# Raise the DAC output and hold it with the C sleep
+		self.writePort(Port, 3.299)
+		risingEdge = Clock.timestamp()
+		self.adclib.c_sleep(ctypes.c_long(long(Pulse_Width*1e9)))
+		self.writePort(Port, 0)
+		
+		return risingEdge
+		
+	
 	def readPort(self, Port):
 		'''
 		Read values from an ADC pin. Values may be read from either channel 1 
@@ -108,7 +129,7 @@ class DetectPi:
 		self.adclib.read_adc_voltage.restype = ctypes.c_double
 		voltRead = self.adclib.read_adc_voltage(ctypes.c_int(channel), ctypes.c_int(0))
 		
-		return np.float(voltRead), time.time()
+		return np.float(voltRead), Clock.timestamp()
 		
 	
 	def streamRead(self, scanRate, scansPerRead, Port):
@@ -148,8 +169,8 @@ class DetectPi:
 		dt = 1/float(scanRate*portLength)
 		
 		# Loop for the duration
-		StartingMoment = time.time()
-		lastReadTime = time.clock()
+		StartingMoment = Clock.timestamp()
+		lastReadTime = Clock.timestamp()
 		offerr = 15e-6
 		while totIndex < totScans:
 			# Read the ADC value and append to an array
@@ -160,18 +181,18 @@ class DetectPi:
 			totIndex += 1
 			
 			# Wait for the program to run at the correct frequency
-			readTime = time.time()
+			readTime = Clock.timestamp()
 			if readTime - lastReadTime < dt:
-				secs = long((dt - time.time() + lastReadTime - offerr) * 1e9)
+				secs = long((dt - Clock.timestamp() + lastReadTime - offerr) * 1e9)
 				lastReadTime = readTime
-				startt = time.time()
+				startt = Clock.timestamp()
 				self.adclib.c_sleep(ctypes.c_long(secs))
 			else:
 				lastReadTime = readTime
 			
 			
 		# Calculate and print elapsed time
-		FinishingMoment = time.time()
+		FinishingMoment = Clock.timestamp()
 		print ('Elapsed time %f seconds' % (FinishingMoment - StartingMoment))
 		
 		return Read, StartingMoment, FinishingMoment
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition session engine for the DAQT7, ADC_DAC Pi, spectrometer and power meter.
+The scripts used to repeat the same pattern: module level globals, one forked Process per device and Value/Array flags.
+A session registers any mix of the devices, reads each of them in a supervised worker process into its own growable shared memory buffer
+(see Chunked_Buffer.py) and returns one record (a dictionary per device) which can be saved in a single HDF5 file.
+
+To use this class, following syntax is recommended:
+import Acquisition_Session as AS
+Session = AS.AcquisitionSession()                      # Or AS.AcquisitionSession(Realtime = {'DAQ': {'CPU': [3], 'Policy': 'fifo'}}), see Realtime_Priority.py
+Session.addDevice('DAQT7', DAQ1, No_Sample = 2000, Port = 'AIN1')                                  # Polled readPort
+Session.addDevice('DAQT7', DAQ1, No_Sample = 20000, Port = ['AIN0', 'AIN1'], Stream_Rate = 10000)   # streamRead (internal buffer of the DAQ)
+With several ports the Signal of the DAQ has one column per port, and its TimeIndex one column of time stamps per port
+Session.addDevice('Spectrometer', Spec1, No_Sample = 100)
+Session.addDevice('PM100_PowerMeter', Power_meter, No_Sample = None)                             # Read until Session.stop()
+Session.start()
+Session.wait()                  # Or Session.stop() to finish the recording earlier
+Record = Session.records()      # Record['Spectrometer']['Signal'], Record['Spectrometer']['TimeIndex'], ...
+Session.Clock.edgeOffset('Spectrometer', DAQ_Time, DAQ_Signal, Spec_Time, Spec_Signal)    # Optional, see Clock_Service.py
+Session.save(File_name)
+Session.close()                 # Frees the shared memory buffers
+
+Devices which are not one of the above can be added with Session.addReader(Name, Reader, Width, No_Sample), where Reader() returns (values, time).
+"""
+
+import json
+import traceback
+import numpy as np
+import Clock_Service as Clock
+import Realtime_Priority as RP
+import Chunked_Buffer as CB
+import HDF5_FileWriter as HW
+from multiprocessing import Process, Event, Queue
+
+
+# Name of the signal and time datasets of each kind of device. The spectrometer and power meter datasets have the names of the recordings
+# made by Optrode_Version2.py; the DAQ signal, which may hold several ports, is Voltages as in Universal_Reader.py and DanielFlashReading.py
+# (Optrode_Version2.py names its single photodiode port PhotoDiode)
+Dataset_Names = {'DAQ': ('Voltages', 'TimeIndex'),
+                 'Spectrometer': ('Intensities', 'Time_Index'),
+                 'PowerMeter': ('Power', 'TimeIndex'),
+                 'Reader': ('Signal', 'TimeIndex')}
+
+# Encoding of the signal of each kind of device (see HDF5_FileWriter.Encodings); the DAQ of a DetectPi is saved as the raw 12 bits codes
+# and the spectra, which are read with the dark count and nonlinearity corrections, as floats
+Default_Encodings = {'DAQ': 'float32',
+                     'Spectrometer': 'float32',
+                     'PowerMeter': 'float32',
+                     'Reader': None}
+
+
+def defaultEncoding(Kind, Device = None):
+    ''' Returning the encoding of the signal of a device '''
+    if type(Device).__name__ == 'DetectPi':
+        return 'adc12'
+    return Default_Encodings.get(Kind)
+
+
+def deviceKind(Device):
+    ''' Returning the kind of a device from the functions it offers '''
+    if hasattr(Device, 'readIntensity'):
+        return 'Spectrometer'
+    elif hasattr(Device, 'readPower'):
+        return 'PowerMeter'
+    elif hasattr(Device, 'readPort'):
+        return 'DAQ'
+    raise Exception('%s is not a DAQT7, DetectPi, DetectSpectrometer or DetectPM100D device' % type(Device).__name__)
+
+
+def readPorts(Device, Port):
+    ''' Reading several ports of a DAQ one after the other. Returns the values followed by the time of each reading, and the time of the first one. '''
+    Row = np.zeros(2*len(Port), dtype = float)
+    for I in range(len(Port)):
+        Row[I], Row[len(Port) + I] = Device.readPort(Port[I])
+    return Row, Row[len(Port)]
+
+
+def deviceDetails(Device):
+    ''' Returning the details of a device as a string (the devices do not share the same function) '''
+    try:
+        if hasattr(Device, 'getDetails'):
+            return str(Device.getDetails())
+        elif hasattr(Device, 'readDetails'):
+            return str(Device.readDetails())
+    except Exception as e:
+        return 'Details are not available: %s' % e
+    return ''
+
+
+def readChannel(Channel, Stop_Event):
+    ''' Reading the device of a channel into its buffer, until No_Sample readings or Stop_Event '''
+    Buffer = Channel['Buffer']
+    if Channel['Stream_Rate'] is not None:
+        # Stream mode: one call reads all the samples, the time index is rebuilt from the scan rate
+        Ports = len(Channel['Port'])
+        Read, Starting, Finishing = Channel['Device'].streamRead(Channel['Stream_Rate'], Channel['No_Sample']//Ports, Channel['Port'])
+        Values = np.asarray(Read[0], dtype = float)
+        Times = np.linspace(Starting, Finishing, len(Values))
+        if Ports == 1:
+            Buffer.extend(Values, Times)
+        else:
+            # The samples of the ports are interleaved: scans x ports, each sample keeps its own time stamp
+            Scans = len(Values)//Ports
+            Values = Values[:Scans*Ports].reshape(Scans, Ports)
+            Times = Times[:Scans*Ports].reshape(Scans, Ports)
+            Buffer.extend(np.hstack([Values, Times]), Times[:, 0])
+        return
+    Reader = Channel['Reader']
+    No_Sample = Channel['No_Sample']
+    while (No_Sample is None or len(Buffer) < No_Sample) and not Stop_Event.is_set():
+        Buffer.append(*Reader())
+
+
+# ######## The worker that reads one device into its shared memory buffer ########
+def Worker_Process(Channel, Stop_Event, Error_Queue, Settings = None, Report_Queue = None):
+    try:
+        if Settings:
+            Report = RP.configureWorker(Channel['Name'], Settings)
+            Report_Queue.put((Channel['Name'], Report))
+        readChannel(Channel, Stop_Event)
+        if Settings and Settings.get('Measure_Latency'):
+            Report_Queue.put((Channel['Name'], RP.measureWorker(Report, Settings)))      # After the acquisition, so it does not delay it
+    except Exception:
+        Error_Queue.put((Channel['Name'], traceback.format_exc()))
+
+
+class AcquisitionSession:
+    '''
+    Registering the devices, reading them in parallel worker processes and collecting their records
+    '''
+    def __init__(self, Realtime = None):
+        '''
+        Realtime is a dictionary of CPU affinity, priority and memory locking settings (see Realtime_Priority.py) for each
+        device Name or Kind ('DAQ', 'Spectrometer', 'PowerMeter', 'Reader'). The devices without settings use the default scheduling.
+        '''
+        self.Channels = []
+        self.Workers = []
+        self.Stop_Event = Event()
+        self.Error_Queue = Queue()
+        self.Errors = {}
+        self.Realtime = Realtime or {}
+        self.Report_Queue = Queue()
+        self.Realtime_Reports = {}
+        self.Time_Zero = 0
+        self.Time_End = 0
+        self.Clock = Clock.ClockService()      # Epoch mapping of the session and the offsets of the devices
+
+    def addDevice(self, Name, Device, No_Sample, Port = None, Stream_Rate = None, Encoding = None):
+        '''
+        Registering a DAQT7, DetectPi, DetectSpectrometer or DetectPM100D device. Name is also the HDF5 group of the device.
+        No_Sample is the number of readings; with None the device is read until stop() is called.
+        Port is the AIN port(s) of the DAQ, one column of the signal per port. With Stream_Rate (Hz) the DAQ is read by streamRead
+        instead of readPort (No_Sample, the total number of samples of all the ports, is then required).
+        Encoding is the encoding of the saved signal (see HDF5_FileWriter.Encodings), by default the one of defaultEncoding.
+        '''
+        Kind = deviceKind(Device)
+        if Kind == 'Spectrometer':
+            Width = len(Device.Handle.wavelengths())
+            Reader = lambda: Device.readIntensity(True, True)
+        elif Kind == 'PowerMeter':
+            Width = 1
+            Reader = Device.readPower
+        else:
+            if type(Port) == str:
+                Port = [Port]
+            Width = len(Port)
+            if Width == 1:
+                Reader = lambda: Device.readPort(Port)
+            else:
+                Reader = lambda: readPorts(Device, Port)
+        return self.addReader(Name, Reader, Width, No_Sample, Kind = Kind, Device = Device, Port = Port, Stream_Rate = Stream_Rate,
+                              Encoding = Encoding or defaultEncoding(Kind, Device))
+
+    def addReader(self, Name, Reader, Width, No_Sample, Kind = 'Reader', Device = None, Port = None, Stream_Rate = None, Encoding = None):
+        '''
+        Registering any function Reader() that returns (values, time), where values has Width elements.
+        With several DAQ ports the rows of the buffer also hold the time stamp of every port after the values (see readPorts).
+        '''
+        No_Sample = None if No_Sample is None else int(No_Sample)
+        Buffer_Width = 2*Width if (Kind == 'DAQ' and Width > 1) else Width
+        # Chunks of about 8 MB, or a single chunk when the number of readings is known and smaller
+        Chunk_Rows = max(16, 2**20//(Buffer_Width + 1))
+        if No_Sample is not None:
+            Chunk_Rows = max(1, min(Chunk_Rows, No_Sample))
+        Channel = {'Name': Name, 'Kind': Kind, 'Device': Device, 'Reader': Reader, 'Port': Port, 'Stream_Rate': Stream_Rate,
+                   'Width': Width, 'No_Sample': No_Sample, 'Encoding': Encoding,
+                   'Buffer': CB.ChunkedBuffer(Buffer_Width, Chunk_Rows)}
+        self.Channels.append(Channel)
+        return Channel
+
+    def start(self):
+        ''' Starting one worker process per device '''
+        self.Stop_Event.clear()
+        self.Errors = {}
+        self.Realtime_Reports = {}
+        self.Workers = []
+        for Channel in self.Channels:
+            Channel['Buffer'].reset()
+            Settings = self.Realtime.get(Channel['Name'], self.Realtime.get(Channel['Kind']))
+            self.Workers.append(Process(target=Worker_Process, args=(Channel, self.Stop_Event, self.Error_Queue, Settings, self.Report_Queue)))
+        self.Time_Zero = Clock.timestamp()
+        for Worker in self.Workers:
+            Worker.start()
+
+    def wait(self, Timeout = None):
+        ''' Waiting (without polling) for all the workers to finish. Returns True if all of them are finished. '''
+        Deadline = None if Timeout is None else Clock.monotonic() + Timeout
+        for Worker in self.Workers:
+            Worker.join(None if Deadline is None else max(0, Deadline - Clock.monotonic()))
+        Finished = not any(Worker.is_alive() for Worker in self.Workers)
+        if Finished:
+            self.finish()
+        return Finished
+
+    def stop(self, Grace_Time = 1.0):
+        '''
+        Asking the workers to finish after their current reading. A worker which is still blocked after
+        Grace_Time seconds (e.g., a stuck device) is terminated.
+        '''
+        self.Stop_Event.set()
+        if not self.wait(Grace_Time):
+            for Worker in self.Workers:
+                if Worker.is_alive():
+                    Worker.terminate()
+                    Worker.join()
+            self.finish()
+
+    def finish(self):
+        self.Time_End = Clock.timestamp()
+        while not self.Error_Queue.empty():
+            Name, Error = self.Error_Queue.get()
+            self.Errors[Name] = Error
+            print ('Error in the %s worker:\n%s' % (Name, Error))
+        while not self.Report_Queue.empty():
+            Name, Report = self.Report_Queue.get()
+            self.Realtime_Reports[Name] = Report
+
+    def isRunning(self):
+        return any(Worker.is_alive() for Worker in self.Workers)
+
+    def close(self):
+        ''' Freeing the shared memory buffers of the devices '''
+        for Channel in self.Channels:
+            Channel['Buffer'].close()
+
+    def records(self, Copy = True):
+        '''
+        Returning the unified record of the session: one dictionary per device with its Kind, Signal (samples x width),
+        TimeIndex (on the common time base of the session, samples x ports for a DAQ with several ports), Details, the Error of its worker (None if it finished normally),
+        the Realtime report of its worker (None without realtime settings), the Encoding of the saved signal and the Time_Encoding
+        of the saved time stamps ('segments' for the regularly sampled streams of streamRead, None for the polled devices).
+        The arrays are contiguous copies of the chunked buffers, Copy is kept for compatibility.
+        '''
+        Record = {}
+        for Channel in self.Channels:
+            Signal = Channel['Buffer'].values()
+            TimeIndex = Channel['Buffer'].times()
+            Multi_Port = Channel['Buffer'].Width != Channel['Width']
+            if Multi_Port:
+                Signal, TimeIndex = Signal[:, :Channel['Width']], Signal[:, Channel['Width']:]
+            if Channel['Name'] in self.Clock.Devices:
+                TimeIndex = self.Clock.align(Channel['Name'], TimeIndex)
+            Record[Channel['Name']] = {'Kind': Channel['Kind'],
+                                       'Signal': Signal,
+                                       'TimeIndex': TimeIndex,
+                                       'Details': deviceDetails(Channel['Device']),
+                                       'Error': self.Errors.get(Channel['Name']),
+                                       'Realtime': self.Realtime_Reports.get(Channel['Name']),
+                                       'Encoding': Channel['Encoding'],
+                                       'Time_Encoding': 'segments' if (Channel['Stream_Rate'] is not None and not Multi_Port) else None}
+            if Channel['Kind'] == 'DAQ':
+                Record[Channel['Name']]['Port'] = list(Channel['Port'])
+            if Channel['Kind'] == 'Spectrometer':
+                Record[Channel['Name']]['WaveLength'] = np.asanyarray(Channel['Device'].readWavelength())
+        return Record
+
+    def attributes(self, Scheduler = None):
+        '''
+        Returning the attributes of the session (time zero, end time and clock mapping), with the realtime report
+        of the Event_Scheduler which drove the session if it has realtime settings
+        '''
+        Attributes = {'Time Zero': self.Time_Zero, 'Time End': self.Time_End}
+        Attributes.update(self.Clock.attributes())
+        if Scheduler is not None and Scheduler.Realtime_Report is not None:
+            Attributes['Scheduler Realtime'] = json.dumps(Scheduler.Realtime_Report)
+        return Attributes
+
+    def save(self, File_name, **Options):
+        ''' Saving the record of the session in one HDF5 file, one group per device (Options of HDF5_FileWriter.HDF5Writer) '''
+        return saveRecords(File_name, self.records(), self.attributes(), **Options)
+
+
+def saveRecords(File_name, Record, Attributes = {}, **Options):
+    '''
+    Saving a record (see AcquisitionSession.records) in one HDF5 file, one group per device, with the given file attributes.
+    Options are passed to HDF5_FileWriter.HDF5Writer (Compression, by default HDF5_FileWriter.Save_Compression, Shuffle, ...). The signals are saved with the Encoding of
+    their record (by default the one of their Kind, see Default_Encodings) and the time stamps as float64, or as regular
+    segments with the 'segments' Time_Encoding. The time series (all but the spectra) get a min/max/mean pyramid for the plots.
+    The signal and time stamps of a DAQ with several ports are saved as ports x samples, like the streams of Universal_Reader.py.
+    A record can also hold Datasets derived from its signal (e.g., the temperature of DanielFlashReading.py), a list of (name, array)
+    or (name, array, encoding) saved in its group with time along the last axis, as HDF5_FileWriter.saveGroup does.
+    '''
+    Options.setdefault('Compression', HW.Save_Compression)
+    with HW.HDF5Writer(File_name, Attributes = Attributes, **Options) as Writer:
+        for Name in Record:
+            Signal_Name, Time_Name = Dataset_Names[Record[Name]['Kind']]
+            Group_Attributes = {'Details': Record[Name]['Details']}
+            if Record[Name].get('Port') is not None:
+                Group_Attributes['Ports'] = json.dumps(Record[Name]['Port'])
+            if Record[Name].get('Realtime') is not None:
+                Group_Attributes['Realtime'] = json.dumps(Record[Name]['Realtime'])     # Achieved affinity, priority and scheduling latency
+            Writer.createGroup(Name, Group_Attributes)
+            Signal = Record[Name]['Signal']
+            Encoding = Record[Name].get('Encoding') or Default_Encodings[Record[Name]['Kind']]
+            Times = np.asarray(Record[Name]['TimeIndex'])
+            if Times.ndim == 2:
+                Writer.createSeries(Name + '/' + Time_Name, Shape = Times.shape[1:])
+            else:
+                Writer.createSeries(Name + '/' + Time_Name, Encoding = Record[Name].get('Time_Encoding'))
+            if Record[Name]['Kind'] == 'Spectrometer':
+                Writer.createSeries(Name + '/' + Signal_Name, Shape = Signal.shape[1:], Encoding = Encoding)
+                Writer.appendSeries(Name + '/' + Signal_Name, Name + '/' + Time_Name, Signal.T, Record[Name]['TimeIndex'])   # wavelength x samples, as in Optrode_Version2.py
+                Writer.write(Name + '/WaveLength', Record[Name]['WaveLength'])
+            elif Times.ndim == 2:
+                Writer.createSeries(Name + '/' + Signal_Name, Shape = Signal.shape[1:], Encoding = Encoding)
+                Writer.appendSeries(Name + '/' + Signal_Name, Name + '/' + Time_Name, Signal.T, Times.T)
+            else:
+                Writer.createSeries(Name + '/' + Signal_Name, Encoding = Encoding)
+                Writer.createPyramid(Name + '/' + Signal_Name)
+                Writer.appendSeries(Name + '/' + Signal_Name, Name + '/' + Time_Name, Signal[:, 0], Record[Name]['TimeIndex'])
+            for Dataset in Record[Name].get('Datasets', []):
+                Data = np.asanyarray(Dataset[1])
+                Writer.createSeries(Name + '/' + Dataset[0], Shape = Data.shape[:-1], dtype = Data.dtype, Encoding = (Dataset[2:] or [None])[0])
+                Writer.append(Name + '/' + Dataset[0], Data)
+    return File_name
@@ -7,10 +7,11 @@ Created on Wed Jul 27 16:39:11 2016
 
 #import DAQT7_Objective as DAQ
 import ADC_DAC_PiC
-import matplotlib.pyplot as plt
+import Lazy_Import as Lazy
+plt = Lazy.module('matplotlib.pyplot')
 import numpy as np
 import time
-import h5py
+h5py = Lazy.module('h5py')
 import datetime
 
 #%%
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Background jobs (saving, plotting) which overlap the next acquisition.
+Optrode_Version2.py used to write the HDF5 file and show every plot on the main thread, so the next run could not start before the
+file was flushed and all the plot windows were closed. A job is a function run in its own forked process, which takes over the
+buffers given to it (e.g., the Chunked_Buffer of a recording, taken out of the BufferPool so the next run fills other buffers).
+The messages of the jobs (report(...) calls, done or failed with the traceback) are printed as soon as they arrive by a
+monitor thread, while the main thread keeps acquiring. collect() runs the On_Done function of the finished jobs in the calling
+thread, e.g. to give the buffers back to the pool.
+
+To use this class, following syntax is recommended:
+import Background_Worker as BW
+Worker = BW.BackgroundWorker()
+Job = Worker.submit('Save Trial1', Save_Function, (File_name, Buffers), On_Done = Give_Back_Buffers)
+BW.report('Data is saved')          # In Save_Function, to report a step before the job is over
+Worker.collect()                    # Before the next run: finishing the jobs which are over, without waiting
+Worker.wait(Job)                    # Waiting for a job (or for all the jobs with Worker.wait())
+Job['Status'], Job['Duration'], Job['Error']
+Worker.close()
+"""
+
+import itertools
+import threading
+import traceback
+import Clock_Service as Clock
+from multiprocessing import Process, Queue
+
+
+Current_Job = None          # (Id, Status queue) of the job running in this process
+
+
+def report(Message):
+    ''' Sending a message of the running job to the main process (printed there right away). Does nothing outside of a job. '''
+    if Current_Job is not None:
+        Current_Job[1].put((Current_Job[0], 'message', Message, Clock.monotonic()))
+
+
+def Job_Process(Id, Function, Args, Status):
+    global Current_Job
+    Current_Job = (Id, Status)
+    Start = Clock.monotonic()
+    try:
+        Function(*Args)
+        Status.put((Id, 'done', Clock.monotonic() - Start, Clock.monotonic()))
+    except BaseException:
+        Status.put((Id, 'failed', traceback.format_exc(), Clock.monotonic()))
+    Status.close()
+    Status.join_thread()
+
+
+class BackgroundWorker:
+    '''
+    Jobs run in their own processes, with their status reported asynchronously
+    '''
+    def __init__(self, Verbose = True):
+        self.Verbose = Verbose
+        self.Status = Queue()
+        self.Jobs = {}
+        self.Counter = itertools.count(1)
+        self.Lock = threading.Lock()
+        self.Monitor = threading.Thread(target = self.monitor)
+        self.Monitor.daemon = True
+        self.Monitor.start()
+
+    def monitor(self):
+        ''' Updating the jobs and printing their messages as they arrive '''
+        while True:
+            Message = self.Status.get()
+            if Message is None:
+                return
+            Id, Kind, Value, Time = Message
+            with self.Lock:
+                Job = self.Jobs.get(Id)
+                if Job is None:
+                    continue
+                if Kind == 'done':
+                    Job['Status'], Job['Duration'] = 'done', Value
+                    Text = 'done in %.2f s' % Value
+                elif Kind == 'failed':
+                    Job['Status'], Job['Error'] = 'failed', Value
+                    Job['Duration'] = Time - Job['Start']
+                    Text = 'failed\n%s' % Value
+                else:
+                    Job['Messages'].append(Value)
+                    Text = Value
+            if Kind != 'message':
+                Job['Over'].set()
+            if self.Verbose:
+                print ('\n[%s] %s' % (Job['Name'], Text))
+
+    def submit(self, Name, Function, Args = (), On_Done = None):
+        ''' Running Function(*Args) in a new process. On_Done(Job) is called by collect() or wait() once it is over. Returns the job. '''
+        Job = {'Id': next(self.Counter), 'Name': Name, 'Status': 'running', 'Start': Clock.monotonic(),
+               'Duration': None, 'Error': None, 'Messages': [], 'On_Done': On_Done, 'Over': threading.Event()}
+        Job['Process'] = Process(target = Job_Process, args = (Job['Id'], Function, Args, self.Status))
+        with self.Lock:
+            self.Jobs[Job['Id']] = Job
+        Job['Process'].start()
+        return Job
+
+    def pending(self):
+        ''' Names of the jobs which are not over '''
+        with self.Lock:
+            return [Job['Name'] for Job in self.Jobs.values() if Job['Process'].is_alive() or Job['Status'] == 'running']
+
+    def finish(self, Job):
+        Job['Process'].join()
+        if Job['Process'].exitcode == 0:
+            Job['Over'].wait(1.0)                   # The last message of the job is sent before its process exits
+        with self.Lock:
+            if Job['Status'] == 'running':         # The process ended without reporting, e.g., killed
+                Job['Status'] = 'failed'
+                Job['Error'] = 'The process exited with code %s' % Job['Process'].exitcode
+                Job['Duration'] = Clock.monotonic() - Job['Start']
+            self.Jobs.pop(Job['Id'], None)
+        if Job['On_Done'] is not None:
+            Job['On_Done'](Job)
+        return Job
+
+    def collect(self):
+        ''' Finishing the jobs which are over (without waiting for the others). Returns the finished jobs. '''
+        with self.Lock:
+            Over = [Job for Job in self.Jobs.values() if not Job['Process'].is_alive()]
+        return [self.finish(Job) for Job in sorted(Over, key = lambda Job: Job['Id'])]
+
+    def wait(self, Job = None):
+        ''' Waiting for a job, or for all the jobs if Job is None. Returns the finished jobs. '''
+        if Job is not None:
+            return [self.finish(Job)] if Job['Id'] in self.Jobs else []
+        with self.Lock:
+            Jobs = sorted(self.Jobs.values(), key = lambda Job: Job['Id'])
+        return [self.finish(Job) for Job in Jobs]
+
+    def close(self):
+        ''' Waiting for all the jobs and stopping the monitor thread '''
+        Jobs = self.wait()
+        self.Status.put(None)
+        self.Monitor.join()
+        return Jobs
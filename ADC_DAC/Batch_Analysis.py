@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel post-processing of sets of recordings, with the results cached.
+The analysis of a day of runs used to be done by opening each file with HDF5_FileReader.py and running the plotting code again.
+Here the analyses are functions of a recording (an HDF5_FileReader.Recording) which are mapped over many recordings by a pool of
+processes. The results are kept in a SQLite cache keyed by the hash of the content of the file and the name and version of the
+analysis: running the same analyses again only computes the new or changed recordings and the analyses whose version changed.
+The hashes are themselves kept by path, modification time and size, so the unchanged files are not read again.
+
+The analyses are registered with the analysis decorator; the following ones are included:
+latencies       Statistics of the time between the samples of every device (as the latency plots of Optrode_Version2.py)
+spectrum        Mean spectrum, peak and centroid wavelengths, and the total intensity of the spectra
+temperature     Thermocouple temperature of DanielFlashReading.py (AIN1 voltage through the op-amp)
+flashes         Flashes of the photodiode: onset times, durations and amplitudes
+
+To use this module, following syntax is recommended:
+import Batch_Analysis as BA
+@BA.analysis(Version = 1)
+def darkLevel(Data):                        # Any function of a Recording returning picklable results
+    return float(Data['Spectrometer']['Intensities'][:, -10:].mean())
+Processor = BA.BatchAnalysis('Records/Analysis_Cache.sqlite', Processes = 4)
+Results = Processor.run(File_names, ['latencies', 'flashes', 'darkLevel'])      # Results[File_name]['flashes']['Onsets'], ...
+Processor.Report, Processor.Errors
+Processor.close()
+
+or from the command line, with the recordings selected by the catalog (see Recording_Catalog.py):
+python Batch_Analysis.py Records --analyses latencies flashes --prefix Trial --since 2016-10-18 --param Paradigm=c --output Results.json
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import traceback
+import numpy as np
+import HDF5_FileReader as HR
+from multiprocessing import Pool
+
+
+Analyses = {}               # Registered analyses: name -> (function, version)
+Block_Size = 2**20          # Number of values read at once
+Hash_Block = 2**20          # Number of bytes read at once for the hash of a file
+
+Schema = '''
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, hash TEXT);
+CREATE TABLE IF NOT EXISTS results (hash TEXT, analysis TEXT, version TEXT, result BLOB, duration REAL,
+                                    PRIMARY KEY (hash, analysis, version));
+'''
+
+
+def analysis(Version = 1):
+    ''' Registering a function(Data) of a Recording; its Version is part of the cache key, so a new version computes the results again '''
+    def register(Function):
+        Analyses[Function.__name__] = (Function, str(Version))
+        return Function
+    return register
+
+
+def fileHash(File_name):
+    ''' SHA-1 of the content of a file '''
+    Hash = hashlib.sha1()
+    with open(File_name, 'rb') as File:
+        Block = File.read(Hash_Block)
+        while Block:
+            Hash.update(Block)
+            Block = File.read(Hash_Block)
+    return Hash.hexdigest()
+
+
+def blocks(Dataset, Size = Block_Size):
+    ''' Yielding the samples of a LazyDataset by blocks along its last axis, with the index of their first sample '''
+    Width = int(np.prod(Dataset.shape[:-1])) if len(Dataset.shape) > 1 else 1
+    Step = max(1, Size//Width)
+    for Start in range(0, Dataset.shape[-1], Step):
+        yield Start, np.asarray(Dataset[..., Start:Start + Step], dtype = float)
+
+
+def signalName(Device, Names):
+    ''' The first of Names which is a dataset of the device, or None '''
+    for Name in Names:
+        if Name in Device:
+            return Name
+    return None
+
+
+# ######## The analyses ########
+@analysis(Version = 1)
+def latencies(Data):
+    ''' Time between the samples of every device: mean, standard deviation, minimum, maximum, 99th percentile and number of gaps '''
+    Result = {}
+    for Name in Data.keys():
+        Time = Data[Name].Time
+        if Time is None or len(Time) < 2:
+            continue
+        Values = np.asarray(Time[...], dtype = float)
+        Latency = np.diff(Values if Values.ndim == 1 else Values[0])          # The first port for the time stamps of each port
+        Median = np.median(Latency)
+        Result[Name] = {'Samples': len(Time), 'Mean': float(Latency.mean()), 'Std': float(Latency.std()),
+                        'Min': float(Latency.min()), 'Max': float(Latency.max()), 'P99': float(np.percentile(Latency, 99)),
+                        'Gaps': int(np.count_nonzero(Latency > 2*Median))}          # Steps of more than twice the usual one
+    return Result
+
+
+@analysis(Version = 1)
+def spectrum(Data):
+    ''' Mean spectrum, its peak and centroid wavelengths, and the statistics of the total intensity of the spectra '''
+    if 'Spectrometer' not in Data:
+        return None
+    Device = Data['Spectrometer']
+    Intensities = Device['Intensities']
+    Total, Count, Totals = np.zeros(Intensities.shape[0]), 0, []
+    for (Start, Block) in blocks(Intensities):
+        Total, Count = Total + Block.sum(axis = 1), Count + Block.shape[1]
+        Totals.append(Block.sum(axis = 0))
+    Mean = Total/max(Count, 1)
+    WaveLength = np.asarray(Device['WaveLength'][...], dtype = float) if 'WaveLength' in Device else np.arange(len(Mean), dtype = float)
+    Totals = np.concatenate(Totals) if Totals else np.zeros(0)
+    Positive = np.clip(Mean, 0, None)
+    return {'Mean_Spectrum': Mean, 'WaveLength': WaveLength,
+            'Peak_WaveLength': float(WaveLength[np.argmax(Mean)]), 'Peak_Intensity': float(Mean.max()),
+            'Centroid_WaveLength': float((WaveLength*Positive).sum()/Positive.sum()) if Positive.sum() > 0 else None,
+            'Total_Intensity': Totals, 'Total_Mean': float(Totals.mean()) if len(Totals) else None,
+            'Total_Max': float(Totals.max()) if len(Totals) else None}
+
+
+Thermocouple_Gain = 1 + (175.6e3/3.83e3)        # Op-amp of the thermocouple on AIN1 in DanielFlashReading.py (R1a/R2a)
+Thermocouple_Port = 1
+
+@analysis(Version = 1)
+def temperature(Data):
+    ''' Temperature of the thermocouple (saved Temperature, or the AIN1 voltage x 1000/gain) and its average every 400 samples '''
+    if 'DAQT7' not in Data:
+        return None
+    Device = Data['DAQT7']
+    if 'Temperature' in Device:
+        Temperature = np.asarray(Device['Temperature'][...], dtype = float)
+    elif 'Voltages' in Device and len(Device['Voltages'].shape) == 2:
+        Temperature = np.asarray(Device['Voltages'][Thermocouple_Port], dtype = float)*1000.0/Thermocouple_Gain
+    else:
+        return None
+    Time = np.asarray(Device.Time[...], dtype = float) if Device.Time is not None else np.arange(len(Temperature), dtype = float)
+    if Time.ndim == 2:
+        Time = Time[min(Thermocouple_Port, len(Time) - 1)]
+    Length = (len(Temperature)//400)*400
+    return {'Mean': float(Temperature.mean()), 'Min': float(Temperature.min()), 'Max': float(Temperature.max()),
+            'Average_Time': Time[:Length].reshape(-1, 400).mean(axis = 1),
+            'Average_Temperature': Temperature[:Length].reshape(-1, 400).mean(axis = 1)}
+
+
+Flash_Names = ['PhotoDiode', 'Voltages']     # Optrode_Version2.py, and Acquisition_Session.py (the first port)
+
+@analysis(Version = 2)
+def flashes(Data, Threshold = 0.5, Minimum_Contrast = 8.0, Low_Percentile = 1.0):
+    '''
+    Flashes of the photodiode: the signal is above the baseline by Threshold of the largest excursion, and the excursion is at least
+    Minimum_Contrast times the noise (median absolute deviation). The baseline and the noise are taken from the lower level of the
+    signal (the samples below the middle of its Low_Percentile and its maximum), so flash trains with a duty cycle of 50% or more are
+    found as well. Returns the onset times, durations and peaks.
+    '''
+    if 'DAQT7' not in Data:
+        return None
+    Device = Data['DAQT7']
+    Name = signalName(Device, Flash_Names)
+    if Name is None or Device.Time is None:
+        return None
+    Signal = np.asarray(Device[Name][...], dtype = float)
+    Time = np.asarray(Device.Time[...], dtype = float)
+    if Signal.ndim == 2:
+        Signal, Time = Signal[0], (Time[0] if Time.ndim == 2 else Time)
+    Result = {'Signal': Name, 'Onsets': np.zeros(0), 'Durations': np.zeros(0), 'Peaks': np.zeros(0), 'Count': 0}
+    if len(Signal) < 3:
+        return Result
+    Lower = Signal[Signal <= (np.percentile(Signal, Low_Percentile) + Signal.max())/2.0]       # Closed shutter level
+    Baseline = np.median(Lower)
+    Noise = 1.4826*np.median(np.abs(Lower - Baseline))
+    Excursion = Signal.max() - Baseline
+    Result['Baseline'], Result['Noise'] = float(Baseline), float(Noise)
+    if Excursion <= Minimum_Contrast*max(Noise, np.finfo(float).eps):
+        return Result
+    Above = np.concatenate([[False], Signal > Baseline + Threshold*Excursion, [False]])
+    Rising = np.flatnonzero(~Above[:-1] & Above[1:])
+    Falling = np.flatnonzero(Above[:-1] & ~Above[1:])
+    Result['Onsets'] = Time[Rising]
+    Result['Durations'] = Time[Falling - 1] - Time[Rising]
+    Result['Peaks'] = np.array([Signal[Start:End].max() for (Start, End) in zip(Rising, Falling)])
+    Result['Count'] = len(Rising)
+    return Result
+
+
+# ######## The workers ########
+def Hash_Process(File_name):
+    return File_name, fileHash(File_name)
+
+
+def Analysis_Process(Task):
+    ''' Running the analyses of one recording, opened once; returns the file name and (status, result or traceback, duration) by analysis '''
+    File_name, Names = Task
+    Results = {}
+    try:
+        Data = HR.Recording(File_name)
+    except Exception:
+        Error = traceback.format_exc()
+        return File_name, dict((Name, ('failed', Error, 0.0)) for Name in Names)
+    with Data:
+        for Name in Names:
+            Start = time.time()
+            try:
+                Results[Name] = ('done', Analyses[Name][0](Data), time.time() - Start)
+            except Exception:
+                Results[Name] = ('failed', traceback.format_exc(), time.time() - Start)
+    return File_name, Results
+
+
+class BatchAnalysis(object):
+    '''
+    Analyses mapped over recordings by a pool of processes, with the results cached by file content and analysis version
+    '''
+    def __init__(self, Cache_File = 'Analysis_Cache.sqlite', Processes = None):
+        self.Cache_File = Cache_File
+        self.Processes = Processes
+        self.Connection = sqlite3.connect(Cache_File)
+        self.Connection.executescript(Schema)
+        self.Report = {}
+        self.Errors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def map(self, Function, Tasks):
+        ''' Mapping a worker over the tasks, in a pool of processes (or in this process with Processes = 1) '''
+        if not Tasks:
+            return []
+        if self.Processes == 1 or len(Tasks) == 1:
+            return [Function(Task) for Task in Tasks]
+        Workers = Pool(self.Processes)
+        try:
+            return list(Workers.imap_unordered(Function, Tasks))
+        finally:
+            Workers.close()
+            Workers.join()
+
+    def hashes(self, File_names):
+        ''' Content hash of the files, computed again (in parallel) only for the new or changed files '''
+        Hashes, Missing, States = {}, [], {}
+        for File_name in File_names:
+            State = os.stat(File_name)
+            Path = os.path.abspath(File_name)
+            States[File_name] = (Path, State.st_mtime, State.st_size)
+            Row = self.Connection.execute('SELECT hash FROM files WHERE path = ? AND mtime = ? AND size = ?', States[File_name]).fetchone()
+            if Row is None:
+                Missing.append(File_name)
+            else:
+                Hashes[File_name] = Row[0]
+        for (File_name, Hash) in self.map(Hash_Process, Missing):
+            Hashes[File_name] = Hash
+            self.Connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', States[File_name] + (Hash,))
+        self.Connection.commit()
+        return Hashes
+
+    def cached(self, Hash, Name):
+        Row = self.Connection.execute('SELECT result FROM results WHERE hash = ? AND analysis = ? AND version = ?',
+                                      (Hash, Name, Analyses[Name][1])).fetchone()
+        return None if Row is None else pickle.loads(bytes(Row[0]))
+
+    def run(self, File_names, Names = None):
+        '''
+        Running the analyses Names (all the registered ones by default) on the recordings. Returns a dictionary of the results by
+        file name and analysis name; the failures are left out of the results and their tracebacks are kept in Errors.
+        Report gives the number of results computed, taken from the cache and failed, and the time taken.
+        '''
+        Start = time.time()
+        Names = list(Names or sorted(Analyses))
+        for Name in Names:
+            if Name not in Analyses:
+                raise ValueError('%s is not an analysis (%s)' % (Name, ', '.join(sorted(Analyses))))
+        Hashes = self.hashes(File_names)
+        Results, Tasks, Cached = {}, [], 0
+        for File_name in File_names:
+            Results[File_name] = {}
+            Missing = []
+            for Name in Names:
+                Result = self.cached(Hashes[File_name], Name)
+                if Result is None:
+                    Missing.append(Name)
+                else:
+                    Results[File_name][Name] = Result[0]
+                    Cached = Cached + 1
+            if Missing:
+                Tasks.append((File_name, Missing))
+        Computed, Failed = 0, 0
+        self.Errors = {}
+        for (File_name, Outcomes) in self.map(Analysis_Process, Tasks):
+            for Name in Outcomes:
+                Status, Value, Duration = Outcomes[Name]
+                if Status == 'done':
+                    Results[File_name][Name] = Value
+                    Computed = Computed + 1
+                    self.Connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                            (Hashes[File_name], Name, Analyses[Name][1],
+                                             sqlite3.Binary(pickle.dumps((Value,), 2)), Duration))
+                else:
+                    self.Errors[(File_name, Name)] = Value
+                    Failed = Failed + 1
+        self.Connection.commit()
+        self.Report = {'Computed': Computed, 'Cached': Cached, 'Failed': Failed, 'Duration': time.time() - Start}
+        return Results
+
+    def clear(self, Name = None):
+        ''' Removing the cached results (of one analysis, or all of them) '''
+        if Name is None:
+            self.Connection.execute('DELETE FROM results')
+        else:
+            self.Connection.execute('DELETE FROM results WHERE analysis = ?', (Name,))
+        self.Connection.commit()
+
+    def close(self):
+        self.Connection.close()
+
+
+def jsonValue(Value):
+    ''' Converting the results (numpy arrays and numbers in dictionaries) to JSON values '''
+    if isinstance(Value, dict):
+        return dict((str(Key), jsonValue(Item)) for (Key, Item) in Value.items())
+    if isinstance(Value, (list, tuple)):
+        return [jsonValue(Item) for Item in Value]
+    if isinstance(Value, np.ndarray):
+        return Value.tolist()
+    if isinstance(Value, np.generic):
+        return Value.item()
+    return Value
+
+
+def summary(Result):
+    ''' The scalar values of a result as a short text '''
+    if not isinstance(Result, dict):
+        return str(Result)
+    Items = []
+    for Key in sorted(Result):
+        if isinstance(Result[Key], dict):
+            Items.append('%s (%s)' % (Key, summary(Result[Key])))
+        elif isinstance(Result[Key], float):
+            Items.append('%s %.4g' % (Key, Result[Key]))
+        elif isinstance(Result[Key], (int, str)):
+            Items.append('%s %s' % (Key, Result[Key]))
+    return ', '.join(Items)
+
+
+if __name__ == "__main__":
+    import argparse
+    import Recording_Catalog as RC
+    Parser = argparse.ArgumentParser(description = 'Running analyses over the recordings of a folder, with the results cached')
+    Parser.add_argument('records', nargs = '?', default = 'Records', help = 'folder of the recordings')
+    Parser.add_argument('--analyses', nargs = '+', default = None, help = 'analyses to run (all by default): %s' % ', '.join(sorted(Analyses)))
+    Parser.add_argument('--processes', type = int, default = None, help = 'number of processes (number of CPUs by default)')
+    Parser.add_argument('--cache', help = 'cache file (records/Analysis_Cache.sqlite by default)')
+    Parser.add_argument('--since', help = 'first date, YYYY-MM-DD')
+    Parser.add_argument('--until', help = 'last date, YYYY-MM-DD')
+    Parser.add_argument('--prefix', help = 'start of the file name prefix')
+    Parser.add_argument('--device', help = 'name of a device group, e.g. Spectrometer')
+    Parser.add_argument('--param', action = 'append', default = [], help = 'parameter as Key=Value, e.g. Paradigm=c (repeatable)')
+    Parser.add_argument('--output', help = 'JSON file of the results')
+    Arguments = Parser.parse_args()
+
+    with RC.RecordingCatalog(Arguments.records) as Catalog:
+        Catalog.scan(Verbose = False)
+        Parameters = dict((Pair.split('=', 1)[0], RC.parameterValue(Pair.split('=', 1)[1])) for Pair in Arguments.param)
+        Runs = Catalog.find(Arguments.since, Arguments.until, Arguments.prefix, Arguments.device, **Parameters)
+    File_names = [os.path.join(Arguments.records, Run['path']) for Run in Runs if Run['error'] is None]
+    print ('%i recordings' % len(File_names))
+
+    with BatchAnalysis(Arguments.cache or os.path.join(Arguments.records, 'Analysis_Cache.sqlite'), Arguments.processes) as Processor:
+        Results = Processor.run(File_names, Arguments.analyses)
+        for File_name in File_names:
+            print (os.path.basename(File_name))
+            for Name in sorted(Results[File_name]):
+                print ('    %-12s %s' % (Name, summary(Results[File_name][Name])))
+        for (File_name, Name) in sorted(Processor.Errors):
+            print ('%s %s failed:\n%s' % (os.path.basename(File_name), Name, Processor.Errors[(File_name, Name)]))
+        print ('%(Computed)i results computed, %(Cached)i cached, %(Failed)i failed in %(Duration).2f s' % Processor.Report)
+    if Arguments.output:
+        with open(Arguments.output, 'w') as File:
+            json.dump(jsonValue(Results), File, indent = 1)
+        print ('Results are saved in %s' % Arguments.output)
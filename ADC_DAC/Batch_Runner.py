@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Non-interactive batch runner for queued acquisition runs.
+Optrode_Version2.py, Universal_Reader.py and DanielFlashReading.py take every parameter from raw_input and open the devices for each session,
+so running 50 trials means typing the answers 50 times. The batch runner reads a queue of run definitions from a JSON (or YAML) file,
+validates and compiles all of them before the first run (see Experiment_Timeline.py), opens the devices once and runs the queue back to back.
+Each recording is saved by a background job (see Background_Worker.py) while the next run is acquired, and the timing of every run is reported.
+
+A batch file is a list of runs, or a dictionary with the Defaults shared by the runs and the list of Runs:
+{
+    "Defaults": {"Laser": "G", "Paradigm": "c", "Integration_Time": 10, "DurationOfReading": 5},
+    "Runs": [{"File_name_PreFix": "Trial1"},
+             {"File_name_PreFix": "Trial2", "Laser": "B"},
+             {"File_name_PreFix": "Trial3", "Paradigm": "m", "Integration_list_MilSec": [8, 16, 32, 64]}]
+}
+The continious (c), multi-integration (m) and shutter sequence (s) paradigms are supported. In the multi-integration paradigm every shutter
+window is scheduled when the spectrum before it is read, as in Optrode_Version2.py, the other paradigms execute their compiled timeline.
+The triggered paradigm (t) needs the spectrometer to be armed for every integration and is run by Optrode_Version2.py.
+
+To use this script, following syntax is recommended:
+python Batch_Runner.py Runs.json                         # Records are saved in ./Records
+python Batch_Runner.py Runs.json --simulated --records /tmp
+
+or from python, with devices which are already open:
+import Batch_Runner as BR
+Runner = BR.BatchRunner(DAQ1, Spec1, Power_meter)          # Or BR.BatchRunner(..., Realtime = {'Scheduler': {'CPU': [2], 'Policy': 'fifo'}}), see Realtime_Priority.py
+Summary = Runner.run(BR.loadBatch('Runs.json'))
+Runner.close()
+"""
+
+import datetime
+import json
+import os
+import time
+import numpy as np
+import Acquisition_Session as AS
+import Chunked_Buffer as CB
+import Clock_Service as Clock
+import Event_Scheduler as ES
+import Experiment_Timeline as ET
+import Lazy_Import as Lazy
+import Background_Worker as BW
+
+
+def loadBatch(File_name):
+    ''' Loading, validating and compiling all the runs of a batch file. An exception names the first run that is not valid. '''
+    Batch = ET.loadExperiment(File_name)
+    if isinstance(Batch, list):
+        Batch = {'Runs': Batch}
+    Runs = []
+    for I, Run in enumerate(Batch.get('Runs', [])):
+        Description = dict(Batch.get('Defaults', {}))
+        Description.update(Run)
+        try:
+            if not Description.get('File_name_PreFix'):
+                raise ValueError('File_name_PreFix is missing')
+            Compiled = ET.compileExperiment(Description)
+            if Compiled['Experiment']['Paradigm'] == 't':
+                raise ValueError('the triggered paradigm is run by Optrode_Version2.py')
+        except ValueError as e:
+            raise ValueError('Run %i of %s: %s' % (I + 1, File_name, e))
+        Runs.append(Compiled)
+    if not Runs:
+        raise ValueError('%s has no run' % File_name)
+    return Runs
+
+
+class BatchRunner:
+    '''
+    Running compiled experiments back to back on devices which are already open
+    '''
+    def __init__(self, DAQ1, Spec1, Power_meter = None, Records_Path = 'Records', Realtime = None):
+        ''' Realtime holds the affinity and priority settings of the 'Scheduler' and of the session workers (see Acquisition_Session.py) '''
+        self.DAQ1 = DAQ1
+        self.Spec1 = Spec1
+        self.Records_Path = Records_Path
+        self.Pool = CB.BufferPool()
+        # One session for all the runs, so the buffers of the spectrometer and the power meter are reused
+        self.Realtime = Realtime or {}
+        self.Session = AS.AcquisitionSession(Realtime = self.Realtime)
+        self.Spec_Channel = self.Session.addDevice('Spectrometer', Spec1, No_Sample = None)
+        if Power_meter is not None and Power_meter.Error == 0:
+            self.Session.addDevice('PM100_PowerMeter', Power_meter, No_Sample = None)
+        self.Worker = BW.BackgroundWorker(Verbose = False)
+        self.Saver = None                       # (Job, Summary of the run being saved)
+        self.Summary = []
+
+    def runOne(self, Compiled):
+        ''' Acquiring one compiled experiment. Its recording is saved in the background and its timing is added to the summary. '''
+        Experiment = Compiled['Experiment']
+        Setup_Start = Clock.monotonic()
+        PhotoDiod_Port = Experiment['Devices']['DAQ']['PhotoDiod_Port']
+        Shutter_Port = Compiled['Ports'][0]
+        Timeline = Compiled['Timeline']
+        Integration = Timeline['Value'][Timeline['Action'] == ET.INTEGRATION]
+        self.DAQ1.writePort(Shutter_Port, 0)
+        self.Spec1.setTriggerMode(0)                                     # Free running
+        if len(Integration):
+            self.Spec1.setIntegrationTime(Integration[0]*1000)           # Microseconds
+        DAQ_Buffer = self.Pool.get('DAQ', Width = 1, Chunk_Rows = 65536)
+
+        # ####### The timeline (or the spectrometer reads) drives the shutter while this thread reads the photodiode #######
+        Acquisition_Start = Clock.monotonic()
+        self.Session.start()
+        Scheduler = ES.EventScheduler(Realtime = self.Realtime.get('Scheduler'))
+        if Experiment['Paradigm'] == 'm':
+            self.runSynchronized(Experiment, Scheduler, DAQ_Buffer, PhotoDiod_Port, Shutter_Port)
+        else:
+            ET.runTimeline(Compiled, {ET.SHUTTER_OPEN: lambda Port, Value: self.DAQ1.writePort(Port, 5),
+                                      ET.SHUTTER_CLOSE: lambda Port, Value: self.DAQ1.writePort(Port, 0)}, Scheduler)
+            while not Scheduler.Idle.is_set():
+                DAQ_Buffer.append(*self.DAQ1.readPort(PhotoDiod_Port))
+        Scheduler.stop()
+        self.Session.stop(Grace_Time = Integration.max()/1000.0 + 1 if len(Integration) else 1)
+        self.DAQ1.writePort(Shutter_Port, 0)
+        Acquisition_End = Clock.monotonic()
+
+        Record = self.Session.records()
+        Record['DAQT7'] = {'Kind': 'DAQ', 'Signal': DAQ_Buffer.values(), 'TimeIndex': DAQ_Buffer.times(),
+                           'Details': AS.deviceDetails(self.DAQ1), 'Error': None, 'Encoding': AS.defaultEncoding('DAQ', self.DAQ1)}
+        Lateness = [Late for (Name, Late) in Scheduler.lateness() if Name.startswith('Shutter')]
+        Attributes = self.Session.attributes(Scheduler)
+        Attributes['Experiment'] = json.dumps(Experiment)
+        Attributes['Shutter Lateness'] = np.asarray(Lateness, dtype = float)
+
+        File_name_Suffix = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H-%M-%S') + ".hdf5"
+        File_name = os.path.join(self.Records_Path, Experiment['File_name_PreFix'] + '-' + File_name_Suffix)
+        Summary = {'File': File_name,
+                   'Paradigm': Experiment['Paradigm'],
+                   'Laser': Experiment['Laser'],
+                   'Setup': Acquisition_Start - Setup_Start,
+                   'Acquisition': Acquisition_End - Acquisition_Start,
+                   'Planned': Compiled['Duration'],
+                   'Samples': dict((Name, len(Record[Name]['TimeIndex'])) for Name in Record),
+                   'Shutter Lateness Max': max(Lateness) if Lateness else 0,
+                   'Errors': dict((Name, Record[Name]['Error']) for Name in Record if Record[Name]['Error'])}
+        self.waitSaver()
+        self.Saver = (self.Worker.submit('Save ' + File_name, AS.saveRecords, (File_name, Record, Attributes)), Summary)
+        return Summary
+
+    def runSynchronized(self, Experiment, Scheduler, DAQ_Buffer, PhotoDiod_Port, Shutter_Port):
+        '''
+        Multi-integration paradigm: the spectrometer is free running with the integration cycle of the compiled timeline, and the
+        shutter window of every integration is scheduled when the spectrum before it is read (the first cycle of every repetition
+        has no exposure), so the windows stay aligned to the integration cycles as in Optrode_Version2.Multi_Integration_Paradigm.
+        '''
+        Spec_Buffer = self.Spec_Channel['Buffer']
+        Buffer = Experiment['Integration_Buffer_Time']/1000.0
+        Scheduler.start()
+        for Repetition in range(Experiment['Repetitions']):
+            if Repetition > 0:
+                End_Time = Clock.monotonic() + Experiment['Repetition_Interval']
+                while Clock.monotonic() < End_Time:
+                    DAQ_Buffer.append(*self.DAQ1.readPort(PhotoDiod_Port))
+            First = len(Spec_Buffer)
+            for I, Integration in enumerate(Experiment['Integration_list_MilSec']):
+                while len(Spec_Buffer) < First + I + 1:             # The next integration cycle starts when this spectrum is read
+                    DAQ_Buffer.append(*self.DAQ1.readPort(PhotoDiod_Port))
+                Scheduler.schedule(Buffer, 'Shutter open', self.DAQ1.writePort, Shutter_Port, 5)
+                Scheduler.schedule(Buffer + Integration/1000.0, 'Shutter close', self.DAQ1.writePort, Shutter_Port, 0)
+            while len(Spec_Buffer) < First + len(Experiment['Integration_list_MilSec']) + 1:      # The spectrum of the last window
+                DAQ_Buffer.append(*self.DAQ1.readPort(PhotoDiod_Port))
+        End_Time = Clock.monotonic() + Buffer
+        while Clock.monotonic() < End_Time:
+            DAQ_Buffer.append(*self.DAQ1.readPort(PhotoDiod_Port))
+
+    def waitSaver(self):
+        ''' Waiting for the background save of the previous run and recording its duration '''
+        if self.Saver is None:
+            return
+        Job, Summary = self.Saver
+        self.Worker.wait(Job)
+        Summary['Save'] = Job['Duration']
+        if Job['Status'] == 'failed':
+            Summary['Errors']['Save'] = Job['Error']
+        self.Summary.append(Summary)
+        printRun(len(self.Summary), Summary)
+        self.Saver = None
+
+    def run(self, Runs):
+        ''' Running all the compiled runs in order. Returns the summary of every run. '''
+        Batch_Start = Clock.monotonic()
+        for Compiled in Runs:
+            self.runOne(Compiled)
+        self.waitSaver()
+        Total = Clock.monotonic() - Batch_Start
+        Acquiring = sum(Each['Acquisition'] for Each in self.Summary)
+        print ('%i runs in %.1f s, %.0f%% of the time acquiring' % (len(self.Summary), Total, 100*Acquiring/Total))
+        return self.Summary
+
+    def close(self):
+        self.waitSaver()
+        self.Worker.close()
+        self.Session.close()
+        self.Pool.close()
+
+
+def printRun(Number, Summary):
+    print ('Run %i %s: setup %.3f s, acquisition %.3f s (planned %.3f s), save %.3f s, shutter lateness %.3f ms, samples %s'
+           % (Number, Summary['File'], Summary['Setup'], Summary['Acquisition'], Summary['Planned'], Summary['Save'],
+              Summary['Shutter Lateness Max']*1000, ', '.join('%s %i' % Each for Each in sorted(Summary['Samples'].items()))))
+    for Name in Summary['Errors']:
+        print ('Error in %s: %s' % (Name, Summary['Errors'][Name]))
+
+
+if __name__ == "__main__":
+    import argparse
+    Parser = argparse.ArgumentParser(description = 'Running a queue of acquisition runs without prompts')
+    Parser.add_argument('batch', help = 'JSON (or YAML) file with the runs')
+    Parser.add_argument('--records', default = 'Records', help = 'folder of the recordings')
+    Parser.add_argument('--simulated', action = 'store_true', help = 'use the simulated devices instead of the hardware')
+    Arguments = Parser.parse_args()
+
+    Runs = loadBatch(Arguments.batch)           # Every run is checked before the devices are opened
+    print ('%i runs are queued' % len(Runs))
+    if Arguments.simulated:
+        import Simulated_Devices as SD
+        DAQ1 = SD.SimulatedDAQ()
+        Spec1 = SD.SimulatedSpectrometer(Light = DAQ1)
+        Power_meter = SD.SimulatedPM100(Light = DAQ1)
+    else:
+        import ADC_DAC_PiC
+        import SeaBreeze_Objective as SBO
+        import ThorlabsPM100_Objective as P100
+        DAQ1 = ADC_DAC_PiC.DetectPi()
+        Spec1 = SBO.DetectSpectrometer()
+        Power_meter = P100.DetectPM100D()
+        if (Spec1.Error == 1) | (DAQ1.Error == 1):
+            raise SystemExit('Cession failed: could not detect devices')
+    Lazy.startupReport()
+
+    Runner = BatchRunner(DAQ1, Spec1, Power_meter, Arguments.records)
+    try:
+        Summary = Runner.run(Runs)
+    finally:
+        Runner.close()
+        DAQ1.close()
+        Spec1.close()
+    Summary_File = os.path.join(Arguments.records, 'Batch-' + datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H-%M-%S') + '.json')
+    with open(Summary_File, 'w') as File:
+        json.dump(Summary, File, indent = 2, sort_keys = True)
+    print ('Summary is saved in %s' % Summary_File)
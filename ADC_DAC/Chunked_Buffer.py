@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Growable sample buffer in shared memory, made of fixed size chunks.
+The scripts used to guess the size of their multiprocessing.Array buffers from speed tests (e.g., No_DAC_Sample = int((DurationOfReading + DurationOfReading)/DAQ_SamplingRate)),
+so a recording either allocated twice the memory it needed or overran the index and crashed.
+A ChunkedBuffer stores (values, time) rows, like the ones returned by readPort, readIntensity and readPower, and grows by one chunk
+at a time without copying the rows already written. Every chunk is a shared memory file (in /dev/shm when available),
+so a chunk added by a forked writer process is also seen by the main process. The fill level is a shared counter which is
+updated after the row is written, so a reader never sees a row that is not complete (one writer per buffer).
+A contiguous copy of the rows is only made when values() and times() are called, e.g., for saving.
+
+To use this class, following syntax is recommended:
+import Chunked_Buffer as CB
+DAQ_Buffer = CB.ChunkedBuffer(Width = 1, Chunk_Rows = 65536)
+DAQ_Buffer.append(*DAQ1.readPort('AIN1'))                  # In any process (one writer)
+Spec_Buffer.extend(Intensities, Times)                     # Several rows at once
+len(DAQ_Buffer)                                            # Number of rows written
+DAQ_Signal, DAQ_Time = DAQ_Buffer.values()[:, 0], DAQ_Buffer.times()
+for (Values, Times) in DAQ_Buffer.chunks():                # The filled part of every chunk, without copying
+DAQ_Buffer.reset()                                         # Keeps the chunks for the next recording
+DAQ_Buffer.close()                                         # Frees the shared memory
+
+A BufferPool keeps the buffers of a session between the recordings, so a rerun starts with the same shared memory:
+Pool = CB.BufferPool()
+DAQ_Buffer = Pool.get('DAQ', Width = 1, Chunk_Rows = No_DAC_Sample)    # Reset and reused if it already exists with the same shape
+Buffers = Pool.take(['DAQ', 'Spectrometer'])                          # Handed over to a background save, the next run gets new buffers
+Pool.give(Buffers)                                                      # Back to the pool once saved (closed if the pool has one already)
+Pool.close()
+"""
+
+import atexit
+import itertools
+import mmap
+import os
+import tempfile
+import numpy as np
+from multiprocessing import RawValue
+
+
+Shared_Directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+Buffer_Counter = itertools.count()
+
+
+class ChunkedBuffer(object):
+    '''
+    Rows of Width float values and one time stamp, stored in shared memory chunks of Chunk_Rows rows
+    '''
+    def __init__(self, Width = 1, Chunk_Rows = 4096, Directory = None):
+        self.Width = int(Width)
+        self.Chunk_Rows = int(Chunk_Rows)
+        self.Directory = Directory or Shared_Directory
+        self.Name = 'Chunked_Buffer_%i_%i' % (os.getpid(), next(Buffer_Counter))
+        self.Owner = os.getpid()
+        self.Fill = RawValue('l', 0)           # Number of rows written
+        self.No_Chunks = RawValue('i', 0)      # Number of chunk files created
+        self.Chunks = []                       # (Values, Times, Map) of the chunks mapped in this process
+        atexit.register(self.close)
+
+    def __getstate__(self):
+        State = dict(self.__dict__)
+        State['Chunks'] = []                   # The chunks are mapped again by the other process
+        return State
+
+    def __len__(self):
+        return self.Fill.value
+
+    def capacity(self):
+        return self.No_Chunks.value*self.Chunk_Rows
+
+    def chunkFile(self, Index):
+        return os.path.join(self.Directory, '%s_%i' % (self.Name, Index))
+
+    def mapChunk(self, Index, Create = False):
+        Size = self.Chunk_Rows*(self.Width + 1)*8
+        File = os.open(self.chunkFile(Index), os.O_RDWR | (os.O_CREAT | os.O_EXCL if Create else 0), 0o600)
+        try:
+            if Create:
+                os.ftruncate(File, Size)
+            Map = mmap.mmap(File, Size)
+        finally:
+            os.close(File)
+        Data = np.frombuffer(Map, dtype = float)
+        Values = Data[:self.Chunk_Rows*self.Width].reshape(self.Chunk_Rows, self.Width)
+        Times = Data[self.Chunk_Rows*self.Width:]
+        self.Chunks.append((Values, Times, Map))
+
+    def chunk(self, Index):
+        ''' Returning the (Values, Times) arrays of a chunk, mapping the chunks created by the other processes and creating a new one if needed '''
+        while len(self.Chunks) <= Index:
+            if len(self.Chunks) < self.No_Chunks.value:
+                self.mapChunk(len(self.Chunks))
+            else:
+                self.mapChunk(len(self.Chunks), Create = True)
+                self.No_Chunks.value = len(self.Chunks)
+        return self.Chunks[Index]
+
+    def append(self, Values, Time):
+        ''' Writing one row at the end of the buffer '''
+        Index = self.Fill.value
+        Chunk_Index, Row = divmod(Index, self.Chunk_Rows)
+        if Chunk_Index < len(self.Chunks):
+            Chunk = self.Chunks[Chunk_Index]
+        else:
+            Chunk = self.chunk(Chunk_Index)
+        Chunk[0][Row] = Values
+        Chunk[1][Row] = Time
+        self.Fill.value = Index + 1
+
+    def extend(self, Values, Times):
+        ''' Writing several rows (Values is rows x Width, or a vector when Width is 1) at the end of the buffer '''
+        Values = np.asarray(Values, dtype = float).reshape(-1, self.Width)
+        Times = np.asarray(Times, dtype = float)
+        Index = self.Fill.value
+        Written = 0
+        while Written < len(Times):
+            Chunk_Index, Row = divmod(Index + Written, self.Chunk_Rows)
+            Chunk = self.chunk(Chunk_Index)
+            No_Rows = min(self.Chunk_Rows - Row, len(Times) - Written)
+            Chunk[0][Row:Row + No_Rows] = Values[Written:Written + No_Rows]
+            Chunk[1][Row:Row + No_Rows] = Times[Written:Written + No_Rows]
+            Written = Written + No_Rows
+        self.Fill.value = Index + Written
+
+    def chunks(self):
+        ''' Yielding the filled part (Values, Times) of every chunk, without copying '''
+        Fill = self.Fill.value
+        for Chunk_Index in range((Fill + self.Chunk_Rows - 1)//self.Chunk_Rows):
+            Values, Times, Map = self.chunk(Chunk_Index)
+            No_Rows = min(self.Chunk_Rows, Fill - Chunk_Index*self.Chunk_Rows)
+            yield Values[:No_Rows], Times[:No_Rows]
+
+    def values(self):
+        ''' Contiguous copy of the values of all the rows (rows x Width) '''
+        Parts = [Values for (Values, Times) in self.chunks()]
+        return np.concatenate(Parts) if Parts else np.zeros((0, self.Width))
+
+    def times(self):
+        ''' Contiguous copy of the time stamps of all the rows '''
+        Parts = [Times for (Values, Times) in self.chunks()]
+        return np.concatenate(Parts) if Parts else np.zeros(0)
+
+    def reset(self):
+        ''' Emptying the buffer. The chunks are kept, so the next recording does not allocate them again. '''
+        self.Fill.value = 0
+
+    def close(self):
+        ''' Unmapping the chunks, and removing their files in the process which created the buffer '''
+        Maps = [Map for (Values, Times, Map) in self.Chunks]
+        self.Chunks = []
+        for Map in Maps:
+            try:
+                Map.close()
+            except (BufferError, ValueError):
+                pass                            # Still used by an array returned by chunks(), it is freed with the array
+        if os.getpid() == self.Owner:
+            for Index in range(self.No_Chunks.value):
+                try:
+                    os.remove(self.chunkFile(Index))
+                except OSError:
+                    pass
+            self.No_Chunks.value = 0
+            self.Fill.value = 0
+
+
+class BufferPool(object):
+    '''
+    Buffers of a session, sized once and reused by every recording
+    '''
+    def __init__(self):
+        self.Buffers = {}
+
+    def get(self, Name, Width = 1, Chunk_Rows = 4096):
+        '''
+        Returning the empty buffer called Name. It is created (and its first chunk is allocated and touched, so the recording
+        does not wait for the memory) the first time, or when the requested shape is not the shape of the existing buffer.
+        '''
+        Buffer = self.Buffers.get(Name)
+        if Buffer is not None and (Buffer.Width, Buffer.Chunk_Rows) == (int(Width), int(Chunk_Rows)):
+            Buffer.reset()
+            return Buffer
+        if Buffer is not None:
+            Buffer.close()
+        Buffer = ChunkedBuffer(Width, Chunk_Rows)
+        Values, Times = Buffer.chunk(0)[:2]
+        Values.fill(0)
+        Times.fill(0)
+        self.Buffers[Name] = Buffer
+        return Buffer
+
+    def take(self, Names):
+        ''' Removing the buffers called Names from the pool and returning them as a dictionary (the buffers are not freed) '''
+        return dict((Name, self.Buffers.pop(Name)) for Name in Names if Name in self.Buffers)
+
+    def give(self, Buffers):
+        ''' Putting back buffers returned by take(). A buffer whose name is already used again by the pool is freed. '''
+        for Name, Buffer in Buffers.items():
+            if Name in self.Buffers:
+                Buffer.close()
+            else:
+                self.Buffers[Name] = Buffer
+
+    def reset(self):
+        for Buffer in self.Buffers.values():
+            Buffer.reset()
+
+    def close(self):
+        for Buffer in self.Buffers.values():
+            Buffer.close()
+        self.Buffers = {}
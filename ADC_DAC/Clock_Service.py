@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Common time base of the acquisition processes.
+The devices used to stamp their readings with time.time() (and the Pi stream with time.clock()) in different processes,
+so a step of the wall clock (e.g., NTP) during a recording corrupted the alignment of the DAQ, spectrometer and power meter.
+All the time stamps are now taken from one monotonic, high resolution counter which is shared by all the processes of the machine.
+The counter is mapped to the epoch once, when this module is imported, and the forked worker processes inherit the same mapping,
+so the time stamps still look like time.time() values and the TimeIndex datasets of all the devices are directly comparable.
+
+A ClockService records the epoch mapping of a session and the offset/drift of every device, estimated from pairs of device and
+host times (calibrate) or refined by cross-correlating the shutter edges seen by a device and by the photodiode (edgeOffset).
+
+To use this module, following syntax is recommended:
+import Clock_Service as Clock
+Clock.timestamp()                                      # Instead of time.time() for the time stamp of a reading
+Clock.monotonic()                                      # Monotonic seconds, for deadlines and durations
+Service = Clock.ClockService()                         # Once per session
+Service.calibrate('PM100', Device_Times, Host_Times)   # Offset and drift of a device with its own clock
+Service.edgeOffset('Spectrometer', DAQ_Time, DAQ_Signal, Spec_Time, Spec_Signal)   # Offset from the shutter edges
+Spec_Time = Service.align('Spectrometer', Spec_Time)   # Time stamps of the device on the common time base
+Service.attributes()                                   # Epoch mapping and device offsets, to be saved as HDF5 attributes
+"""
+
+import ctypes
+import ctypes.util
+import time
+import numpy as np
+
+
+CLOCK_MONOTONIC = 1             # From <time.h> on Linux
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+if hasattr(time, 'monotonic'):
+    monotonic = time.monotonic
+else:
+    # time.monotonic is not available in Python 2, the same counter is read with clock_gettime
+    try:
+        Librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1', use_errno = True)
+        Clock_Gettime = Librt.clock_gettime
+        Clock_Gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+        def monotonic():
+            Now = Timespec()
+            if Clock_Gettime(CLOCK_MONOTONIC, ctypes.byref(Now)) != 0:
+                raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+            return Now.tv_sec + Now.tv_nsec*1e-9
+        monotonic()
+    except (OSError, AttributeError):
+        print ('Warning: the monotonic clock is not available, time.time() is used for the time stamps')
+        monotonic = time.time
+
+
+def epochOffset(No_Samples = 20):
+    '''
+    Estimating the offset between the epoch (time.time) and the monotonic counter. The wall clock is read between two readings of
+    the counter, and the narrowest of No_Samples such windows is used.
+    '''
+    Best_Window = None
+    for I in range(No_Samples):
+        Before = monotonic()
+        Wall = time.time()
+        After = monotonic()
+        if Best_Window is None or (After - Before) < Best_Window:
+            Best_Window = After - Before
+            Offset = Wall - (Before + After)/2.0
+    return Offset
+
+
+Epoch_Offset = epochOffset()
+
+
+def timestamp():
+    ''' Seconds since the epoch, taken from the monotonic counter '''
+    return Epoch_Offset + monotonic()
+
+
+class ClockService(object):
+    '''
+    Epoch mapping of a session and the offset and drift of every device relative to the common time base
+    '''
+    def __init__(self):
+        self.Epoch_Offset = Epoch_Offset
+        self.Monotonic_Zero = monotonic()
+        self.Wall_Zero = time.time()
+        self.Devices = {}               # Name: {'Offset': seconds, 'Drift': seconds per second}
+
+    def calibrate(self, Name, Device_Times, Host_Times):
+        '''
+        Estimating the offset and drift of a device from pairs of its time stamps and the host time stamps of the same events
+        (least squares fit of Host = Device*(1 + Drift) + Offset). With one pair only the offset is estimated.
+        '''
+        Device_Times = np.asarray(Device_Times, dtype = float)
+        Host_Times = np.asarray(Host_Times, dtype = float)
+        if len(Device_Times) != len(Host_Times) or len(Device_Times) == 0:
+            raise ValueError('Device_Times and Host_Times must be the same non-empty length')
+        if len(Device_Times) == 1:
+            Slope, Offset = 1.0, Host_Times[0] - Device_Times[0]
+        else:
+            # Fitting around the first time stamp keeps the offset well conditioned for epoch times
+            Slope, Offset = np.polyfit(Device_Times - Device_Times[0], Host_Times, 1)
+            Offset = Offset - Slope*Device_Times[0]
+        self.Devices[Name] = {'Offset': float(Offset), 'Drift': float(Slope - 1)}
+        return self.Devices[Name]
+
+    def edgeOffset(self, Name, Reference_Time, Reference_Signal, Device_Time, Device_Signal, Resolution = 0.001, Max_Lag = 0.5):
+        '''
+        Refining the offset of a device by cross-correlating the shutter edges seen by the device (e.g., the total intensity of the
+        spectra) with the ones seen by the reference (e.g., the photodiode on the DAQ). Both signals are resampled every Resolution
+        seconds and only lags up to Max_Lag seconds are searched. Returns the lag (seconds) of the device, which is removed from its offset.
+        '''
+        Device_Time = self.align(Name, Device_Time)
+        Start = max(Reference_Time[0], Device_Time[0])
+        End = min(Reference_Time[-1], Device_Time[-1])
+        if End - Start < 2*Resolution:
+            raise ValueError('The reference and the device recordings do not overlap')
+        Grid = np.arange(Start, End, Resolution)
+        Reference_Edges = np.diff(np.interp(Grid, Reference_Time, Reference_Signal))
+        Device_Edges = np.diff(np.interp(Grid, Device_Time, Device_Signal))
+        Reference_Edges = (Reference_Edges - Reference_Edges.mean())/(Reference_Edges.std() or 1)
+        Device_Edges = (Device_Edges - Device_Edges.mean())/(Device_Edges.std() or 1)
+
+        Correlation = np.correlate(Device_Edges, Reference_Edges, 'full')
+        Lags = np.arange(-len(Reference_Edges) + 1, len(Device_Edges))*Resolution
+        Searched = np.abs(Lags) <= Max_Lag
+        Lag = Lags[Searched][np.argmax(Correlation[Searched])]
+
+        Device = self.Devices.setdefault(Name, {'Offset': 0.0, 'Drift': 0.0})
+        Device['Offset'] = float(Device['Offset'] - Lag)
+        return float(Lag)
+
+    def align(self, Name, Times):
+        ''' Returning the time stamps of a device on the common time base (unchanged if the device is not calibrated) '''
+        if Name not in self.Devices:
+            return np.asarray(Times, dtype = float)
+        Device = self.Devices[Name]
+        return np.asarray(Times, dtype = float)*(1 + Device['Drift']) + Device['Offset']
+
+    def attributes(self):
+        ''' Returning the epoch mapping and the device offsets as a dictionary of HDF5 attributes '''
+        Attributes = {'Clock Epoch Offset': self.Epoch_Offset,
+                      'Clock Monotonic Zero': self.Monotonic_Zero,
+                      'Clock Wall Zero': self.Wall_Zero}
+        for Name in self.Devices:
+            Attributes['Clock Offset %s' % Name] = self.Devices[Name]['Offset']
+            Attributes['Clock Drift %s' % Name] = self.Devices[Name]['Drift']
+        return Attributes
@@ -5,10 +5,11 @@ Demonstrates reading 1 analog input (AINs) in a loop from a LabJack.
 #%%
 #import DAQT7_Objective as DAQ
 import ADC_DAC_PiC
-import matplotlib.pyplot as plt
+import Lazy_Import as Lazy
+plt = Lazy.module('matplotlib.pyplot')
 import numpy as np
 import time
-import h5py
+h5py = Lazy.module('h5py')
 import datetime
 
 #%%
@@ -9,6 +9,7 @@ This command puts 4.2 volts on DAC1 port (digital to analogue conversion): Devic
 This command reads the analogue values from AIN0 port (analogue to digital conversion): ReadVoltage = DeviceName.readPort('AIN0')
 This command writes a digital value (3.3v) to a digital port (FIO0) port: DeviceName.writePort('FIO0', 1)
 This command reads the digital value (zero or one) from a digital port (FIO0) port: State = DeviceName.readPort('FIO0'). State: 0 or 1
+This command generates a 100 microseconds trigger pulse (e.g., for the spectrometer external trigger) on a digital port (FIO2): DeviceName.triggerPulse('FIO2', 0.0001)
 *The analogue ports are DACs and AINs. The DACs are read and writable. The AINs are only readable and they are only used for measuring an external voltages (0 to 10v) connected to the port. The FIOs are digital ports and their state are read and writable and they can have only 0 or 3.3 v values (equivalent to 0 and 1 digits).
 This command reads a stream of analogue to digital conversion on port AIN1 at the sampling rate of 100kHz: ReadSignal = DeviceName.streanRead(100000, 'AIN1'):
 To close the device: DeviceName.close()
@@ -75,8 +76,10 @@ June 24, 2016
 '''
 
 
-from labjack import ljm
 import time
+import Clock_Service as Clock
+import Lazy_Import as Lazy
+ljm = Lazy.module('labjack.ljm')               # Loaded when the LabJack is opened
 import numpy as np
 import sys
 
@@ -132,6 +135,19 @@ class DetectDAQT7:
         return
 
 
+    def triggerPulse(self, Port, Pulse_Width = 0.0001):
+        '''
+        Generating a single rising edge pulse on a digital port (e.g., 'FIO2') for triggering the external devices.
+        Pulse_Width is in seconds. The pulse is held by a busy wait since time.sleep is too coarse for sub-millisecond pulses.
+        '''
+        self.Handle.eWriteName(self.Handle.handle, Port, 1)
+        Rising_Edge = Clock.timestamp()
+        while (Clock.timestamp() - Rising_Edge) < Pulse_Width:
+            pass
+        self.Handle.eWriteName(self.Handle.handle, Port, 0)
+        return Rising_Edge
+
+
     def readPort(self, Port):
         '''
         Reading analogue inpute values (0 to 10 v) in the AIN ports.
@@ -143,7 +159,7 @@ class DetectDAQT7:
         '''
         if type(Port) == str:
             Port = [Port]
-        return np.float(self.Handle.eReadNames(self.Handle.handle, len(Port) , Port)[0]), time.time()
+        return np.float(self.Handle.eReadNames(self.Handle.handle, len(Port) , Port)[0]), Clock.timestamp()
 
 
     def streamRead(self, scanRate, scansPerRead, Port):
@@ -177,10 +193,10 @@ class DetectDAQT7:
             #scansPerRead = 32764
             scanRate = self.Handle.eStreamStart(self.Handle.handle, scansPerRead, len(Port), aScanList, scanRate)
             print("\nStream started with a scan rate of %0.0f Hz." % scanRate)
-            StartingMoment = time.time()
+            StartingMoment = Clock.timestamp()
             Read = self.Handle.eStreamRead(self.Handle.handle)
             self.Handle.eStreamStop(self.Handle.handle)
-            FinishingMoment = time.time()
+            FinishingMoment = Clock.timestamp()
             #Signal = Read[0]
             #curSkip = Signal.count(-9999.0)
             print ('Elapsed time %f seconds' %(FinishingMoment - StartingMoment))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Single thread event scheduler based on monotonic deadlines.
+It replaces Timer_Multi_Process, which forked a new process running time.sleep for every shutter edge and buffer interval.
+The actions (shutter open/close, spectrometer arm, markers, ...) of a timeline are executed in one thread at their deadlines,
+and the moment each action is actually executed is logged, so the jitter of every edge can be checked after the recording.
+
+The scheduler sleeps in select() until shortly before a deadline and then spins for the last Spin_Time seconds.
+Adding an event or cancelling the timeline wakes the scheduler through a pipe, so it never polls a flag.
+
+To use this class, following syntax is recommended:
+import Event_Scheduler as ES
+Scheduler = ES.EventScheduler()                                         # Or ES.EventScheduler(Realtime = {'CPU': [2], 'Policy': 'fifo'}), see Realtime_Priority.py
+Scheduler.add(0.100, 'Shutter open', DAQ1.writePort, 'DAC0', 5)          # Offsets in seconds from the start of the timeline
+Scheduler.add(0.164, 'Shutter close', DAQ1.writePort, 'DAC0', 0)
+Scheduler.start()                                                       # Or Scheduler.run() to execute the timeline in the current thread
+Scheduler.schedule(0.010, 'Marker', Function)                           # Events can also be added while running, relative to now
+Scheduler.wait()
+Scheduler.Log                                                           # [(Name, Planned, Executed, Finished), ...] in monotonic seconds
+Scheduler.stop()
+"""
+
+import heapq
+import os
+import select
+import threading
+import Realtime_Priority as RP
+from Clock_Service import monotonic
+
+
+class EventScheduler:
+    '''
+    Executing timed actions in one thread and logging their execution time
+    '''
+    def __init__(self, Spin_Time = 0.0005, Realtime = None):
+        self.Spin_Time = Spin_Time          # The last part of every wait is spent spinning, since the wake up of select() is not precise
+        self.Timeline = []                  # Heap of (deadline, order, name, action, arguments)
+        self.Pending = []                   # Events added before the start, with their offsets instead of deadlines
+        self.Order = 0
+        self.Log = []
+        self.Start_Time = None
+        self.Lock = threading.Lock()
+        self.Idle = threading.Event()       # Set when there is no pending event
+        self.Idle.set()
+        self.Stopped = False
+        self.Thread = None
+        self.Wake_Read, self.Wake_Write = os.pipe()
+        self.Realtime = Realtime            # Affinity and priority settings of the scheduler thread
+        self.Realtime_Report = None
+
+    def add(self, Offset, Name, Action, *Args):
+        ''' Adding an action at Offset seconds from the start of the timeline '''
+        with self.Lock:
+            if self.Start_Time is None:
+                self.Pending.append((Offset, Name, Action, Args))
+                self.Idle.clear()
+            else:
+                self.push(self.Start_Time + Offset, Name, Action, Args)
+
+    def schedule(self, Delay, Name, Action, *Args):
+        ''' Adding an action Delay seconds from now. The scheduler must be started. '''
+        with self.Lock:
+            self.push(monotonic() + Delay, Name, Action, Args)
+
+    def push(self, Deadline, Name, Action, Args):
+        heapq.heappush(self.Timeline, (Deadline, self.Order, Name, Action, Args))
+        self.Order = self.Order + 1
+        self.Idle.clear()
+        os.write(self.Wake_Write, b'x')
+
+    def start(self, Start_Time = None):
+        ''' Starting the timeline in a separate thread. Start_Time (monotonic) is the moment of the offset zero. '''
+        self.Thread = threading.Thread(target=self.run, args=(Start_Time,))
+        self.Thread.daemon = True
+        self.Thread.start()
+
+    def run(self, Start_Time = None):
+        ''' Executing the timeline in the current thread until stop() is called or all the events are executed (when not started by start()) '''
+        if self.Realtime:
+            self.Realtime_Report = RP.configureWorker('Scheduler', self.Realtime)
+        with self.Lock:
+            self.Start_Time = monotonic() if Start_Time is None else Start_Time
+            for (Offset, Name, Action, Args) in self.Pending:
+                self.push(self.Start_Time + Offset, Name, Action, Args)
+            self.Pending = []
+        Keep_Running = self.Thread is not None and threading.current_thread() is self.Thread
+        while not self.Stopped:
+            with self.Lock:
+                Next = self.Timeline[0] if self.Timeline else None
+                if Next is None:
+                    self.Idle.set()
+            if Next is None:
+                if not Keep_Running:
+                    break
+                self.sleep(None)
+                continue
+            Remaining = Next[0] - monotonic()
+            if Remaining > self.Spin_Time:
+                self.sleep(Remaining - self.Spin_Time)
+                continue                    # An earlier event may have been added meanwhile
+            while monotonic() < Next[0]:
+                pass
+            with self.Lock:
+                if not self.Timeline or self.Timeline[0][1] != Next[1]:
+                    continue
+                heapq.heappop(self.Timeline)
+            Deadline, Order, Name, Action, Args = Next
+            Executed = monotonic()
+            try:
+                Action(*Args)
+            except Exception as e:
+                print ('Error in the scheduled action %s: %s' % (Name, e))
+            self.Log.append((Name, Deadline, Executed, monotonic()))
+        self.Idle.set()
+        if self.Realtime:
+            self.Realtime_Report = RP.measureWorker(self.Realtime_Report, self.Realtime)
+
+    def sleep(self, Timeout):
+        ''' Sleeping until Timeout seconds are passed or an event is added (or the scheduler is stopped) '''
+        Ready = select.select([self.Wake_Read], [], [], Timeout)[0]
+        if Ready:
+            os.read(self.Wake_Read, 4096)
+
+    def wait(self, Timeout = None):
+        ''' Waiting until all the pending events are executed. Returns True if there is no pending event. '''
+        return self.Idle.wait(Timeout)
+
+    def cancel(self):
+        ''' Removing all the pending events '''
+        with self.Lock:
+            self.Timeline = []
+            self.Pending = []
+            self.Idle.set()
+        os.write(self.Wake_Write, b'x')
+
+    def stop(self):
+        ''' Stopping the scheduler. The pending events are not executed. '''
+        self.Stopped = True
+        self.cancel()
+        if self.Thread is not None and self.Thread is not threading.current_thread():
+            self.Thread.join()
+        os.close(self.Wake_Read)
+        os.close(self.Wake_Write)
+
+    def lateness(self):
+        ''' Returning the name and the delay (seconds) between the deadline and the execution of every executed action '''
+        return [(Name, Executed - Deadline) for (Name, Deadline, Executed, Finished) in self.Log]
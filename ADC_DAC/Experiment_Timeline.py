@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative experiment descriptions compiled ahead of time into flat timelines.
+An experiment (devices, laser, paradigm, integration times, shutter sequence, duration and repetitions) is written in a JSON file
+(or YAML if PyYAML is installed) instead of being typed at the raw_input prompts. It is validated and compiled into a preallocated
+timeline before the acquisition starts: one row per action with its time offset, action code, port and value.
+The hot loop then only walks the rows; there is no parsing, allocation or branching on the paradigm type.
+
+Example of an experiment file (times in milliseconds unless the name says seconds):
+{
+    "Name": "Green multi-integration",
+    "Devices": {"DAQ": {"PhotoDiod_Port": "AIN1", "Shutter_Ports": {"G": "DAC0", "B": "DAC1"}, "Trigger_Port": "FIO2"},
+                "Spectrometer": {"Trigger_Mode": 0},
+                "PowerMeter": {"Average_Count": 1}},
+    "Laser": "G",
+    "Paradigm": "m",                                # c: continious, m: multi-integration, t: triggered multi-integration, s: shutter sequence
+    "Integration_list_MilSec": [8, 16, 32, 64],     # m and t
+    "Integration_Time": 10,                         # c
+    "DurationOfReading": 7,                         # c, seconds
+    "Shutter_Sequence": [[100, 164], [300, 400]],   # s, [open, close] pairs
+    "Integration_Buffer_Time": 100,
+    "Shutter_Delay": 4,
+    "Repetitions": 1,
+    "Repetition_Interval": 1                        # seconds
+}
+
+Optrode_Version2.py runs the c, m and t experiments of one repetition (the c paradigm from its timeline, m and t keep the shutter
+synchronized to the spectrometer) and refuses the fields it does not use; Batch_Runner.py runs the c, m and s experiments.
+
+To use this module, following syntax is recommended:
+import Experiment_Timeline as ET
+Experiment = ET.compileExperiment(ET.loadExperiment('Experiment.json'))
+Experiment['Timeline']                              # Rows of (Time, Action, Port, Value)
+Scheduler = ET.runTimeline(Experiment, {ET.SHUTTER_OPEN: Open_Function, ET.SHUTTER_CLOSE: Close_Function})
+"""
+
+import json
+import numpy as np
+import Event_Scheduler as ES
+
+
+# ############### Action codes of the timeline rows ###############
+SHUTTER_OPEN = 0
+SHUTTER_CLOSE = 1
+TRIGGER = 2             # Trigger pulse of the spectrometer
+INTEGRATION = 3         # Value is the integration time (ms) of the next acquisition
+MARKER = 4              # Value is the repetition number
+END = 5
+Action_Names = ['Shutter open', 'Shutter close', 'Trigger', 'Integration', 'Marker', 'End']
+
+Timeline_Type = np.dtype([('Time', float), ('Action', np.int32), ('Port', np.int32), ('Value', float)])
+
+Paradigms = ['c', 'm', 't', 's']
+Defaults = {'Name': '',
+            'Devices': {},
+            'Laser': 'G',
+            'Integration_Buffer_Time': 100,
+            'Shutter_Delay': 4,
+            'Repetitions': 1,
+            'Repetition_Interval': 1}
+Default_DAQ = {'PhotoDiod_Port': 'AIN1', 'Shutter_Ports': {'G': 'DAC0', 'B': 'DAC1'}, 'Trigger_Port': 'FIO2'}
+
+
+def loadExperiment(File_name):
+    ''' Loading an experiment description from a JSON file, or from a YAML file (.yaml or .yml) when PyYAML is installed '''
+    with open(File_name) as File:
+        if File_name.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise Exception('PyYAML is required to read %s. Install it or use a JSON file.' % File_name)
+            return yaml.safe_load(File)
+        return json.load(File)
+
+
+def isNumber(Value):
+    return isinstance(Value, (int, float)) and not isinstance(Value, bool)
+
+
+def validateExperiment(Description):
+    '''
+    Checking an experiment description and returning a copy completed with the default values.
+    An exception explaining the first problem is raised if the description is not valid.
+    '''
+    if not isinstance(Description, dict):
+        raise ValueError('The experiment description must be a dictionary')
+    Experiment = dict(Defaults)
+    Experiment.update(Description)
+    Devices = dict(Experiment['Devices'])
+    DAQ = dict(Default_DAQ)
+    DAQ.update(Devices.get('DAQ', {}))
+    Devices['DAQ'] = DAQ
+    Experiment['Devices'] = Devices
+
+    if Experiment.get('Paradigm') not in Paradigms:
+        raise ValueError('Paradigm must be one of %s' % ', '.join(Paradigms))
+    if Experiment['Laser'] not in DAQ['Shutter_Ports']:
+        raise ValueError('Laser %s has no shutter port in Devices/DAQ/Shutter_Ports' % Experiment['Laser'])
+    for Key in ['Integration_Buffer_Time', 'Shutter_Delay', 'Repetition_Interval']:
+        if not isNumber(Experiment[Key]) or Experiment[Key] < 0:
+            raise ValueError('%s must be a positive number' % Key)
+    if not isinstance(Experiment['Repetitions'], int) or Experiment['Repetitions'] < 1:
+        raise ValueError('Repetitions must be a positive integer')
+
+    Paradigm = Experiment['Paradigm']
+    if Paradigm in ['m', 't']:
+        Integration_list = Experiment.get('Integration_list_MilSec')
+        if not Integration_list or not all(isNumber(Each) and Each > 0 for Each in Integration_list):
+            raise ValueError('Integration_list_MilSec must be a list of positive integration times (ms)')
+    elif Paradigm == 'c':
+        for Key in ['Integration_Time', 'DurationOfReading']:
+            if not isNumber(Experiment.get(Key)) or Experiment[Key] <= 0:
+                raise ValueError('%s must be a positive number' % Key)
+    else:
+        Sequence = Experiment.get('Shutter_Sequence')
+        if not Sequence:
+            raise ValueError('Shutter_Sequence must be a list of [open, close] times (ms)')
+        Last_Close = -1
+        for Pair in Sequence:
+            if len(Pair) != 2 or not all(isNumber(Each) for Each in Pair) or not (Last_Close < Pair[0] < Pair[1]):
+                raise ValueError('Shutter_Sequence must be increasing [open, close] pairs, %s is not valid' % (Pair,))
+            Last_Close = Pair[1]
+    return Experiment
+
+
+def compileExperiment(Description):
+    '''
+    Validating an experiment description and compiling it into a flat timeline (see Timeline_Type).
+    Returns a dictionary with the Timeline, the Ports used by the rows, the Duration (s) of the timeline,
+    the number of spectra to read (No_Spec_Sample) and the validated Experiment.
+    '''
+    Experiment = validateExperiment(Description)
+    DAQ = Experiment['Devices']['DAQ']
+    Ports = [DAQ['Shutter_Ports'][Experiment['Laser']], DAQ['Trigger_Port']]
+    Shutter, Trigger = 0, 1
+    Buffer = Experiment['Integration_Buffer_Time']/1000.0
+    Delay = Experiment['Shutter_Delay']/1000.0
+    Paradigm = Experiment['Paradigm']
+
+    # ####### One repetition, with times in seconds from the start of the repetition #######
+    Rows = []
+    if Paradigm == 'm':
+        # Free running spectrometer with a fixed integration cycle, the first cycle has no exposure
+        Integration_list = Experiment['Integration_list_MilSec']
+        Cycle = (Integration_list[-1] + 2*Experiment['Integration_Buffer_Time'])/1000.0
+        Rows.append((0, INTEGRATION, -1, Integration_list[-1] + 2*Experiment['Integration_Buffer_Time']))
+        for I in range(len(Integration_list)):
+            Start = (I + 1)*Cycle + Buffer
+            Rows.append((Start, SHUTTER_OPEN, Shutter, 0))
+            Rows.append((Start + Integration_list[I]/1000.0, SHUTTER_CLOSE, Shutter, 0))
+        Length = (len(Integration_list) + 1)*Cycle + Buffer
+        No_Spec_Sample = len(Integration_list) + 1
+    elif Paradigm == 't':
+        # Every integration is triggered once the shutter is open
+        Start = 0
+        for Integration in Experiment['Integration_list_MilSec']:
+            Rows.append((Start, INTEGRATION, -1, Integration))
+            Rows.append((Start + Buffer, SHUTTER_OPEN, Shutter, 0))
+            Rows.append((Start + Buffer + Delay, TRIGGER, Trigger, 0))
+            Rows.append((Start + Buffer + Delay + Integration/1000.0, SHUTTER_CLOSE, Shutter, 0))
+            Start = Start + 2*Buffer + Delay + Integration/1000.0
+        Length = Start
+        No_Spec_Sample = len(Experiment['Integration_list_MilSec'])
+    elif Paradigm == 'c':
+        # Continious integration with the shutter open for the duration of the reading
+        Rows.append((0, INTEGRATION, -1, Experiment['Integration_Time']))
+        Rows.append((Buffer, SHUTTER_OPEN, Shutter, 0))
+        Rows.append((Buffer + Experiment['DurationOfReading'], SHUTTER_CLOSE, Shutter, 0))
+        Length = 2*Buffer + Experiment['DurationOfReading']
+        No_Spec_Sample = int(round(Length*1000/float(Experiment['Integration_Time'])))
+    else:
+        for (Open, Close) in Experiment['Shutter_Sequence']:
+            Rows.append((Open/1000.0, SHUTTER_OPEN, Shutter, 0))
+            Rows.append((Close/1000.0, SHUTTER_CLOSE, Shutter, 0))
+        Length = Experiment['Shutter_Sequence'][-1][1]/1000.0 + Buffer
+        No_Spec_Sample = 0
+
+    # ####### Repetitions are laid out one after the other in one preallocated array #######
+    Repetitions = Experiment['Repetitions']
+    Period = Length + Experiment['Repetition_Interval']
+    Timeline = np.zeros(Repetitions*(len(Rows) + 1) + 1, dtype = Timeline_Type)
+    Row_Index = 0
+    for Repetition in range(Repetitions):
+        Timeline[Row_Index] = (Repetition*Period, MARKER, -1, Repetition)
+        Row_Index = Row_Index + 1
+        for (Time, Action, Port, Value) in Rows:
+            Timeline[Row_Index] = (Repetition*Period + Time, Action, Port, Value)
+            Row_Index = Row_Index + 1
+    Duration = (Repetitions - 1)*Period + Length
+    Timeline[Row_Index] = (Duration, END, -1, 0)
+    Timeline = Timeline[np.argsort(Timeline['Time'], kind = 'mergesort')]
+
+    return {'Timeline': Timeline,
+            'Ports': Ports,
+            'Duration': Duration,
+            'No_Spec_Sample': No_Spec_Sample*Repetitions,
+            'Experiment': Experiment}
+
+
+def runTimeline(Compiled, Handlers, Scheduler = None, Start_Time = None):
+    '''
+    Executing a compiled timeline with the event scheduler. Handlers is a dictionary of action code: function(Port, Value),
+    where Port is the name of the port (or None). Actions without a handler are only logged.
+    The scheduler is returned once it is started; use Scheduler.wait() to block until the timeline is over.
+    '''
+    if Scheduler is None:
+        Scheduler = ES.EventScheduler()
+    Ports = Compiled['Ports']
+    No_Action = lambda Port, Value: None
+    Functions = [Handlers.get(Code, No_Action) for Code in range(len(Action_Names))]
+    for Row in Compiled['Timeline']:
+        Port = Ports[Row['Port']] if Row['Port'] >= 0 else None
+        Scheduler.add(float(Row['Time']), Action_Names[Row['Action']], Functions[Row['Action']], Port, float(Row['Value']))
+    Scheduler.start(Start_Time)
+    return Scheduler
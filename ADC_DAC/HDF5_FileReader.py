@@ -3,30 +3,296 @@
 Created on Tue Oct 18 16:25:43 2016
 
 @author: yjon701
+
+Lazy reader of the recordings (HDF5 files of Optrode_Version2.py, Universal_Reader.py, the acquisition sessions, ...).
+Opening a recording only reads its structure: the datasets stay on disk until they are sliced, the slices are returned in
+physical units (see decode), the time ranges are mapped to index ranges by a binary search on the time stamps of the group,
+and the contiguous uncompressed datasets (the recordings written before HDF5_FileWriter.py) are memory-mapped.
+
+To use this module, following syntax is recommended:
+import HDF5_FileReader as HR
+Data = HR.Recording(File_name)
+Data.describe()                                                 # Groups, datasets, shapes and encodings
+PhotoDiode, Time = Data['DAQT7'].between('PhotoDiode', 12.0, 14.0)   # The samples (and time stamps) from 12 to 14 s
+Spectra = Data['Spectrometer']['Intensities'][:, 100:200]       # Any slice, time along the last axis
+Time, Minimum, Maximum, Mean = Data['DAQT7'].overview('PhotoDiode', 0, 3600, Width = 1500)   # About 1500 points from the pyramid
+HR.plotOverview(Data['DAQT7'], 'PhotoDiode')                    # Read again at the right level when the plot is zoomed or panned
+Data.close()
+
+or, with the file chosen in a dialog window:
+Splitted_Data = HR.HDF5_Data(HR.GUI_GetData())
+Splitted_Data.DAQT7_PhotoDiode[:1000]
 """
 
-import h5py
-import matplotlib.pyplot as plt
-import Get_File_Path as GetFile
+import sys
+import numpy as np
+import Lazy_Import as Lazy
+h5py = Lazy.module('h5py')
+plt = Lazy.module('matplotlib.pyplot')
+GetFile = Lazy.module('Get_File_Path')
+
+
+Time_Names = ['TimeIndex', 'Time_Index']          # Names of the time stamps of a group (Time_Index for the spectrometer)
+Pyramid_Prefix = 'Pyramid_'                         # Group of the min/max/mean pyramid of a time series (see HDF5_FileWriter.Pyramid)
+
+
+def memoryMap(Dataset):
+    ''' Returning a read only memory map of a contiguous and uncompressed dataset, or None if it is chunked or not allocated '''
+    if Dataset.chunks is not None or Dataset.dtype.hasobject or Dataset.size == 0:
+        return None
+    Offset = Dataset.id.get_offset()
+    if Offset is None:
+        return None
+    return np.memmap(Dataset.file.filename, mode = 'r', dtype = Dataset.dtype, offset = Offset, shape = Dataset.shape)
+
+
+def searchSorted(Values, Time, Side = 'left'):
+    ''' Binary search of Time in increasing Values which are read one by one (a dataset or a TimeIndex), as np.searchsorted '''
+    Low, High = 0, len(Values)
+    while Low < High:
+        Middle = (Low + High)//2
+        Value = Values[Middle]
+        if Value < Time or (Side == 'right' and Value == Time):
+            Low = Middle + 1
+        else:
+            High = Middle
+    return Low
+
+
+class TimeIndex(object):
+    '''
+    Time stamps of a dataset, stored explicitly or as the (t0, dt, n) segments of the 'segments' encoding of HDF5_FileWriter.py.
+    The time stamps are rebuilt only for the selected slice, e.g. TimeIndex(Data['DAQT7/TimeIndex'])[1000:2000].
+    '''
+    def __init__(self, Dataset):
+        self.Dataset = Dataset
+        self.Segmented = 'Samples' in Dataset.attrs
+        if self.Segmented:
+            self.Segments = Dataset[...]                        # A few segments, read once
+            self.Starts = np.concatenate([[0], np.cumsum(self.Segments[2, :])]).astype(np.int64)
+        else:
+            self.Map = memoryMap(Dataset)
+
+    def __len__(self):
+        if self.Segmented:
+            return int(self.Starts[-1])
+        return self.Dataset.shape[-1]
+
+    def __getitem__(self, Selection):
+        if not self.Segmented:
+            return (self.Dataset if self.Map is None else self.Map)[Selection]
+        if isinstance(Selection, slice):
+            Indices = np.arange(*Selection.indices(len(self)))
+        elif isinstance(Selection, (int, np.integer)):
+            Indices = np.array(Selection + len(self) if Selection < 0 else Selection)
+        else:
+            Indices = np.arange(len(self))[Selection]
+        Segment = np.searchsorted(self.Starts, Indices, side = 'right') - 1
+        return self.Segments[0, Segment] + (Indices - self.Starts[Segment])*self.Segments[1, Segment]
+
+    def __array__(self, dtype = None):
+        return np.asarray(self[:], dtype = dtype)
+
+    def searchsorted(self, Time, Side = 'left'):
+        ''' Index of Time in the time stamps (which increase), as np.searchsorted, without reading them all '''
+        if not self.Segmented and self.Map is not None:
+            return int(np.searchsorted(self.Map, Time, side = Side))
+        return searchSorted(self, Time, Side)
+
+
+def decode(Dataset, Selection = Ellipsis):
+    '''
+    Reading a dataset (or a slice of it) in physical units, applying the Scale and Offset of the compact encodings of HDF5_FileWriter.py,
+    or rebuilding the time stamps stored as segments
+    '''
+    if 'Samples' in Dataset.attrs:
+        return TimeIndex(Dataset)[slice(None) if Selection is Ellipsis else Selection]
+    Values = Dataset[Selection]
+    if 'Scale' in Dataset.attrs:
+        return Values*Dataset.attrs['Scale'] + Dataset.attrs['Offset']
+    return Values
+
+
+class LazyDataset(object):
+    '''
+    A dataset which stays on disk until it is sliced; the slices are in physical units (see decode) and are read
+    from a memory map when the dataset is contiguous and uncompressed
+    '''
+    def __init__(self, Dataset):
+        self.Dataset = Dataset
+        self.Name = Dataset.name
+        self.shape = Dataset.shape if 'Samples' not in Dataset.attrs else (int(Dataset.attrs['Samples']),)
+        self.Map = memoryMap(Dataset) if 'Scale' not in Dataset.attrs else None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, Selection):
+        if self.Map is not None:
+            return self.Map[Selection]
+        return decode(self.Dataset, Selection)
+
+    def __array__(self, dtype = None):
+        return np.asarray(self[...], dtype = dtype)
+
+    def __repr__(self):
+        return '<Lazy dataset %s %s %s>' % (self.Name, self.shape, self.Dataset.dtype)
+
+    @property
+    def attrs(self):
+        return self.Dataset.attrs
+
+
+class Device(object):
+    '''
+    One group of a recording (e.g., DAQT7, Spectrometer, PM100_PowerMeter): its datasets, as LazyDataset, and its time stamps
+    '''
+    def __init__(self, Group):
+        self.Group = Group
+        self.Name = Group.name.strip('/')
+        Names = [Name for Name in Time_Names if Name in Group]
+        self.Time = TimeIndex(Group[Names[0]]) if Names else None
+
+    def __getitem__(self, Name):
+        return LazyDataset(self.Group[Name])
+
+    def __contains__(self, Name):
+        return Name in self.Group
+
+    def keys(self):
+        ''' Names of the datasets of the group (the pyramids are left out) '''
+        return [Name for Name in self.Group.keys() if isinstance(self.Group[Name], h5py.Dataset)]
+
+    @property
+    def attrs(self):
+        return self.Group.attrs
+
+    def indices(self, Start = None, End = None):
+        ''' Slice of the samples whose time stamps are from Start to End (included), found by binary search '''
+        if self.Time is None:
+            raise ValueError('%s does not have time stamps (%s)' % (self.Name, ' or '.join(Time_Names)))
+        First = 0 if Start is None else self.Time.searchsorted(Start, 'left')
+        Last = len(self.Time) if End is None else self.Time.searchsorted(End, 'right')
+        return slice(First, Last)
+
+    def between(self, Name, Start = None, End = None):
+        ''' Returning the samples of a dataset (time along its last axis) and their time stamps, from Start to End '''
+        Range = self.indices(Start, End)
+        return self[Name][..., Range], self.Time[Range]
+
+    def overview(self, Name, Start = None, End = None, Width = 1000):
+        '''
+        Returning the time, minimum, maximum and mean of a time series from Start to End in about Width points (or more), for plotting.
+        The rows are read from the coarsest level of the pyramid which still has Width rows in the window; without pyramid, or when
+        the window has few samples, the samples are read (and decimated when there are more than Width).
+        '''
+        Range = self.indices(Start, End)
+        Per_Point = (Range.stop - Range.start)/float(max(Width, 1))
+        Level = None
+        if Pyramid_Prefix + Name in self.Group:
+            Pyramid = self.Group[Pyramid_Prefix + Name]
+            for Key in Pyramid.keys():
+                if Pyramid[Key].attrs['Bucket'] <= Per_Point and (Level is None or Pyramid[Key].attrs['Bucket'] > Level.attrs['Bucket']):
+                    Level = Pyramid[Key]
+        if Level is not None:
+            Bucket = int(Level.attrs['Bucket'])
+            Rows = Level[:, Range.start//Bucket:-(-Range.stop//Bucket)]
+            return Rows[0], Rows[1], Rows[2], Rows[3]
+        Values = np.asarray(self[Name][Range], dtype = float)
+        Times = np.asarray(self.Time[Range], dtype = float)
+        Step = int(Per_Point)
+        if Step < 2:
+            return Times, Values, Values, Values
+        Length = (len(Values)//Step)*Step
+        Block = Values[:Length].reshape(-1, Step)
+        return Times[:Length:Step], Block.min(axis = 1), Block.max(axis = 1), Block.mean(axis = 1)
+
+
+def plotOverview(Device, Name, Start = None, End = None, Width = 1500, Axes = None):
+    ''' Plotting a time series as its min/max band and mean (see Device.overview), read again when the plot is zoomed or panned '''
+    Axes = Axes or plt.gca()
+    Drawn = {}
+    def draw(Start, End):
+        Times, Minimum, Maximum, Mean = Device.overview(Name, Start, End, Width)
+        if 'Band' in Drawn:
+            Drawn['Band'].remove()
+            Drawn['Mean'].set_data(Times, Mean)
+        else:
+            Drawn['Mean'], = Axes.plot(Times, Mean, label = Name)
+        Drawn['Band'] = Axes.fill_between(Times, Minimum, Maximum, color = Drawn['Mean'].get_color(), alpha = 0.3, linewidth = 0)
+    draw(Start, End)
+    Axes.callbacks.connect('xlim_changed', lambda Axes: draw(*Axes.get_xlim()))
+    return Axes
+
+
+class Recording(object):
+    '''
+    A recording opened lazily: only its structure is read until a dataset is sliced
+    '''
+    def __init__(self, File_name):
+        self.File_name = File_name
+        self.File = h5py.File(File_name, 'r')
+        self.Devices = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def __getitem__(self, Name):
+        if Name not in self.Devices:
+            self.Devices[Name] = Device(self.File[Name])
+        return self.Devices[Name]
+
+    def __contains__(self, Name):
+        return Name in self.File
+
+    def keys(self):
+        return [Name for Name in self.File.keys() if isinstance(self.File[Name], h5py.Group)]
+
+    @property
+    def attrs(self):
+        return self.File.attrs
+
+    def describe(self):
+        ''' Printing the groups and datasets of the recording, with their shapes, types, encodings and time spans '''
+        print('%s' % self.File_name)
+        for Name in self.keys():
+            Group = self[Name]
+            Span = ''
+            if Group.Time is not None and len(Group.Time):
+                Span = ', %d samples from %.6f to %.6f s' % (len(Group.Time), Group.Time[0], Group.Time[-1])
+            print('  %s%s' % (Name, Span))
+            for Key in Group.keys():
+                Dataset = Group.Group[Key]
+                Encoding = 'segments' if 'Samples' in Dataset.attrs else ('scaled ' if 'Scale' in Dataset.attrs else '') + str(Dataset.dtype)
+                print('    %-16s %-20s %-16s %s' % (Key, Group[Key].shape, Encoding, 'chunked' if Dataset.chunks else 'contiguous'))
+
+    def close(self):
+        self.File.close()
 
 
 class HDF5_Data:
+    '''
+    The datasets of an opened recording as attributes named Group_Dataset (e.g., Splitted_Data.DAQT7_PhotoDiode),
+    which are LazyDataset read when they are sliced
+    '''
     def __init__(self, Data):
-        #self.data = Data
-        if   len((Data).keys()) == 3:
-            print('Optrode version 1 (old)')
-            self.allocator(Data)
-        elif len(Data.keys()) == 2:
-            print('Optrode version 2 (new)')
-            self.allocator(Data)
-                  
-    def allocator(self, Data):                          # This function creats the variable from the loaded data set
+        self.Data = Data
+        self.Names = {}
+        for Group in Data.keys():
+            if isinstance(Data[Group], h5py.Group):
+                for Name in Data[Group].keys():
+                    self.Names[Group + '_' + Name] = Group + '/' + Name
         print('\nYour variables are \'Splitted_Data.\' + following attributes: \n')
-        for I  in range(len(Data.keys())):
-            for II in range(len(Data[Data.keys()[I]].keys())):
-                exec((Data.keys()[I] + '_' + Data[Data.keys()[I]].keys()[II]) + "=Data[Data.keys()[I]].values()[II]")   
-                setattr(self, Data.keys()[I] + '_' + Data[Data.keys()[I]].keys()[II], Data[Data.keys()[I]].values()[II])
-                print(Data.keys()[I] + '_' + Data[Data.keys()[I]].keys()[II])
+        for Name in sorted(self.Names):
+            print(Name)
+
+    def __getattr__(self, Name):
+        if Name in self.__dict__.get('Names', {}):
+            return LazyDataset(self.Data[self.Names[Name]])
+        raise AttributeError(Name)
 
 
 def GUI_GetData():
@@ -39,6 +305,10 @@ def GUI_GetData():
 
 if __name__ == "__main__":
 
+    if len(sys.argv) > 1:                   # python HDF5_FileReader.py File_name: describing a recording without the dialog window
+        with Recording(sys.argv[1]) as Data:
+            Data.describe()
+        sys.exit()
 
     Data = GUI_GetData()
     Splitted_Data = HDF5_Data(Data)
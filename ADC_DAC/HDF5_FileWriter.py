@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming HDF5 writer of the recordings, shared by the acquisition scripts (counterpart of HDF5_FileReader.py).
+The scripts used to write every dataset in one shot after the run, contiguous and uncompressed, with a copy of the same
+SaveDataPWR/SaveDataDAQ/SaveDataSpec functions in each of them. The writer creates resizable chunked datasets instead, so the samples
+can be appended while the acquisition is running (e.g., from a Chunked_Buffer) and each append only writes the new chunks.
+The time runs along the last axis of every dataset (samples, or wavelength x samples for the spectra, as in the recordings of
+Optrode_Version2.py), and a chunk holds whole spectra and about Chunk_Bytes of samples. The datasets can be compressed with
+gzip or lzf, with or without the shuffle filter. A compressed chunk is compressed again at every append which touches it, so the writer
+is uncompressed by default for the small appends made during the acquisition; the recordings written in one pass after the acquisition
+(saveGroup, Acquisition_Session.saveRecords, Raw_Capture.convert, ...) use Save_Compression. The attributes (device details, clock mapping, ...) are written once when a group
+or dataset is created. The samples can be stored with a compact encoding (see Encodings): float32, or 16 bits integers with the
+Scale and Offset attributes which HDF5_FileReader.decode applies to return the physical values. The time stamps stay float64,
+and the time stamps of regularly sampled streams (streamRead of the DAQT7) can be stored as run-length segments (t0, dt, n) with the
+'segments' encoding: a new segment starts at each gap or skip, and HDF5_FileReader.TimeIndex rebuilds the time stamps slice by slice.
+The time series can have a min/max/mean pyramid (see Pyramid), built while the samples are appended or afterwards by buildPyramids,
+from which HDF5_FileReader.Device.overview reads a long recording at the resolution of the plot.
+
+To use this class, following syntax is recommended:
+import HDF5_FileWriter as HW
+Writer = HW.HDF5Writer(File_name, Attributes = {'Time Zero': Time_Zero})   # Or Compression = HW.Save_Compression when the samples are written in large blocks
+Writer.createGroup('DAQT7', {'DAQT7 Details': DAQ1.getDetails()})
+Writer.createSeries('DAQT7/TimeIndex')                                  # Time series of floats
+Writer.createSeries('Spectrometer/Intensities', Shape = (No_Pixels,), Encoding = 'float32')  # Spectra, wavelength x samples ('counts' for raw uncorrected spectra)
+Writer.createSeries('DAQT7/PhotoDiode', Encoding = 'adc12')              # Raw 12 bits codes of the ADC-DAC Pi
+Writer.createSeries('DAQT7/TimeIndex', Encoding = 'segments')           # Or time stamps of a regularly sampled stream, as (t0, dt, n) segments
+Writer.append('DAQT7/PhotoDiode', DAQ_Signal)                           # As many times as needed, during the acquisition
+Writer.appendBuffer('DAQT7/PhotoDiode', 'DAQT7/TimeIndex', DAQ_Buffer)  # The rows of a Chunked_Buffer which were not written yet
+Writer.createPyramid('DAQT7/PhotoDiode')                                # Before the first append, for the plots of long recordings
+Writer.appendSeries('DAQT7/PhotoDiode', 'DAQT7/TimeIndex', DAQ_Signal, DAQ_Time)   # Samples and time stamps, and their pyramid
+Writer.write('Spectrometer/WaveLength', Wavelengths)                   # Fixed (not resizable) dataset
+Writer.close()
+
+or to save a group of arrays in one call:
+HW.saveGroup(HW.timestampedName('Chose_a_Name_DAQT7'), 'DAQT7', [('Voltages', DAQ_Signal, 'adc12'), ('TimeIndex', DAQ_Time)], {'DAQT7 Details': Details})
+HW.buildPyramids(File_name)                                             # Pyramids of the time series of an existing recording
+"""
+
+import datetime
+import time
+import numpy as np
+import Lazy_Import as Lazy
+h5py = Lazy.module('h5py')
+
+
+Filters = ['gzip', 'lzf', None]
+Save_Compression = 'lzf'        # Compression of the recordings written in one pass after the acquisition
+Chunk_Bytes = 256*1024          # Target size of a chunk, large enough for the filters and small enough to be written at every append
+Pyramid_Bucket = 64             # Samples in a row of the first level of a pyramid; shorter windows are read from the samples
+Pyramid_Factor = 8              # Rows of a level in a row of the next level
+
+# Compact encodings of the samples: stored type, and Scale and Offset of the integer types (physical value = stored value*Scale + Offset)
+Encodings = {'float64': {'dtype': 'float64'},
+             'float32': {'dtype': 'float32'},
+             'counts': {'dtype': 'uint16', 'Scale': 1.0, 'Offset': 0.0},          # Raw spectrometer counts (readIntensity(False, False)); the corrected spectra are floats, use float32
+             'adc12': {'dtype': 'uint16', 'Scale': 3.3/4096, 'Offset': 0.0},      # Voltages of the 12 bits ADC of the ADC-DAC Pi (3.3 V reference), i.e. the raw codes
+             'volts': {'dtype': 'int16', 'Scale': 10.0/32767, 'Offset': 0.0},     # +/-10 V inputs of the DAQT7, in 0.3 mV steps
+             'segments': {'dtype': 'float64', 'Tolerance': 1e-6}}              # Time stamps as regular (t0, dt, n) segments, exact to Tolerance (s)
+
+
+def timestampedName(File_name_PreFix, Separator = ''):
+    ''' File name made of the prefix and the current date and time, as used by the scripts (e.g., Chose_a_Name_DAQT72016-06-24-10-30-00.hdf5) '''
+    return File_name_PreFix + Separator + datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H-%M-%S') + ".hdf5"
+
+
+def chunkShape(Shape, Item_Size, Chunk_Bytes = Chunk_Bytes):
+    ''' Chunk of a dataset whose time runs along the last axis: the whole leading axes and about Chunk_Bytes of samples '''
+    Leading = int(np.prod(Shape)) if len(Shape) else 1
+    return tuple(Shape) + (max(1, Chunk_Bytes//(Leading*Item_Size)),)
+
+
+def encoding(Encoding):
+    ''' Returning the encoding (dictionary with dtype, and Scale and Offset for the integer types) given by its name or as a dictionary '''
+    if Encoding is None:
+        return Encodings['float64']
+    if isinstance(Encoding, dict):
+        return Encoding
+    if Encoding not in Encodings:
+        raise ValueError('Encoding must be one of %s or a dictionary' % ', '.join(sorted(Encodings)))
+    return Encodings[Encoding]
+
+
+def encode(Values, Encoding):
+    ''' Converting physical values to the stored type of an encoding. Returns the stored values and the number of values clipped to its range. '''
+    dtype = np.dtype(Encoding['dtype'])
+    if 'Scale' not in Encoding:
+        return np.asarray(Values, dtype = dtype), 0
+    Stored = np.round((np.asarray(Values, dtype = float) - Encoding['Offset'])/Encoding['Scale'])
+    Limits = np.iinfo(dtype)
+    Clipped = int(np.count_nonzero((Stored < Limits.min) | (Stored > Limits.max)))
+    return np.clip(Stored, Limits.min, Limits.max).astype(dtype), Clipped
+
+
+def leadingRun(Times, Step, Tolerance):
+    ''' Number of leading time stamps which are Times[0] + i*Step to Tolerance '''
+    Tolerance = Tolerance + 8*np.spacing(abs(Times[0]))      # The time stamps (e.g., since the epoch) are not more accurate than their floats
+    Off = np.flatnonzero(np.abs(Times - (Times[0] + np.arange(len(Times))*Step)) > Tolerance)
+    return int(Off[0]) if len(Off) else len(Times)
+
+
+def runLength(Times, Start, Step, Tolerance):
+    '''
+    Number of time stamps from Start which are Times[Start] + i*Step to Tolerance, and Step refined on them. The windows double
+    in size and the step is refined on each window, so long runs cost few steps and the rounding of the step does not add up.
+    '''
+    Length = 4
+    while True:
+        Window = Times[Start:Start + Length]
+        Run = leadingRun(Window, Step, Tolerance)
+        if Run < len(Window) or Start + Length >= len(Times):
+            return Run, Step
+        Step = (Window[-1] - Window[0])/(len(Window) - 1)
+        Length = Length*2
+
+
+def regularSegments(Times, Tolerance = Encodings['segments']['Tolerance']):
+    '''
+    Splitting time stamps in regular segments: returns a 3 x segments array of (t0, dt, n), where the n time stamps of a segment are
+    t0 + i*dt to Tolerance. A gap or a skip ends a segment; an isolated irregular time stamp is a segment of one or two samples.
+    '''
+    Times = np.asarray(Times, dtype = float)
+    Segments = []
+    Start = 0
+    while Start < len(Times):
+        if Start + 1 == len(Times):
+            Segments.append((Times[Start], 0.0, 1))
+            break
+        Length, Step = runLength(Times, Start, Times[Start + 1] - Times[Start], Tolerance)
+        if Length > 2:
+            # The step of the whole segment is more accurate, if it still matches all the time stamps
+            Mean_Step = (Times[Start + Length - 1] - Times[Start])/(Length - 1)
+            if leadingRun(Times[Start:Start + Length], Mean_Step, Tolerance) == Length:
+                Step = Mean_Step
+        Segments.append((Times[Start], Step, Length))
+        Start = Start + Length
+    return np.array(Segments, dtype = float).reshape(-1, 3).T
+
+
+def attributeValue(Value):
+    ''' Strings are stored as fixed length byte strings, as the np.string_ attributes of the scripts '''
+    if isinstance(Value, bytes):
+        return np.bytes_(Value)
+    if isinstance(Value, type(u'')):
+        return np.bytes_(Value.encode('utf-8'))
+    return Value
+
+
+class Pyramid(object):
+    '''
+    Min/max/mean decimation levels of a time series, built incrementally: the group Pyramid_<name> next to the series holds the datasets
+    Level1, Level2, ... whose columns are (time of the first sample, minimum, maximum, mean) of Bucket, Bucket*Factor, ... samples.
+    The complete rows are written as the samples are added, the last (partial) ones when the pyramid is closed.
+    '''
+    def __init__(self, Writer, Path, Bucket = Pyramid_Bucket, Factor = Pyramid_Factor):
+        self.Writer = Writer
+        self.Path = Path
+        self.Bucket = Bucket
+        self.Factor = Factor
+        Writer.createGroup(Path, {'Bucket': Bucket, 'Factor': Factor})
+        self.Samples, self.Times = np.zeros(0), np.zeros(0)     # Samples which do not fill a row of the first level yet
+        self.Pending = []                                       # Rows (time, minimum, maximum, sum, count) of each level not in the next level yet
+        self.Levels = 0
+
+    def level(self, Level):
+        if Level == self.Levels:
+            self.Writer.createSeries(self.Path + '/Level%i' % (Level + 1), Shape = (4,), Attributes = {'Bucket': self.Bucket*self.Factor**Level})
+            self.Pending.append(np.zeros((5, 0)))
+            self.Levels = self.Levels + 1
+        return self.Path + '/Level%i' % (Level + 1)
+
+    def write(self, Level, Rows):
+        self.Writer.append(self.level(Level), np.vstack([Rows[:3], Rows[3]/Rows[4]]))
+
+    def add(self, Values, Times):
+        ''' Adding samples (physical values) and their time stamps '''
+        Values = np.concatenate([self.Samples, np.asarray(Values, dtype = float).ravel()])
+        Times = np.concatenate([self.Times, np.asarray(Times, dtype = float).ravel()])
+        Complete = (len(Values)//self.Bucket)*self.Bucket
+        if Complete:
+            Block = Values[:Complete].reshape(-1, self.Bucket)
+            self.push(0, np.vstack([Times[:Complete:self.Bucket], Block.min(axis = 1), Block.max(axis = 1), Block.sum(axis = 1),
+                                    np.ones(len(Block))*self.Bucket]))
+        self.Samples, self.Times = Values[Complete:], Times[Complete:]
+
+    def push(self, Level, Rows):
+        ''' Writing complete rows to a level, and the groups of Factor of them to the next level '''
+        self.write(Level, Rows)
+        Pending = np.hstack([self.Pending[Level], Rows])
+        Complete = (Pending.shape[1]//self.Factor)*self.Factor
+        if Complete:
+            Groups = Pending[:, :Complete].reshape(5, -1, self.Factor)
+            self.push(Level + 1, np.vstack([Groups[0, :, 0], Groups[1].min(axis = 1), Groups[2].max(axis = 1), Groups[3].sum(axis = 1), Groups[4].sum(axis = 1)]))
+        self.Pending[Level] = Pending[:, Complete:]
+
+    def close(self):
+        ''' Writing the partial rows: the last samples in the first level, and at each level the rows not in the next level yet '''
+        Rows = None
+        if len(self.Samples):
+            Rows = np.array([[self.Times[0]], [self.Samples.min()], [self.Samples.max()], [self.Samples.sum()], [len(self.Samples)]])
+        for Level in range(max(self.Levels, 1 if Rows is not None else 0)):
+            if Rows is not None:
+                self.write(Level, Rows)
+                Pending = np.hstack([self.Pending[Level], Rows])
+            else:
+                Pending = self.Pending[Level]
+            Rows = None
+            if Pending.shape[1]:
+                Rows = np.array([[Pending[0, 0]], [Pending[1].min()], [Pending[2].max()], [Pending[3].sum()], [Pending[4].sum()]])
+            self.Pending[Level] = np.zeros((5, 0))
+        self.Samples, self.Times = np.zeros(0), np.zeros(0)
+
+
+def pyramidPath(Path):
+    ''' Path of the pyramid of a time series, e.g. DAQT7/Pyramid_PhotoDiode '''
+    Group, Name = Path.rsplit('/', 1) if '/' in Path else ('', Path)
+    return (Group + '/' if Group else '') + 'Pyramid_' + Name
+
+
+class HDF5Writer(object):
+    '''
+    One HDF5 file with resizable chunked datasets which are written incrementally
+    '''
+    def __init__(self, File_name, Compression = None, Compression_Level = 4, Shuffle = True, Chunk_Bytes = Chunk_Bytes, Attributes = None, Mode = 'w'):
+        '''
+        Compression is one of Filters ('gzip', 'lzf' or None, the default for appends during the acquisition), Compression_Level is the gzip level (0 to 9)
+        and Shuffle groups the bytes of the samples before the compression, which helps both filters with floats.
+        Mode 'a' opens an existing file to add datasets (e.g., pyramids) to it.
+        '''
+        if Compression not in Filters:
+            raise ValueError('Compression must be one of %s' % Filters)
+        self.File_name = File_name
+        self.Options = {}
+        if Compression is not None:
+            self.Options['compression'] = Compression
+            if Compression == 'gzip':
+                self.Options['compression_opts'] = Compression_Level
+            self.Options['shuffle'] = Shuffle
+        self.Chunk_Bytes = Chunk_Bytes
+        self.File = h5py.File(File_name, Mode)
+        self.Positions = {}                    # Number of rows of each Chunked_Buffer already written, by dataset path
+        self.Encodings = {}                    # Integer or segments encoding of the datasets, by dataset path
+        self.Pyramids = {}                     # Pyramid of the time series, by dataset path
+        self.setAttributes('/', Attributes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def setAttributes(self, Path, Attributes):
+        ''' Writing the attributes of a group or dataset (once, when it is created) '''
+        for Key, Value in (Attributes or {}).items():
+            self.File[Path].attrs[Key] = attributeValue(Value)
+
+    def createGroup(self, Path, Attributes = None):
+        Group = self.File.require_group(Path)
+        self.setAttributes(Path, Attributes)
+        return Group
+
+    def createSeries(self, Path, Shape = (), dtype = float, Attributes = None, Encoding = None):
+        '''
+        Creating an empty resizable dataset of samples along the last axis. Shape is the shape of one sample,
+        e.g. () for a time series or (No_Pixels,) for spectra stored as wavelength x samples.
+        Encoding is the name of one of the Encodings (or a dictionary like them); the integer encodings keep their Scale and Offset
+        in the attributes of the dataset, so HDF5_FileReader.decode returns the physical values. Without Encoding, dtype is stored as is.
+        With the 'segments' encoding (time stamps only), the dataset holds the (t0, dt, n) segments and its Samples attribute the number of time stamps.
+        '''
+        Shape = tuple(Shape)
+        if Encoding is not None:
+            Encoding = encoding(Encoding)
+            dtype = Encoding['dtype']
+            if 'Tolerance' in Encoding:
+                if Shape:
+                    raise ValueError('Only the time stamps (Shape = ()) can be stored as segments')
+                Shape = (3,)
+        Dataset = self.File.create_dataset(Path, shape = Shape + (0,), maxshape = Shape + (None,), dtype = dtype,
+                                           chunks = chunkShape(Shape, np.dtype(dtype).itemsize, self.Chunk_Bytes), **self.Options)
+        if Encoding is not None and 'Scale' in Encoding:
+            Dataset.attrs['Scale'] = Encoding['Scale']
+            Dataset.attrs['Offset'] = Encoding['Offset']
+            self.Encodings[Path] = Encoding
+        elif Encoding is not None and 'Tolerance' in Encoding:
+            Dataset.attrs['Samples'] = 0
+            Dataset.attrs['Tolerance'] = Encoding['Tolerance']
+            self.Encodings[Path] = Encoding
+        self.setAttributes(Path, Attributes)
+        return Dataset
+
+    def appendSegments(self, Path, Times):
+        '''
+        Appending time stamps to a dataset of segments: the first ones extend the last segment if they follow it, the others
+        make new segments. Returns the new number of time stamps.
+        '''
+        Dataset = self.File[Path]
+        Times = np.asarray(Times, dtype = float).ravel()
+        Samples = Dataset.attrs['Samples'] + len(Times)
+        Tolerance = self.Encodings[Path]['Tolerance']
+        Count = Dataset.shape[-1]
+        if Count and len(Times):
+            t0, dt, n = Dataset[:, Count - 1]
+            if n == 1:
+                # One time stamp does not have a step yet: it is segmented again with the new ones
+                Times = np.concatenate([[t0], Times])
+                Count = Count - 1
+            else:
+                Length = leadingRun(np.concatenate([[t0 + (n - 1)*dt], Times]), dt, Tolerance) - 1
+                Dataset[2, Count - 1] = n + Length
+                Times = Times[Length:]
+        Segments = regularSegments(Times, Tolerance)
+        Dataset.resize(Count + Segments.shape[-1], axis = 1)
+        Dataset[:, Count:] = Segments
+        Dataset.attrs['Samples'] = Samples
+        return Samples
+
+    def append(self, Path, Values):
+        '''
+        Appending samples (along the last axis) to a dataset made by createSeries, encoded with the encoding of the dataset.
+        The number of values out of the range of an integer encoding is kept in the Clipped attribute. Returns the new number of samples.
+        '''
+        Dataset = self.File[Path]
+        if 'Tolerance' in self.Encodings.get(Path, {}):
+            return self.appendSegments(Path, Values)
+        if Path in self.Encodings:
+            Values, Clipped = encode(Values, self.Encodings[Path])
+            if Clipped:
+                Dataset.attrs['Clipped'] = Dataset.attrs.get('Clipped', 0) + Clipped
+        else:
+            Values = np.asarray(Values, dtype = Dataset.dtype)
+        if Values.ndim < Dataset.ndim:
+            Values = Values.reshape(Dataset.shape[:-1] + (-1,))
+        Start = Dataset.shape[-1]
+        Dataset.resize(Start + Values.shape[-1], axis = Dataset.ndim - 1)
+        Dataset[..., Start:] = Values
+        return Dataset.shape[-1]
+
+    def createPyramid(self, Path, Bucket = Pyramid_Bucket, Factor = Pyramid_Factor):
+        ''' Building the min/max/mean pyramid of a time series (one value per sample) from the samples given to appendSeries or appendBuffer '''
+        self.Pyramids[Path] = Pyramid(self, pyramidPath(Path), Bucket, Factor)
+        return self.Pyramids[Path]
+
+    def appendSeries(self, Signal_Path, Time_Path, Values, Times):
+        ''' Appending samples and their time stamps, and adding them to the pyramid of the series. Returns the new number of samples. '''
+        self.append(Signal_Path, Values)
+        if Signal_Path in self.Pyramids:
+            self.Pyramids[Signal_Path].add(Values, Times)
+        return self.append(Time_Path, Times)
+
+    def appendBuffer(self, Signal_Path, Time_Path, Buffer):
+        '''
+        Appending the rows of a Chunked_Buffer which were not written yet: the values to Signal_Path (one sample per row,
+        transposed for the spectra) and the time stamps to Time_Path. Can be called during the acquisition. Returns the number of rows written.
+        '''
+        Start = self.Positions.get(Signal_Path, 0)
+        End = len(Buffer)
+        Row = 0
+        for (Values, Times) in Buffer.chunks():
+            Chunk_Start, Chunk_End = max(Start - Row, 0), min(End - Row, len(Times))
+            if Chunk_Start < Chunk_End:
+                self.appendSeries(Signal_Path, Time_Path, Values[Chunk_Start:Chunk_End].T, Times[Chunk_Start:Chunk_End])
+            Row = Row + len(Times)
+        self.Positions[Signal_Path] = End
+        return End - Start
+
+    def write(self, Path, Data, Attributes = None):
+        ''' Writing a fixed dataset at once (e.g., the wavelengths), chunked and compressed if it is large enough '''
+        Data = np.asanyarray(Data)
+        Options = self.Options if Data.nbytes >= self.Chunk_Bytes else {}
+        Dataset = self.File.create_dataset(Path, data = Data, **Options)
+        self.setAttributes(Path, Attributes)
+        return Dataset
+
+    def flush(self):
+        self.File.flush()
+
+    def close(self):
+        if self.File:
+            for Path in self.Pyramids:
+                self.Pyramids[Path].close()
+            self.Pyramids = {}
+            self.File.close()
+
+
+def saveGroup(File_name, Group, Datasets, Attributes = None, File_Attributes = None, **Options):
+    '''
+    Saving the arrays of one device in a new file: Datasets is a list of (name, array) or (name, array, encoding) saved in Group,
+    with time along the last axis. Options are passed to HDF5Writer (Compression, by default Save_Compression, Shuffle, ...). Returns the file name.
+    '''
+    Options.setdefault('Compression', Save_Compression)
+    with HDF5Writer(File_name, Attributes = File_Attributes, **Options) as Writer:
+        Writer.createGroup(Group, Attributes)
+        for Dataset in Datasets:
+            Name, Data = Dataset[0], np.asanyarray(Dataset[1])
+            Writer.createSeries(Group + '/' + Name, Shape = Data.shape[:-1], dtype = Data.dtype, Encoding = (Dataset[2:] or [None])[0])
+            Writer.append(Group + '/' + Name, Data)
+    return File_name
+
+
+def buildPyramids(File_name, Paths = None, Block_Size = 2**20, **Options):
+    '''
+    Adding the pyramids of the time series of an existing recording (e.g., saved before the pyramids or by saveGroup). Paths are the
+    series ('DAQT7/PhotoDiode', ...); by default every one dimensional dataset with as many samples as the time stamps of its group.
+    Options are passed to HDF5Writer (Compression, by default Save_Compression, ...). Returns the paths of the series.
+    '''
+    Options.setdefault('Compression', Save_Compression)
+    import HDF5_FileReader as HR
+    with HDF5Writer(File_name, Mode = 'a', **Options) as Writer:
+        if Paths is None:
+            Paths = []
+            for Group in Writer.File.values():
+                if not isinstance(Group, h5py.Group):
+                    continue
+                Time_Names = [Name for Name in HR.Time_Names if Name in Group]
+                if not Time_Names or (Group[Time_Names[0]].ndim > 1 and 'Samples' not in Group[Time_Names[0]].attrs):
+                    continue            # No time stamps, or time stamps of each port (ports x samples)
+                Samples = len(HR.TimeIndex(Group[Time_Names[0]]))
+                for Name in Group:
+                    Dataset = Group[Name]
+                    if isinstance(Dataset, h5py.Dataset) and Name not in HR.Time_Names and Dataset.shape == (Samples,):
+                        Paths.append(Dataset.name.strip('/'))
+        for Path in Paths:
+            if pyramidPath(Path) in Writer.File:
+                del Writer.File[pyramidPath(Path)]
+            Group = Writer.File[Path].parent
+            Time = HR.TimeIndex(Group[[Name for Name in HR.Time_Names if Name in Group][0]])
+            Pyramid = Writer.createPyramid(Path)
+            for Start in range(0, len(Time), Block_Size):
+                Pyramid.add(HR.decode(Writer.File[Path], slice(Start, Start + Block_Size)), Time[Start:Start + Block_Size])
+    return Paths
+
+
+if __name__ == "__main__":
+    import sys
+    # python HDF5_FileWriter.py Records/*.hdf5: adding the pyramids of the time series of the recordings
+    for File_name in sys.argv[1:]:
+        print ('%s: %s' % (File_name, ', '.join(buildPyramids(File_name)) or 'no time series'))
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Latency and jitter benchmark of the acquisition path, built from Testing_Latencies.py and the *_Speed_Test functions of Optrode_Version2.py.
+It measures the call latency of every device, the jitter between consecutive samples, the end-to-end latency from a shutter
+command to the photodiode edge and the time needed to save a recording, and reports p50/p95/p99/max with a histogram of each metric.
+The results are written as JSON and can be compared against a stored baseline, so a regression of the acquisition path is caught
+before a lab session. With --simulated the benchmark runs on the simulated devices of Simulated_Devices.py.
+
+To use this script, following syntax is recommended:
+python Latency_Benchmark.py --simulated --output Results.json
+python Latency_Benchmark.py --output Results.json --baseline Baseline.json       # Exits with 1 if a metric is worse than the baseline
+python Latency_Benchmark.py --simulated --output Baseline.json                   # Storing a new baseline
+
+or from python:
+import Latency_Benchmark as LB
+Results = LB.runBenchmark(DAQ1, Spec1, Power_meter)
+LB.writeResults(Results, 'Results.json')
+Regressions = LB.compareBaseline(Results, LB.readResults('Baseline.json'))
+"""
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import numpy as np
+import Clock_Service as Clock
+
+
+Percentiles = [50, 95, 99]
+No_Bins = 20
+
+
+def statistics(Samples):
+    ''' Returning the count, mean, std, p50/p95/p99, max and histogram of a list of durations (seconds) '''
+    Samples = np.asarray(Samples, dtype = float)
+    if len(Samples) == 0:
+        return {'Count': 0}
+    Counts, Edges = np.histogram(Samples, bins = No_Bins)
+    Result = {'Count': int(len(Samples)),
+              'Mean': float(np.mean(Samples)),
+              'Std': float(np.std(Samples)),
+              'Min': float(np.min(Samples)),
+              'Max': float(np.max(Samples)),
+              'Histogram': {'Counts': [int(Each) for Each in Counts], 'Edges': [float(Each) for Each in Edges]}}
+    for (Percentile, Value) in zip(Percentiles, np.percentile(Samples, Percentiles)):
+        Result['p%i' % Percentile] = float(Value)
+    return Result
+
+
+def callLatency(Function, No_Tests, *Args):
+    ''' Duration of No_Tests calls of Function(*Args) and the time stamps they return (if any) '''
+    Durations = np.zeros(No_Tests)
+    Stamps = np.zeros(No_Tests)
+    for I in range(No_Tests):
+        Start = Clock.monotonic()
+        Returned = Function(*Args)
+        Durations[I] = Clock.monotonic() - Start
+        if isinstance(Returned, tuple):
+            Stamps[I] = Returned[-1]
+    return Durations, Stamps
+
+
+def sampleJitter(TimeIndex):
+    ''' Deviation of the intervals between consecutive time stamps from their median interval '''
+    Intervals = np.diff(np.asarray(TimeIndex, dtype = float))
+    return np.abs(Intervals - np.median(Intervals))
+
+
+def shutterLatency(DAQ, Shutter_Port, PhotoDiod_Port, No_Cycles = 20, Threshold = 1.0, Timeout = 0.5):
+    '''
+    End-to-end latency from the shutter command (writePort) to the edge seen on the photodiode, for the opening and closing
+    edges of No_Cycles shutter cycles. An edge that is not seen within Timeout seconds is reported as missed.
+    '''
+    Latencies = {'Open': [], 'Close': []}
+    Missed = 0
+    for I in range(No_Cycles):
+        for (Edge, Volt) in [('Open', 5), ('Close', 0)]:
+            DAQ.writePort(Shutter_Port, Volt)
+            Command = Clock.timestamp()
+            while True:
+                Signal, Stamp = DAQ.readPort(PhotoDiod_Port)
+                if (Signal > Threshold) == (Volt > 0):
+                    Latencies[Edge].append(Stamp - Command)
+                    break
+                if Stamp - Command > Timeout:
+                    Missed = Missed + 1
+                    break
+    DAQ.writePort(Shutter_Port, 0)
+    return Latencies, Missed
+
+
+def saveTime(No_Samples, No_Pixels, No_Tests = 5):
+    '''
+    Time needed to save a recording (spectra, photodiode and power) of the given size with Acquisition_Session.saveRecords,
+    the HDF5_FileWriter path of the scripts (encodings, compression and pyramids included)
+    '''
+    import Acquisition_Session as AS
+    Durations = np.zeros(No_Tests)
+    Start_Time = Clock.timestamp()
+    Spec_Time = Start_Time + 0.01*np.arange(No_Samples)
+    Signal_Time = Start_Time + 0.0001*np.arange(No_Samples*10)
+    Record = {'Spectrometer': {'Kind': 'Spectrometer', 'Signal': 1000*np.random.rand(No_Samples, No_Pixels), 'TimeIndex': Spec_Time,
+                               'WaveLength': np.linspace(200, 1100, No_Pixels), 'Details': ''},
+              'DAQT7': {'Kind': 'DAQ', 'Signal': 3.3*np.random.rand(No_Samples*10, 1), 'TimeIndex': Signal_Time, 'Details': '', 'Encoding': 'adc12'},
+              'PM100_PowerMeter': {'Kind': 'PowerMeter', 'Signal': np.random.rand(No_Samples*10, 1), 'TimeIndex': Signal_Time, 'Details': ''}}
+    File, File_name = tempfile.mkstemp(suffix = '.hdf5')
+    os.close(File)
+    try:
+        for I in range(No_Tests):
+            Start = Clock.monotonic()
+            AS.saveRecords(File_name, Record)
+            Durations[I] = Clock.monotonic() - Start
+    finally:
+        os.remove(File_name)
+    return Durations
+
+
+def runBenchmark(DAQ, Spec = None, Power_meter = None, Shutter_Port = 'DAC0', PhotoDiod_Port = 'AIN1',
+                 No_DAQ_Tests = 2000, No_Spec_Tests = 50, No_Power_Tests = 200, No_Shutter_Cycles = 20, Save = True):
+    ''' Running all the measurements on the given devices. Returns a dictionary with the environment and the statistics of every metric. '''
+    Metrics = {}
+    Durations, Stamps = callLatency(DAQ.readPort, No_DAQ_Tests, PhotoDiod_Port)
+    Metrics['DAQ call latency'] = statistics(Durations)
+    Metrics['DAQ sample jitter'] = statistics(sampleJitter(Stamps))
+
+    if Spec is not None:
+        Spec.setTriggerMode(0)
+        Spec.setIntegrationTime(Spec.Handle.minimum_integration_time_micros)
+        Durations, Stamps = callLatency(Spec.readIntensity, No_Spec_Tests, True, True)
+        Metrics['Spectrometer call latency'] = statistics(Durations)
+        Metrics['Spectrometer sample jitter'] = statistics(sampleJitter(Stamps))
+
+    if Power_meter is not None:
+        Durations, Stamps = callLatency(Power_meter.readPower, No_Power_Tests)
+        Metrics['Power meter call latency'] = statistics(Durations)
+        Metrics['Power meter sample jitter'] = statistics(sampleJitter(Stamps))
+
+    if No_Shutter_Cycles > 0:
+        Latencies, Missed = shutterLatency(DAQ, Shutter_Port, PhotoDiod_Port, No_Shutter_Cycles)
+        Metrics['Shutter open to photodiode'] = statistics(Latencies['Open'])
+        Metrics['Shutter close to photodiode'] = statistics(Latencies['Close'])
+        Metrics['Shutter open to photodiode']['Missed'] = Missed
+
+    if Save:
+        No_Pixels = len(Spec.Handle.wavelengths()) if Spec is not None else 2048
+        Metrics['Save time'] = statistics(saveTime(No_Spec_Tests, No_Pixels))
+
+    return {'Environment': {'Time': Clock.timestamp(),
+                            'Python': platform.python_version(),
+                            'Machine': platform.machine(),
+                            'Node': platform.node(),
+                            'DAQ': type(DAQ).__name__,
+                            'Spectrometer': type(Spec).__name__,
+                            'Power meter': type(Power_meter).__name__},
+            'Metrics': Metrics}
+
+
+def writeResults(Results, File_name):
+    with open(File_name, 'w') as File:
+        json.dump(Results, File, indent = 2, sort_keys = True)
+
+
+def readResults(File_name):
+    with open(File_name) as File:
+        return json.load(File)
+
+
+def compareBaseline(Results, Baseline, Tolerance = 0.25, Floor = 0.0001, Keys = ('p95', 'p99')):
+    '''
+    Comparing the results against a baseline. A metric regresses when one of its Keys is more than Tolerance (relative)
+    and Floor seconds (absolute) above the baseline. Returns a list of (Metric, Key, Baseline value, Value).
+    '''
+    Regressions = []
+    for Metric in sorted(Results['Metrics']):
+        if Metric not in Baseline['Metrics']:
+            continue
+        for Key in Keys:
+            Reference = Baseline['Metrics'][Metric].get(Key)
+            Value = Results['Metrics'][Metric].get(Key)
+            if Reference is None or Value is None:
+                continue
+            if Value > Reference*(1 + Tolerance) and Value - Reference > Floor:
+                Regressions.append((Metric, Key, Reference, Value))
+    return Regressions
+
+
+def printResults(Results):
+    print ('%-32s %8s %10s %10s %10s %10s' % ('Metric (ms)', 'Count', 'p50', 'p95', 'p99', 'Max'))
+    for Metric in sorted(Results['Metrics']):
+        Each = Results['Metrics'][Metric]
+        if Each['Count'] == 0:
+            print ('%-32s %8i' % (Metric, 0))
+            continue
+        print ('%-32s %8i %10.3f %10.3f %10.3f %10.3f' % (Metric, Each['Count'], Each['p50']*1000, Each['p95']*1000, Each['p99']*1000, Each['Max']*1000))
+
+
+def plotHistograms(Results):
+    import matplotlib.pyplot as plt
+    Metrics = sorted(Results['Metrics'])
+    plt.figure()
+    for I, Metric in enumerate(Metrics):
+        Histogram = Results['Metrics'][Metric].get('Histogram')
+        if Histogram is None:
+            continue
+        plt.subplot(int(np.ceil(len(Metrics)/3.0)), 3, I + 1)
+        Edges = np.asarray(Histogram['Edges'])*1000
+        plt.bar(Edges[:-1], Histogram['Counts'], width = np.diff(Edges), align = 'edge')
+        plt.title(Metric)
+        plt.xlabel('Time (ms)')
+    plt.show()
+
+
+if __name__ == "__main__":
+    import argparse
+    Parser = argparse.ArgumentParser(description = 'Latency and jitter benchmark of the acquisition devices')
+    Parser.add_argument('--simulated', action = 'store_true', help = 'use the simulated devices instead of the hardware')
+    Parser.add_argument('--output', help = 'JSON file for the results')
+    Parser.add_argument('--baseline', help = 'JSON results to compare against')
+    Parser.add_argument('--tolerance', type = float, default = 0.25, help = 'relative increase of p95/p99 reported as a regression')
+    Parser.add_argument('--shutter-cycles', type = int, default = 20)
+    Parser.add_argument('--plot', action = 'store_true', help = 'plot the histograms')
+    Arguments = Parser.parse_args()
+
+    if Arguments.simulated:
+        import Simulated_Devices as SD
+        DAQ1 = SD.SimulatedDAQ()
+        Spec1 = SD.SimulatedSpectrometer(Light = DAQ1)
+        Power_meter = SD.SimulatedPM100(Light = DAQ1)
+    else:
+        import ADC_DAC_PiC
+        import SeaBreeze_Objective as SBO
+        import ThorlabsPM100_Objective as P100
+        DAQ1 = ADC_DAC_PiC.DetectPi()
+        Spec1 = SBO.DetectSpectrometer()
+        Power_meter = P100.DetectPM100D()
+        if Spec1.Error == 1:
+            Spec1 = None
+        if Power_meter.Error == 1:
+            Power_meter = None
+
+    try:
+        Results = runBenchmark(DAQ1, Spec1, Power_meter, No_Shutter_Cycles = Arguments.shutter_cycles)
+    finally:
+        DAQ1.close()
+        if Spec1 is not None:
+            Spec1.close()
+    printResults(Results)
+    if Arguments.output:
+        writeResults(Results, Arguments.output)
+        print ('Results are saved in %s' % Arguments.output)
+    if Arguments.plot:
+        plotHistograms(Results)
+    if Arguments.baseline:
+        Regressions = compareBaseline(Results, readResults(Arguments.baseline), Arguments.tolerance)
+        for (Metric, Key, Reference, Value) in Regressions:
+            print ('Regression: %s %s is %.3f ms (baseline %.3f ms)' % (Metric, Key, Value*1000, Reference*1000))
+        if Regressions:
+            sys.exit(1)
+        print ('No regression against %s' % Arguments.baseline)
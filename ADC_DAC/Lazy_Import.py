@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy imports of the heavy dependencies and startup time report of the scripts.
+Importing matplotlib.pyplot, h5py, seabreeze, ThorlabsPM100 and labjack takes seconds on the Pi, and every script used to import all of them
+before the first prompt, even when the run never plots or saves. A lazy module is imported the first time one of its attributes is used,
+so a headless run (e.g. Batch_Runner.py) never imports matplotlib and a device driver is only loaded when that device is opened.
+The time spent in every lazy import is recorded, and startupReport() prints how long the script took from the start of the
+interpreter to the point where it is ready to acquire.
+
+To use this module, following syntax is recommended:
+import Lazy_Import as Lazy
+plt = Lazy.module('matplotlib.pyplot')                  # Instead of import matplotlib.pyplot as plt
+h5py = Lazy.module('h5py')
+DAQ1 = ADC_DAC_PiC.DetectPi() if Use_DAQ else Lazy.Unused('DAQ')
+Lazy.startupReport()                                    # Once the devices are open
+
+The startup time of the modules can be measured, each in a fresh interpreter, with:
+python Lazy_Import.py Batch_Runner Acquisition_Session Optrode_Version2
+"""
+
+import importlib
+import os
+import sys
+import time
+
+
+Import_Times = {}                       # Name: time (seconds) spent importing a lazy module
+Heavy_Modules = ['matplotlib', 'h5py', 'seabreeze', 'ThorlabsPM100', 'labjack', 'ABE_ADCDACPi']
+
+
+def processStart():
+    ''' Wall time at which the interpreter was started (Linux), or now if it is not known '''
+    try:
+        with open('/proc/self/stat') as File:
+            Start_Ticks = float(File.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as File:
+            Uptime = float(File.read().split()[0])
+        return time.time() - Uptime + Start_Ticks/os.sysconf('SC_CLK_TCK')
+    except (IOError, OSError, ValueError, IndexError):
+        return time.time()
+
+
+Process_Start = processStart()
+
+
+class LazyModule(object):
+    '''
+    Stand-in for a module which is imported when one of its attributes is used
+    '''
+    def __init__(self, Name):
+        self.__dict__['Name'] = Name
+        self.__dict__['Module'] = None
+
+    def load(self):
+        if self.Module is None:
+            Start = time.time()
+            self.__dict__['Module'] = importlib.import_module(self.Name)
+            Import_Times[self.Name] = time.time() - Start
+        return self.Module
+
+    def __getattr__(self, Attribute):
+        return getattr(self.load(), Attribute)
+
+    def __setattr__(self, Attribute, Value):
+        setattr(self.load(), Attribute, Value)
+
+    def __repr__(self):
+        return '<lazy module %s%s>' % (self.Name, '' if self.Module is None else ' (imported)')
+
+
+def module(Name):
+    ''' Returning the module called Name, imported the first time one of its attributes is used '''
+    if Name in sys.modules:
+        return sys.modules[Name]
+    return LazyModule(Name)
+
+
+def isImported(Name):
+    ''' True if the module (or package) called Name has been imported '''
+    return Name in sys.modules
+
+
+class Unused:
+    '''
+    Stand-in for a device which is not opened because the session does not need it
+    '''
+    def __init__(self, Name):
+        self.Name = Name
+        self.Error = 1
+
+    def close(self):
+        return
+
+
+def startupReport(Label = 'Startup'):
+    ''' Printing and returning the time since the start of the interpreter, the time of the lazy imports and the heavy modules imported '''
+    Report = {'Startup': time.time() - Process_Start,
+              'Imports': dict(Import_Times),
+              'Heavy modules': [Name for Name in Heavy_Modules if isImported(Name)]}
+    print ('%s: ready in %.2f s (lazy imports %.2f s%s)' % (Label, Report['Startup'], sum(Import_Times.values()),
+           ''.join(', %s %.2f s' % Each for Each in sorted(Import_Times.items()))))
+    return Report
+
+
+def measureImport(Name, Python = None):
+    ''' Importing the module called Name in a fresh interpreter. Returns the import time (seconds) and the heavy modules it imported. '''
+    import json
+    import subprocess
+    Code = ('import sys, time, json; Start = time.time(); import %s; '
+            'print(json.dumps([time.time() - Start, [Each for Each in %r if Each in sys.modules]]))' % (Name, Heavy_Modules))
+    Output = subprocess.check_output([Python or sys.executable, '-c', Code], cwd = os.path.dirname(os.path.abspath(__file__)))
+    return tuple(json.loads(Output.decode().strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    Names = sys.argv[1:] or ['Acquisition_Session', 'Experiment_Timeline', 'Batch_Runner', 'Latency_Benchmark',
+                             'SeaBreeze_Objective', 'ThorlabsPM100_Objective', 'ADC_DAC_PiC']
+    print ('%-28s %10s   %s' % ('Module', 'Import (s)', 'Heavy modules imported'))
+    for Name in Names:
+        try:
+            Duration, Heavy = measureImport(Name)
+            print ('%-28s %10.3f   %s' % (Name, Duration, ', '.join(Heavy) or '-'))
+        except Exception as e:
+            print ('%-28s %10s   %s' % (Name, 'failed', e))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel acquisition from several OceanOptics spectrometers (e.g., reference and sample channels).
+Each spectrometer is opened by its serial number and read by its own process into its own shared memory buffer,
+so every device runs at its full integration rate. All the Time_Index datasets share the same time base (Time_Zero).
+
+To use this class, following syntax is recommended:
+import Multi_Spectrometer_Reader as MSR
+Specs = MSR.MultiSpectrometer()                 # Opens all the connected spectrometers, or MSR.MultiSpectrometer(['HR+C1234', 'QEP01234'])
+Specs.setTriggerMode(0)
+Specs.setIntegrationTime(10)                    # Integration time in ms
+Specs.read(200)                                 # Reads 200 spectra from every spectrometer in parallel
+Specs.save(h5py_File)                           # One group per spectrometer: 'Spectrometer_<serial>'
+Specs.close()
+"""
+
+import time
+import Clock_Service as Clock
+import numpy as np
+from multiprocessing import Process, Value, RawArray
+import SeaBreeze_Objective as SBO
+
+
+# ########## A function for reading one spectrometer in its own process ###########
+def Spec_Read_Process(Spec, Full_Spec_Records, Spec_Time, Spec_Index, No_Spec_Sample):
+    Wave_len = len(Spec.Handle.wavelengths())
+    Records = np.frombuffer(Full_Spec_Records, dtype = float).reshape(No_Spec_Sample, Wave_len)
+    Times = np.frombuffer(Spec_Time, dtype = float)
+    while (Spec_Index.value < No_Spec_Sample):
+        Records[Spec_Index.value], Times[Spec_Index.value] = Spec.readIntensity(True, True)
+        Spec_Index.value = Spec_Index.value + 1
+
+
+class MultiSpectrometer:
+    '''
+    Opening several spectrometers by their serial numbers and reading them in parallel
+    '''
+    def __init__(self, Serials = None):
+        if Serials is None:
+            Serials = SBO.listSerials()
+        self.Specs = []
+        for Serial in Serials:
+            Spec = SBO.DetectSpectrometer(Serial)
+            if Spec.Error == 0:
+                self.Specs.append(Spec)
+        self.Error = int(len(self.Specs) == 0)
+        self.Time_Zero = 0
+        self.Buffers = {}
+
+    def serials(self):
+        return [Spec.Serial for Spec in self.Specs]
+
+    def setIntegrationTime(self, Integration_Time):
+        ''' Setting the same integration time (ms) on all the spectrometers. Integration_Time can also be a dictionary of serial: integration time. '''
+        for Spec in self.Specs:
+            if type(Integration_Time) == dict:
+                Spec.setIntegrationTime(Integration_Time[Spec.Serial]*1000)
+            else:
+                Spec.setIntegrationTime(Integration_Time*1000)
+
+    def setTriggerMode(self, Trigger_mode):
+        for Spec in self.Specs:
+            Spec.setTriggerMode(Trigger_mode)
+
+    def read(self, No_Spec_Sample):
+        '''
+        Reading No_Spec_Sample spectra from every spectrometer, one process per spectrometer.
+        No_Spec_Sample can also be a dictionary of serial: number of samples.
+        '''
+        Processes = []
+        self.Buffers = {}
+        for Spec in self.Specs:
+            if type(No_Spec_Sample) == dict:
+                No_Sample = No_Spec_Sample[Spec.Serial]
+            else:
+                No_Sample = No_Spec_Sample
+            Wave_len = len(Spec.Handle.wavelengths())
+            Buffer = {'Intensities': RawArray('d', No_Sample*Wave_len),
+                      'Time_Index': RawArray('d', No_Sample),
+                      'Index': Value('i', 0),
+                      'Shape': (No_Sample, Wave_len)}
+            self.Buffers[Spec.Serial] = Buffer
+            Processes.append(Process(target=Spec_Read_Process, args=(Spec, Buffer['Intensities'], Buffer['Time_Index'], Buffer['Index'], No_Sample)))
+        self.Time_Zero = Clock.timestamp()            # Common time base of all the spectrometers
+        for Pros_Spec in Processes:
+            Pros_Spec.start()
+        for Pros_Spec in Processes:
+            Pros_Spec.join()
+        return self.records()
+
+    def records(self):
+        ''' Returning a dictionary of serial: (Intensities, Time_Index) of the last reading '''
+        Records = {}
+        for Serial in self.Buffers:
+            Buffer = self.Buffers[Serial]
+            Index = Buffer['Index'].value
+            Intensities = np.frombuffer(Buffer['Intensities'], dtype = float).reshape(Buffer['Shape'])[:Index]
+            Time_Index = np.frombuffer(Buffer['Time_Index'], dtype = float)[:Index]
+            Records[Serial] = (Intensities, Time_Index)
+        return Records
+
+    def save(self, File):
+        ''' Saving the last reading in an open h5py File, one group per spectrometer '''
+        Records = self.records()
+        for Spec in self.Specs:
+            if Spec.Serial not in Records:
+                continue
+            Intensities, Time_Index = Records[Spec.Serial]
+            Group = File.create_group('Spectrometer_%s' % Spec.Serial)
+            Group.create_dataset('Intensities', data = Intensities.T)        # Same layout as 'Spectrometer/Intensities': wavelength x samples
+            Group.create_dataset('Time_Index', data = Time_Index)
+            Group.create_dataset('WaveLength', data = np.asanyarray(Spec.readWavelength()))
+            Group.attrs['Spectrometer Details'] = str(Spec.readDetails())
+            Group.attrs['Time Zero'] = self.Time_Zero
+
+    def close(self):
+        for Spec in self.Specs:
+            Spec.close()
+
+
+if __name__ == "__main__":
+    import h5py
+    import datetime
+
+    Specs = MultiSpectrometer()
+    if Specs.Error == 1:
+        print ('Cession failed: could not detect any spectrometers')
+    else:
+        Specs.setTriggerMode(0)
+        Specs.setIntegrationTime(10)
+        Specs.read(100)
+        File_name = "Chose_a_Name_Spectrometers" + str('%s' %datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H-%M-%S'))+ ".hdf5"
+        f = h5py.File(File_name, "w")
+        Specs.save(f)
+        f.close()
+        Specs.close()
@@ -5,17 +5,25 @@ Created on Tue Jul 12 11:00:10 2016
 """
 
 #%%
-import h5py
+import Lazy_Import as Lazy
 #import DAQT7_Objective as DAQ
 import ADC_DAC_PiC
 import SeaBreeze_Objective as SBO
 import ThorlabsPM100_Objective as P100
 import time
 import datetime
+import json
 import numpy as np
 from multiprocessing import Process, Value, Array
-import matplotlib.pyplot as plt
+plt = Lazy.module('matplotlib.pyplot')
 import os.path
+import threading
+import Event_Scheduler as ES
+import Experiment_Timeline as ET
+import Chunked_Buffer as CB
+import HDF5_FileWriter as HW
+import Background_Worker as BW
+import sys
 #%%
 time_start =  time.time()
 
@@ -29,19 +37,67 @@ Blue_Laser = "FIO0"
 Blue_Shutter = "DAC1"
 
 PhotoDiod_Port = "AIN1"
-#Spectrometer_Trigger_Port = "DAC1"
+Spectrometer_Trigger_Port = "FIO2"         # External trigger input of the spectrometer, a digital port of the LabJack. Both DACs of the ADC_DAC Pi drive the shutters, so it can not trigger
+Spectrometer_Trigger_Mode = 4              # External hardware edge trigger for HR2000+, USB2000+, Flame and HR4000 (use 3 for Maya and QE65000)
+Power_Chunk_Rows = 4096                    # Readings per chunk of the power buffer, which grows while the power meter is read
 
-Pradigm = 'm'       # Pardigm refers to the continious or multi-integration performance of the Optrode ==> c: continious, and m: multi-integration recording
+# Fields of the Devices of an experiment file (see Experiment_Timeline.py) which are used by the Optrode
+Experiment_Fields = {'DAQ': ['PhotoDiod_Port', 'Shutter_Ports', 'Trigger_Port'],
+                     'Spectrometer': ['Trigger_Mode'],
+                     'PowerMeter': ['Average_Count']}
 
+Pradigm = 'm'       # Pardigm refers to the continious or multi-integration performance of the Optrode ==> c: continious, m: multi-integration and t: triggered multi-integration recording
+
+
+
+DAQ_Lock = threading.Lock()                 # The shutter and trigger threads and the main thread share the DAQ handle
 
 
 # ######## A function for reading the DAQ analogue inpute on AINX ########
 def DAQ_Read_Process(No_DAC_Sample): 
-    while DAQ_Index[0] < No_DAC_Sample:
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
-        DAQ_Index[0] = DAQ_Index[0] + 1
+    while len(DAQ_Buffer) < No_DAC_Sample:
+        DAQ_Buffer.append(*DAQ1.readPort(PhotoDiod_Port))
     DAQ_Is_Read.value = 1
 
+
+def DAQ_Read():
+    with DAQ_Lock:
+        return DAQ1.readPort(PhotoDiod_Port)
+
+
+def DAQ_Write(Port, Volt):
+    with DAQ_Lock:
+        DAQ1.writePort(Port, Volt)
+
+
+def Experiment_Error(Compiled):
+    ''' Returns why a compiled experiment can not be run by the Optrode as it is described, or None '''
+    Description = Compiled['Experiment']
+    if Description['Paradigm'] == 's':
+        return 'shutter sequences are not a paradigm of the Optrode, run them with Batch_Runner.py'
+    if Description['Repetitions'] != 1:
+        return 'the Optrode records one repetition per run (Repetitions is %i), run the repetitions with Batch_Runner.py' % Description['Repetitions']
+    for Device in Description['Devices']:
+        for Field in Description['Devices'][Device]:
+            if Field not in Experiment_Fields.get(Device, []):
+                return 'Devices/%s/%s is not used by the Optrode' % (Device, Field)
+    Trigger_Mode = Description['Devices'].get('Spectrometer', {}).get('Trigger_Mode')
+    if (Description['Paradigm'] == 't') and (Trigger_Mode == 0):
+        return 'the triggered paradigm needs the external trigger mode of the spectrometer, Trigger_Mode is 0'
+    if (Description['Paradigm'] != 't') and (Trigger_Mode not in [None, 0]):
+        return 'the %s paradigm runs the spectrometer free running, Trigger_Mode must be 0' % Description['Paradigm']
+    return None
+
+
+def Trigger_Port_Error(DAQ, Trigger_Port, Shutter_Ports):
+    ''' Returns why the triggered paradigm can not run on this DAQ, or None if the trigger port can be used '''
+    Outputs = getattr(DAQ, 'Output_Ports', None)
+    if (Outputs is not None) and (Trigger_Port not in Outputs):
+        return '%s has no %s output (outputs: %s)' % (DAQ.__class__.__name__, Trigger_Port, ', '.join(Outputs))
+    if Trigger_Port in Shutter_Ports:
+        return '%s is driving a shutter' % Trigger_Port
+    return None
+
 # ######## A function for testing the speed of the DAQ analogue inpute on AINX ########
 def DAQ_Speed_Test(No_DAQ_Tests):
     Scratch_Signal = 0
@@ -73,26 +129,16 @@ def Power_Speed_Test(No_Power_Tests):
     return Mean_Time
 
 
-# ######## A function for reading the Power meter ########
-def Power_Read_Process(No_Power_Sample):
-    
-    while Power_Index[0] < No_Power_Sample:
-        Power_Signal[Power_Index[0]], Power_Time[Power_Index[0]] = Power_meter.readPower()
-        Power_Index[0] = Power_Index[0] + 1
+# ######## Functions for reading the Power meter in the background ########
+def Power_Read_Start():
+    Power_meter.startReader(Power_Buffer)           # Every reading is appended to the growable Power_Buffer
+
+
+def Power_Read_Stop():
+    Power_meter.stopReader()
     Power_Is_Read.value = 1
     
     
-# ####################### Interrupt like delays (s) #######################
-# Usage Ex: Px = Process(target=Timer_Multi_Process, args=(Timer_time,))
-# Px.start() and in your code constantly check for "Timer_Is_Done"
-
-def Timer_Multi_Process(Time_In_Seconds):
-    if Timer_Is_Over.value is 1:
-        print ('Error: This timer can be called one at a time. The previous timer is still running')
-    time.sleep(Time_In_Seconds)
-    Timer_Is_Over.value = 1
-   
-   
 ######## A function for initializing the spectrometer (integration time and triggering mode #########
 def Spec_Init_Process(Integration_Time, Trigger_mode):      # Integration time in milliseconds
     #print 'Spectrometer is initialized'
@@ -113,6 +159,7 @@ def Spec_Speed_Test(No_Spec_Tests):
         Start_Time = time.time()
         Spec_Read_Process(No_Spec_Tests)
         Spec_Index[0] = 0
+        Spec_Buffer.reset()
         '''
         while I < No_Spec_Tests:
             Scratch_Signal, Mean_Time = Spec1.readIntensity(True, True)
@@ -140,11 +187,10 @@ def Spec_Speed_Test(No_Spec_Tests):
 # ########## A function for reading the spectrometer intensities ########### 
 def Spec_Read_Process(No_Spec_Sample):
     I = 0   
-    Wave_len = len(Spec1.Handle.wavelengths())
     while (I < No_Spec_Sample):
         #Last_Spec_Record[:] = Current_Spec_Record[:]
         #Current_Spec_Record[:], Spec_Time[Spec_Index[0]] = Spec1.readIntensity(True, True)
-        Full_Spec_Records2[Spec_Index[0]*Wave_len : (Spec_Index[0] + 1)*Wave_len ], Spec_Time[Spec_Index[0]] = Spec1.readIntensity(True, True)
+        Spec_Buffer.append(*Spec1.readIntensity(True, True))
         Spec_Index[0] = Spec_Index[0] + 1
         Spec_Is_Read.value = 1        
         #print ("spectrometer Index is %i" % Spec_Index[0])
@@ -152,17 +198,13 @@ def Spec_Read_Process(No_Spec_Sample):
 
 
 # ################### Below paradigm is based on free running of the spectrometer ##############################
-def Multi_Integration_Paradigm(Integration_list_MilSec, Integration_Buffer_Time, Shutter_Delay, No_Power_Sample):
+def Multi_Integration_Paradigm(Integration_list_MilSec, Integration_Buffer_Time, Shutter_Delay):
     if (Power_meter.Error == 0):
-        Pros_Power = Process(target=Power_Read_Process, args=(No_Power_Sample,))
-        Pros_Power.start()
+        Power_Read_Start()
         
     Integration_Base = Integration_list_MilSec[-1] + 2*Integration_Buffer_Time
     
     Trigger_mode = 0        # Free running 
-    OrderOfTheProcess = 2   # Order of Process: 0 = setting the timer for the duration of the laser exposure
-                            # 1 = turning off the laser (the exposure time is over) and waiting for the spectromer to finish the current integration cycle
-                            # 2 = integration time is over and spectrom must be read and setting the timer for the buffer time of the integration cycle
        
     Spec_Init_Done.value = 0
     #Pros_Spec_Init = Process(target = Spec_Init_Process, args=(Integration_list_MilSec[Spec_Index[0]], Trigger_mode))
@@ -174,78 +216,110 @@ def Multi_Integration_Paradigm(Integration_list_MilSec, Integration_Buffer_Time,
     Pros_Spec = Process(target=Spec_Read_Process, args=(len(Integration_list_MilSec), ))
     Pros_Spec.start()    
    
+    # The shutter edges are executed by the scheduler thread at their deadlines, while this loop keeps reading the photo diode
+    Scheduler = ES.EventScheduler()
+    Scheduler.start()
     print ('Step1, First itegration does not have laser exposure', time.time())
     while (Spec_Index[0] < len(Integration_list_MilSec)):
-        if  (Timer_Is_Over.value == 1) & (OrderOfTheProcess == 0):
-            Timer_Is_Over.value = 0
-            P_Timer = Process(target=Timer_Multi_Process, args=(Integration_list_MilSec[Spec_Index[0]-1]/float(1000),))
-            P_Timer.start()           
-            DAQ1.writePort(Shutter_Port, 5)
-            #Ref_Time[DAQ_Index[0]] = time.time()
-            print ('Step2, Raising edge is started',  time.time())
-            OrderOfTheProcess = 1
-            
-        elif(Timer_Is_Over.value == 1) & (OrderOfTheProcess == 1):
-            DAQ1.writePort(Shutter_Port, 0)
-            print ('Step3, Falling edge is started',  time.time())
-            #Ref_Time[DAQ_Index[0]] = time.time()
-            Timer_Is_Over.value = 0
-            OrderOfTheProcess = 2
-        elif(Spec_Is_Read.value == 1) & (OrderOfTheProcess == 2):
+        if (Spec_Is_Read.value == 1):
             print ('Step4, Spec is read',  time.time())
             Spec_Is_Read.value = 0
-            #Full_Spec_Records[:, np.int(Spec_Index[0])] = Current_Spec_Record[:]
-            #Spec_Index[0] = Spec_Index[0]  + 1
-            #if (Spec_Index[0] == len(Integration_list_MilSec)):
-            #    break
-           
-            Timer_Is_Over.value = 0   
-            P_Timer = Process(target=Timer_Multi_Process, args=(Integration_Buffer_Time/float(1000),))
-            P_Timer.start()
-            #Pros_Spec_Init = Process(target = Spec_Init_Process, args=(Integration_Base, Trigger_mode))
-            #Pros_Spec_Init.start()
-            OrderOfTheProcess = 0
-
+            # Raising edge after the buffer time of the integration cycle and falling edge after the exposure
+            Scheduler.schedule(Integration_Buffer_Time/float(1000), 'Raising edge', DAQ_Write, Shutter_Port, 5)
+            Scheduler.schedule((Integration_Buffer_Time + Integration_list_MilSec[Spec_Index[0]-1])/float(1000), 'Falling edge', DAQ_Write, Shutter_Port, 0)
            
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
+        DAQ_Buffer.append(*DAQ_Read())
         #print (DAQ_Signal[DAQ_Index[0]])
-        DAQ_Index[0] = DAQ_Index[0] + 1
         #Ref_Time[DAQ_Index[0]] = time.time()
     Pros_Spec.terminate()
+    Scheduler.stop()
+    for (Name, Deadline, Executed, Finished) in Scheduler.Log:
+        print ('%s executed %f ms after its deadline' % (Name, (Executed - Deadline)*1000))
    
-   
-    Timer_Is_Over.value = 0           
-    P_Timer = Process(target=Timer_Multi_Process, args=(Integration_Buffer_Time/float(1000),))
-    P_Timer.start()
-    print ('time of Timer start %f:' %time.time())
-    while  Timer_Is_Over.value == 0:   
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
+    End_Time = ES.monotonic() + Integration_Buffer_Time/float(1000)
+    print ('Last buffer time is started %f:' %time.time())
+    while ES.monotonic() < End_Time:
+        DAQ_Buffer.append(*DAQ1.readPort(PhotoDiod_Port))
         #print (DAQ_Signal[DAQ_Index[0]])
-        DAQ_Index[0] = DAQ_Index[0] + 1
         #Ref_Time[DAQ_Index[0]] = time.time()
-    P_Timer.terminate()
     if (Power_meter.Error == 0):
-        Pros_Power.terminate()
+        Power_Read_Stop()
+
+
+
+
+# ############ Below paradigm is based on the external hardware triggering of the spectrometer ###############
+def Triggered_Shutter_Window(Index, Integration_MilSec):
+    # Called by the spectrometer once it is armed: opens the shutter, triggers the integration and closes the shutter when it is over
+    DAQ_Write(Shutter_Port, 5)
+    time.sleep(Shutter_Delay/float(1000))
+    with DAQ_Lock:
+        DAQ1.triggerPulse(Spectrometer_Trigger_Port)
+    time.sleep(Integration_MilSec/float(1000))
+    DAQ_Write(Shutter_Port, 0)
+
+
+def Triggered_Spec_Read_Thread(Integration_list_MilSec, Errors):
+    try:
+        Intensities, Times = Spec1.readTriggeredSequence(Integration_list_MilSec, Triggered_Shutter_Window, Spectrometer_Trigger_Mode)
+    except Exception, e:
+        Errors.append(e)
+        return
+    Spec_Buffer.extend(Intensities, Times)
+    Spec_Index[0] = len(Integration_list_MilSec)
+
+
+def Triggered_Multi_Integration_Paradigm(Integration_list_MilSec):
+    if (Power_meter.Error == 0):
+        Power_Read_Start()
+
+    # The spectrometer sequence runs in a thread of this process, so the shutter and the photo diode share one DAQ handle
+    Errors = []
+    Spec_Thread = threading.Thread(target=Triggered_Spec_Read_Thread, args=(Integration_list_MilSec, Errors))
+    Spec_Thread.start()
+    while Spec_Thread.is_alive():
+        DAQ_Buffer.append(*DAQ_Read())
+    Spec_Thread.join()
+    if (Power_meter.Error == 0):
+        Power_Read_Stop()
+    if Errors:
+        DAQ_Write(Shutter_Port, 0)
+        raise Exception('The triggered run is aborted: %s' % Errors[0])
 
 
+# ############ Below paradigm executes the compiled timeline of an experiment file (continious paradigm) ###############
+def Timeline_Paradigm(Compiled):
+    # The shutter edges are the rows of the timeline, executed by the scheduler thread while this loop reads the photo diode
+    Timeline = Compiled['Timeline']
+    No_Spec_Sample = Compiled['No_Spec_Sample']
+    if (Power_meter.Error == 0):
+        Power_Read_Start()
+    Spec_Init_Process(float(Timeline['Value'][Timeline['Action'] == ET.INTEGRATION][0]), 0)
+    Spec_Is_Read.value = 0
+    Pros_Spec = Process(target=Spec_Read_Process, args=(No_Spec_Sample, ))
+    Pros_Spec.start()
+    Scheduler = ET.runTimeline(Compiled, {ET.SHUTTER_OPEN: lambda Port, Value: DAQ_Write(Port, 5),
+                                          ET.SHUTTER_CLOSE: lambda Port, Value: DAQ_Write(Port, 0)})
+    while (not Scheduler.Idle.is_set()) or (Spec_Index[0] < No_Spec_Sample):
+        DAQ_Buffer.append(*DAQ_Read())
+    Scheduler.stop()
+    Pros_Spec.join()
+    if (Power_meter.Error == 0):
+        Power_Read_Stop()
 
 
-def Continious_Paradigm(Integration_Continious, No_Spec_Sample, No_DAC_Sample, No_Power_Sample, No_BakGro_Spec):
+def Continious_Paradigm(Integration_Continious, No_Spec_Sample, No_DAC_Sample, No_BakGro_Spec):
     if (Power_meter.Error == 0):
-        Pros_Power = Process(target=Power_Read_Process, args=(No_Power_Sample,))
-        Pros_Power.start()
+        Power_Read_Start()
     #Local_Spec_Index = 0  
     Spec_Init_Done.value = 0
     Pros_Spec_Init = Process(target = Spec_Init_Process, args=(Integration_Continious, 0))
     Pros_Spec_Init.start()           
     Spec_Is_Read.value = 0
     Pros_Spec = Process(target=Spec_Read_Process, args=(No_Spec_Sample, ))
-    Timer_Is_Over.value = 0    
-    P_Timer = Process(target=Timer_Multi_Process, args=(0.1,))
-    P_Timer.start()
-    while  Timer_Is_Over.value == 0:   
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
-        DAQ_Index[0] = DAQ_Index[0] + 1
+    End_Time = ES.monotonic() + 0.1
+    while ES.monotonic() < End_Time:
+        DAQ_Buffer.append(*DAQ1.readPort(PhotoDiod_Port))
      
     Pros_Spec.start()    
     DAQ1.writePort(Shutter_Port, 5)
@@ -257,8 +331,7 @@ def Continious_Paradigm(Integration_Continious, No_Spec_Sample, No_DAC_Sample, N
 
     
     while (int(Spec_Index[0]) < No_Spec_Sample - No_BakGro_Spec ):
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
-        DAQ_Index[0] = DAQ_Index[0] + 1
+        DAQ_Buffer.append(*DAQ1.readPort(PhotoDiod_Port))
         
         '''
         if  Spec_Is_Read.value == 1:
@@ -274,16 +347,105 @@ def Continious_Paradigm(Integration_Continious, No_Spec_Sample, No_DAC_Sample, N
             Spec_Is_Read.value = 0
             Full_Spec_Records[:, np.int(Spec_Index[0]) - 1] = Current_Spec_Record[:]
         '''
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort(PhotoDiod_Port)
-        DAQ_Index[0] = DAQ_Index[0] + 1       
+        DAQ_Buffer.append(*DAQ1.readPort(PhotoDiod_Port))
         
     if (Power_meter.Error == 0):
-        Pros_Power.terminate()
+        Power_Read_Stop()
+        
+        
+def Save_And_Plot(File_name, Spec_Buffer, DAQ_Buffer, Power_Buffer, Wavelengths, Spec_Details, DAQ_Details, Attributes = None):
+    ''' Background job (see Background_Worker.py): saving a recording and plotting it while the next run can be acquired '''
+    f = HW.HDF5Writer(File_name, Compression = HW.Save_Compression, Attributes = Attributes)      # Written in one pass after the run
+    
+    # ########### Saving the recorded signals in HDF5 format ############
+    
+    f.createGroup('DAQT7', {'DAQT7 Details': str(DAQ_Details)})
+    f.createSeries('DAQT7/PhotoDiode', Encoding = 'adc12')              # Raw codes of the ADC-DAC Pi
+    f.createSeries('DAQT7/TimeIndex')
+    f.createPyramid('DAQT7/PhotoDiode')                                 # Min/max/mean levels for the plots of long recordings
+    f.appendBuffer('DAQT7/PhotoDiode', 'DAQT7/TimeIndex', DAQ_Buffer)
+    
+    f.createGroup('Spectrometer', {'Spectrometer Details': str(Spec_Details)})
+    f.createSeries('Spectrometer/Intensities', Shape = (Spec_Buffer.Width,), Encoding = 'float32')      # Dark and nonlinearity corrected spectra are floats
+    f.createSeries('Spectrometer/Time_Index')
+    f.appendBuffer('Spectrometer/Intensities', 'Spectrometer/Time_Index', Spec_Buffer)
+    f.write('Spectrometer/WaveLength', Wavelengths)
+    
+    if Power_Buffer is not None:
+        f.createGroup('PM100_PowerMeter')
+        f.createSeries('PM100_PowerMeter/Power', Encoding = 'float32')
+        f.createSeries('PM100_PowerMeter/TimeIndex')
+        f.createPyramid('PM100_PowerMeter/Power')
+        f.appendBuffer('PM100_PowerMeter/Power', 'PM100_PowerMeter/TimeIndex', Power_Buffer)
+        #Optrode_DAQ.attrs['PowerMeter Details'] = np.string_(DAQ_Details)  
+        
+    f.close()
+    BW.report('Data is saved in %s' % File_name)
+    
+    # %%
+    # ######### Plotting the spectrumeter and the photodiod recordings ########
+    DAQ_Signal, DAQ_Time = DAQ_Buffer.values()[:, 0], DAQ_Buffer.times()
+    Spec_Time = Spec_Buffer.times()
+    plt.figure()
+    plt.plot(DAQ_Time - DAQ_Time[0], DAQ_Signal)
+    plt.title('Photo diode')
+    plt.xlabel('Ellapsed time (s)')
+    plt.ylabel('Voltage (v)')
+
+    #%%
+    #################### Estimate the latencies of the devices ###################################
+    plt.figure()
+
+    plt.subplot(1,2,1)
+    DAQ_Latency = np.concatenate([[0], np.diff(DAQ_Time)])
+    plt.plot(DAQ_Latency)
+    plt.ylabel("Time (s)")
+    plt.title("DAQ latencies")
+    plt.show()
+    
+    plt.subplot(1,2,2)
+    Spec_Latency = np.concatenate([[0], np.diff(Spec_Time)])
+    plt.plot(Spec_Latency[1:])
+
+    plt.ylabel("Time (s)")
+    plt.title("Spectrometer integration durations")
+    plt.show()
+    
+    if Power_Buffer is not None:
+        Power_Signal, Power_Time = Power_Buffer.values()[:, 0], Power_Buffer.times()
+        plt.figure()
+
+        plt.subplot(1,2,1)
+        Power_Latency = np.concatenate([[0], np.diff(Power_Time)])
+        plt.plot(Power_Latency)
+        plt.ylabel("Time (s)")
+        plt.title("Power latencies")
+        plt.show()
+        plt.subplot(1,2,2)
+        plt.plot(Power_Time - Power_Time[0], Power_Signal)
+        plt.title('Power Meter')
+        plt.xlabel('Ellapsed time (s)')
+        plt.ylabel('Power (w)')    
+        plt.show()
+    BW.report('The plots of %s are closed' % File_name)
         
         
 ################ Start of the main code #################################################3
 if __name__ == "__main__":
     #try:
+    # An experiment file (JSON or YAML, see Experiment_Timeline.py) replaces the paradigm and laser prompts: python Optrode_Version2.py Experiment.json
+    Experiment = None
+    if len(sys.argv) > 1:
+        Experiment = ET.compileExperiment(ET.loadExperiment(sys.argv[1]))
+        if Experiment_Error(Experiment) is not None:
+            raise Exception('%s can not be run: %s' % (sys.argv[1], Experiment_Error(Experiment)))
+        # The ports and the trigger mode of the experiment replace the ones above
+        Devices = Experiment['Experiment']['Devices']
+        PhotoDiod_Port = Devices['DAQ']['PhotoDiod_Port']
+        Green_Shutter = Devices['DAQ']['Shutter_Ports'].get('G', Green_Shutter)
+        Blue_Shutter = Devices['DAQ']['Shutter_Ports'].get('B', Blue_Shutter)
+        Spectrometer_Trigger_Port = Devices['DAQ']['Trigger_Port']
+        Spectrometer_Trigger_Mode = Devices.get('Spectrometer', {}).get('Trigger_Mode', Spectrometer_Trigger_Mode)
     Spec1 = SBO.DetectSpectrometer()
     #DAQ1 = DAQ.DetectDAQT7()
     DAQ1 = ADC_DAC_PiC.DetectPi()
@@ -291,6 +453,9 @@ if __name__ == "__main__":
         print ('Cession failed: could not detect devices')
     else:
         Power_meter = P100.DetectPM100D()
+        if (Experiment is not None) and (Power_meter.Error == 0) and ('Average_Count' in Experiment['Experiment']['Devices'].get('PowerMeter', {})):
+            Power_meter.setAverageCount(Experiment['Experiment']['Devices']['PowerMeter']['Average_Count'])
+        Lazy.startupReport()
                 
         Integration_Time = 100                                        # Integration time in ms
         Spec1.setTriggerMode(3)                                       # It is set for free running mode
@@ -319,9 +484,6 @@ if __name__ == "__main__":
         Power_Is_Read = Value('i', 0)
         Power_Is_Read.value = 0
     
-        Timer_Is_Over = Value('i', 0)
-        Timer_Is_Over.value = 0
-    
         
         #%%
         # ##################### Initializing the variables ###################
@@ -335,8 +497,7 @@ if __name__ == "__main__":
         Current_Spec_Record = Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths()) ,1), dtype = float ))                
         #Last_Spec_Record = Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths()) ,1), dtype = float ))        
         No_Spec_Tests = 500
-        Full_Spec_Records2= Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths())*No_Spec_Tests ,1), dtype = float ))
-        Spec_Time   = Array('d', np.zeros(shape=(No_Spec_Tests ,1), dtype = float ))
+        Spec_Buffer = CB.ChunkedBuffer(Width = len(Spec1.Handle.wavelengths()), Chunk_Rows = No_Spec_Tests)
         Spec_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
         Spec_SamplingRate = Spec_Speed_Test(No_Spec_Tests)
         Integration_Buffer_Time = 100       #ms               # This is for the spectrometer. This is the time from the integration started till shutter opens
@@ -344,15 +505,29 @@ if __name__ == "__main__":
         DurationOfReading = (Integration_list_MilSec[-1] + Integration_Buffer_Time + Shutter_Delay*3)*len(Integration_list_MilSec)     # Duration of reading in seconds.
         No_BakGro_Spec = 10       # This is for continious reading and refers to the last few spectrom reading wich are background and the laser is off
 
-        if (Power_meter.Error == 0):
-            #Powermeter_SamplingRate = 5.1     #ms
-            No_Power_Tests = 200
-            Power_SamplingRate = Power_Speed_Test(No_Power_Tests)*1000            #Shows the sampling speed in ms
                 
         
             
-        while 1==1:
-            Paradigm = raw_input('Which paradigm are you running? press c for continious integration and m for multi-integration and then press Enter: ')
+        if Experiment is not None:
+            Description = Experiment['Experiment']
+            Paradigm = Description['Paradigm']
+            Integration_list_MilSec = Description.get('Integration_list_MilSec', Integration_list_MilSec)
+            Integration_Buffer_Time = Description['Integration_Buffer_Time']
+            Shutter_Delay = Description['Shutter_Delay']
+            Current_Laser = Description['Laser']
+            Shutter_Port = Experiment['Ports'][0]
+            if (Paradigm == 'c'):
+                # The shutter is driven by the compiled timeline (see Timeline_Paradigm)
+                Integration_Continious = Description['Integration_Time']
+                DurationOfReading = Experiment['Duration']*1000
+            else:
+                DurationOfReading = (Integration_list_MilSec[-1] + Integration_Buffer_Time + Shutter_Delay*3)*len(Integration_list_MilSec)
+            print ('Experiment %s: paradigm %s, laser %s \n' %(Description['Name'], Paradigm, Current_Laser))
+            if (Paradigm == 't') and Trigger_Port_Error(DAQ1, Spectrometer_Trigger_Port, [Green_Shutter, Blue_Shutter]):
+                raise Exception('The triggered paradigm can not run: ' + Trigger_Port_Error(DAQ1, Spectrometer_Trigger_Port, [Green_Shutter, Blue_Shutter]))
+
+        while Experiment is None:
+            Paradigm = raw_input('Which paradigm are you running? press c for continious integration, m for multi-integration and t for triggered multi-integration and then press Enter: ')
             print ('\n')        
             if (Paradigm == 'c') | (Paradigm == 'C'):
                 Paradigm == 'c'
@@ -393,11 +568,18 @@ if __name__ == "__main__":
             elif (Paradigm == 'm') | (Paradigm == 'M'):
                 Paradigm = 'm'
                 break
+            elif (Paradigm == 't') | (Paradigm == 'T'):
+                Paradigm = 't'
+                Reason = Trigger_Port_Error(DAQ1, Spectrometer_Trigger_Port, [Green_Shutter, Blue_Shutter])
+                if Reason is not None:
+                    print ('The triggered paradigm can not run on this DAQ: %s. Chose another paradigm \n' % Reason)
+                    continue
+                break
             else:
                 print ('Wrong input! try again print \n')   
       
         
-        while 1==1:
+        while Experiment is None:
             Current_Laser = raw_input('Chose a laser. Press G for green laser or press B for blue laser and then press Enter: ')
             print ('\n')        
             if (Current_Laser == 'G') | (Current_Laser == 'g'):
@@ -417,15 +599,12 @@ if __name__ == "__main__":
         #No_DAC_Sample =   int(round((DurationOfReading + DurationOfReading/4) /DAQ_SamplingRate))        # Number of samples for DAQ analogue to digital converter (AINx).
         No_DAC_Sample =   int((DurationOfReading + DurationOfReading) /DAQ_SamplingRate)
         
-        if (Power_meter.Error == 0):         
-            No_Power_Sample =   int((DurationOfReading + DurationOfReading/float(2)) /Power_SamplingRate) 
-        else:
-            No_Power_Sample = 0                                                 
-        #No_Power_Sample = int(round(DurationOfReading/Powermeter_SamplingRate)) # Number of samples for P100D Power meter to read.
-                                                                                # Roughly P100 can read the power every 2.7 ms.
+        # The power meter is read into a growable buffer, so its number of samples is not estimated (it reads about every 2.7 ms)
        
         
-        if (Paradigm == 'c'):           # Continious paradigm
+        if (Experiment is not None) and (Paradigm == 'c'):
+            No_Spec_Sample = Experiment['No_Spec_Sample']
+        elif (Paradigm == 'c'):           # Continious paradigm
             No_Spec_Sample =  int(round(float(DurationOfReading)/float(float(Integration_Continious))))  # Number of samples for spectrometer to read.
         else:
             No_Spec_Sample =  len(Integration_list_MilSec)                                    # Number of samples for spectrometer to read.
@@ -433,42 +612,38 @@ if __name__ == "__main__":
         
         
         
+        # The buffers and flags are allocated once and reused by every rerun
+        Buffer_Pool = CB.BufferPool()
+        Saver = BW.BackgroundWorker()
+        Spec_Buffer.close()
         Rerun = 'First'
         while True:
             if (Rerun == 'r') | (Rerun == 'R') | (Rerun == 'First'):
+                Saver.collect()                                 # The buffers of the recordings which are saved are reused
                 File_name_PreFix = raw_input('Please enter the prefix for the file name: ')
                 Rerun = 'n'
                 ################################ Variables initializations #############################################
-                Current_Spec_Record = Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths()) ,1), dtype = float ))                            
                 #Last_Spec_Record = Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths()) ,1), dtype = float ))                 
-                Spec_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
-                Full_Spec_Records = np.zeros(shape=(len(Spec1.Handle.wavelengths()), No_Spec_Sample ), dtype = float )
-                Full_Spec_Records2= Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths())*No_Spec_Sample ,1), dtype = float ))
-                Spec_Time   = Array('d', np.zeros(shape=( No_Spec_Sample ,1), dtype = float ))
-                
-                DAQ_Signal = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
-                DAQ_Time   = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
-                DAQ_Index  = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
+                Spec_Index[0] = 0
+                # The buffers grow by chunks, No_Spec_Sample and No_DAC_Sample only set the size of the chunks
+                Spec_Buffer = Buffer_Pool.get('Spectrometer', Width = len(Spec1.Handle.wavelengths()), Chunk_Rows = No_Spec_Sample)
+                DAQ_Buffer = Buffer_Pool.get('DAQ', Width = 1, Chunk_Rows = No_DAC_Sample)
                 #DAQ_Index_Total  = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
                 #Ref_Signal = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
                 #Ref_Time   = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
                 
                 if (Power_meter.Error == 0):
-                    Power_Signal = Array('d', np.zeros(shape=( No_Power_Sample ,1), dtype = float ))
-                    Power_Time   = Array('d', np.zeros(shape=( No_Power_Sample ,1), dtype = float ))
-                    Power_Index  = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
+                    Power_Buffer = Buffer_Pool.get('PowerMeter', Width = 1, Chunk_Rows = Power_Chunk_Rows)
                 #########################3# Starting the chosen paradigm #####################################
-                if (Paradigm == 'm'):             # Multi-integration paradigm
+                if (Experiment is not None) and (Paradigm == 'c'):
+                    Timeline_Paradigm(Experiment)
+                elif (Paradigm == 'm'):             # Multi-integration paradigm
                     print ('step1')
-                    Multi_Integration_Paradigm(Integration_list_MilSec, Integration_Buffer_Time, Shutter_Delay, No_Power_Sample)
+                    Multi_Integration_Paradigm(Integration_list_MilSec, Integration_Buffer_Time, Shutter_Delay)
+                elif (Paradigm == 't'):           # Hardware triggered multi-integration paradigm
+                    Triggered_Multi_Integration_Paradigm(Integration_list_MilSec)
                 else:                           # Continious paradigm
-                    Continious_Paradigm(float(Integration_Continious), No_Spec_Sample, No_DAC_Sample, No_Power_Sample, No_BakGro_Spec)
-                
-                ######## Loading the Spectrometer Array to a matrix before saving and plotting ###############
-                Wave_len = len(Spec1.Handle.wavelengths())
-                for I in range(Spec_Index[0]):
-                    Full_Spec_Records[:, I] =  Full_Spec_Records2[I*Wave_len : (I + 1)*Wave_len ]
-                    
+                    Continious_Paradigm(float(Integration_Continious), No_Spec_Sample, No_DAC_Sample, No_BakGro_Spec)
                 
                 ################################Closing the devices#############################  
                 Spec_Details = Spec1.readDetails()
@@ -477,108 +652,28 @@ if __name__ == "__main__":
       
                 
                 # ########### The file containing the records (HDF5 format)###########
-                #Path_to_Records = os.path.abspath(os.path.join( os.getcwd(), os.pardir)) + "/Records"
-                #Path_to_Records = os.path.abspath(os.path.join( os.getcwd())) + "/Records"        
-                os.chdir(Path_to_Records)
                 File_name_Suffix = str('%s' %datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H-%M-%S'))+ ".hdf5"    
-                File_name = File_name_PreFix + '-' + File_name_Suffix    
-                #File_name = "Chose_a_Prifix" + str('%i' %time.time())+ ".hdf5"
-                #File_name = "Opterode_Recording_At" + str('%i' %time.time())+ ".hdf5"
-                f = h5py.File(File_name, "w")   
-                
-                # ########### Saving the recorded signals in HDF5 format ############
-                
-                Optrode_DAQ = f.create_group('DAQT7')
-                f.create_dataset('DAQT7/PhotoDiode', data = np.asanyarray(DAQ_Signal[:]))
-                f.create_dataset('DAQT7/TimeIndex', data = np.asanyarray(DAQ_Time[:]))
-                Optrode_DAQ.attrs['DAQT7 Details'] = np.string_(DAQ_Details)  
-                
-                Optrode_Spectrometer = f.create_group('Spectrometer')
-                f.create_dataset('Spectrometer/Intensities', data = np.asanyarray(Full_Spec_Records))
-                f.create_dataset('Spectrometer/Time_Index', data = np.asanyarray(Spec_Time))
-                f.create_dataset('Spectrometer/WaveLength', data = np.asanyarray(Spec1.Handle.wavelengths()))
-                Optrode_Spectrometer.attrs['Spectrometer Details'] = np.string_(Spec_Details)
-                
-
-                if (Power_meter.Error == 0):
-                    Optrode_Power = f.create_group('PM100_PowerMeter')
-                    f.create_dataset('PM100_PowerMeter/Power', data = np.asanyarray(Power_Signal[:]))
-                    f.create_dataset('PM100_PowerMeter/TimeIndex', data = np.asanyarray(Power_Time[:]))
-                    #Optrode_DAQ.attrs['PowerMeter Details'] = np.string_(DAQ_Details)  
-                    
-                f.close()
-                
-                Path_to_Fred_Codes = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
-                os.chdir(Path_to_Fred_Codes)
-                # %%
-                # ######### Plotting the spectrumeter and the photodiod recordings ########
-                plt.figure()
-                plt.plot(np.asarray(DAQ_Time[0:DAQ_Index[0]]) - DAQ_Time[0], np.asanyarray(DAQ_Signal[0:DAQ_Index[0]]))
-                plt.title('Photo diode')
-                plt.xlabel('Ellapsed time (s)')
-                plt.ylabel('Voltage (v)')
-                '''
-                plt.figure()
-                plt.plot(Spec1.readWavelength()[2:],Full_Spec_Records[2:])
-                plt.title('Specrometer recordings')
-                plt.xlabel('Wavelength (nano meter)')
-                plt.ylabel('Intensity')
-                #plt.plot(np.asarray(Ref_Time[0:DAQ_Index[0]]) - DAQ_Time[0],Ref_Signal[0:DAQ_Index[0]])
-                '''
-            
-                #%%
-                #################### Estimate the latencies of the devices ###################################
-                plt.figure()
-            
-                plt.subplot(1,2,1)
-                DAQ_Latency = np.asanyarray(DAQ_Time[0:DAQ_Index[0]])
-                DAQ_Latency[0] = 0
-                for I in range(1,DAQ_Index[0]):
-                    DAQ_Latency[I] = DAQ_Time[I] - DAQ_Time[I-1]
-                #plt.subplot(1,3,1)
-                plt.plot(DAQ_Latency)
-                plt.ylabel("Time (s)")
-                plt.title("DAQ latencies")
-                plt.show()
+                File_name = os.path.join(Path_to_Records, File_name_PreFix + '-' + File_name_Suffix)
                 
-                plt.subplot(1,2,2)
-                Spec_Latency = np.asarray(Spec_Time[0:np.int(Spec_Index[0])])
-                Spec_Latency[0] = 0
-                for I in range(1,Spec_Index[0]):
-                    Spec_Latency[I] = np.float(Spec_Time[I] - Spec_Time[I-1])
-                plt.plot(Spec_Latency[1:])
-            
-                plt.ylabel("Time (s)")
-                plt.title("Spectrometer integration durations")
-                plt.show()
-                
-                if (Power_meter.Error == 0):
-                    plt.figure()
-            
-                    plt.subplot(1,2,1)
-                    Power_Latency = np.asanyarray(Power_Time[0:Power_Index[0]])
-                    Power_Latency[0] = 0
-                    for I in range(1,int(Power_Index[0])):
-                        Power_Latency[I] = Power_Time[I] - Power_Time[I-1]
-                    #plt.subplot(1,3,1)
-                    plt.plot(Power_Latency)
-                    plt.ylabel("Time (s)")
-                    plt.title("Power latencies")
-                    plt.show()
-                    plt.subplot(1,2,2)
-                    plt.plot(np.asarray(Power_Time[0:Power_Index[0]]) - Power_Time[0], np.asanyarray(Power_Signal[0:Power_Index[0]]))
-                    plt.title('Power Meter')
-                    plt.xlabel('Ellapsed time (s)')
-                    plt.ylabel('Power (w)')    
-                    plt.show()
-                ############################## Here is where you can ask to rerun the paradigm ########################                
+                # ########### Saving and plotting in the background, the buffers are handed over until the file is saved ###########
+                Buffers = Buffer_Pool.take(['Spectrometer', 'DAQ', 'PowerMeter'])
+                Attributes = {'Paradigm': Paradigm.lower(), 'Laser': Current_Laser.upper(), 'DurationOfReading': DurationOfReading}   # Indexed by Recording_Catalog.py
+                if Experiment is not None:
+                    Attributes['Experiment'] = json.dumps(Experiment['Experiment'])
+                Saver.submit('Save ' + os.path.basename(File_name), Save_And_Plot,
+                             (File_name, Buffers['Spectrometer'], Buffers['DAQ'], Buffers.get('PowerMeter'), Spec1.Handle.wavelengths(), Spec_Details, DAQ_Details, Attributes),
+                             On_Done = lambda Job, Buffers = Buffers: Buffer_Pool.give(Buffers))
                 print('\n')                
-                print('Data is saved. \n')
+                print('Data is being saved in the background. \n')
                                 
                 Rerun = raw_input('Press r or R if you want to rerun the paradigm and then press Enter. Alternetively to quit press any otehr key. ')
             else:
                 break
 
+        if Saver.pending():
+            print('Waiting for %s' % ', '.join(Saver.pending()))
+        Saver.close()
+        Buffer_Pool.close()
         time.sleep(0.1)
         DAQ1.close()
         Spec1.close()
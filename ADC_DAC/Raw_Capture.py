@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Raw capture format for the highest sampling rates (streamRead of the DAQT7 at 100 kHz, native loop of the ADC-DAC Pi), with its
+conversion to HDF5. Writing through h5py (chunking, filters, resizing) may not keep up with these rates on the SD card of the Pi,
+so the samples are first captured in an append-only binary file: a fixed size header (magic and JSON description) followed by flat
+records of (time stamp, values) of a fixed type, written by large O_APPEND writes. The file is read by np.memmap without any parsing
+(also while it is written, or after a crash: the records are counted from the size of the file), and convert writes the standard
+layout of HDF5_FileWriter.py (group, signal and time datasets, encodings, pyramid) which HDF5_FileReader.py reads, after the run.
+
+To use this class, following syntax is recommended:
+import Raw_Capture as RC
+Capture = RC.RawCapture('Trial1.raw', Width = 1, Encoding = 'adc12', Group = 'DAQT7', Signal_Name = 'PhotoDiode',
+                        Attributes = {'DAQT7 Details': Details})
+Capture.append(Values, Times)                   # Physical values, or the codes of the ADC with Capture.append(Codes, Times, Encoded = True)
+Capture.appendBuffer(DAQ_Buffer)                # Or the rows of a Chunked_Buffer which were not written yet
+Capture.close()
+Header, Records = RC.memoryMap('Trial1.raw')    # Records['Time'], Records['Values'] (samples x width), without copy
+RC.convert('Trial1.raw')                        # Trial1.hdf5, in the layout of HDF5_FileWriter.py
+
+or from the command line:
+python Raw_Capture.py convert Trial1.raw Trial2.raw
+python Raw_Capture.py benchmark --dir /media/SD --samples 10000000      # Throughput of the raw capture and of the HDF5 writer
+"""
+
+import json
+import os
+import time
+import numpy as np
+import HDF5_FileWriter as HW
+
+
+Magic = b'RAWCAP01'
+Header_Size = 4096          # Bytes of the header (magic and JSON, padded with spaces); the records start at this offset
+Write_Bytes = 4*2**20       # The records are written in blocks of about this size
+
+
+def recordType(Width, dtype):
+    ''' Type of a record: the time stamp (float64) and Width values of type dtype '''
+    return np.dtype([('Time', '<f8'), ('Values', np.dtype(dtype).newbyteorder('<'), (Width,))])
+
+
+def jsonValue(Value):
+    ''' Attributes as JSON values (numpy numbers and arrays, byte strings) '''
+    if isinstance(Value, dict):
+        return dict((Key, jsonValue(Item)) for (Key, Item) in Value.items())
+    if isinstance(Value, bytes):
+        return Value.decode('utf-8')
+    if isinstance(Value, np.ndarray):
+        return Value.tolist()
+    if isinstance(Value, np.generic):
+        return Value.item()
+    return Value
+
+
+def readHeader(File_name):
+    ''' Returning the header of a raw capture (dictionary) '''
+    with open(File_name, 'rb') as File:
+        Header = File.read(Header_Size)
+    if Header[:len(Magic)] != Magic:
+        raise ValueError('%s is not a raw capture' % File_name)
+    return json.loads(Header[len(Magic):].decode('utf-8').rstrip(' \0'))
+
+
+def memoryMap(File_name):
+    '''
+    Returning the header and the records of a raw capture as a read only np.memmap (fields Time and Values). The number of records
+    is given by the size of the file, so a capture which is still written or was not closed can be read.
+    '''
+    Header = readHeader(File_name)
+    Record = recordType(Header['Width'], Header['dtype'])
+    Count = (os.path.getsize(File_name) - Header_Size)//Record.itemsize
+    if Count == 0:
+        return Header, np.zeros(0, dtype = Record)
+    return Header, np.memmap(File_name, dtype = Record, mode = 'r', offset = Header_Size, shape = (Count,))
+
+
+class RawCapture(object):
+    '''
+    Append-only raw capture file of (time stamp, values) records
+    '''
+    def __init__(self, File_name, Width = 1, dtype = 'float64', Encoding = None, Time_Encoding = None, Group = 'DAQT7',
+                 Signal_Name = 'Voltages', Time_Name = 'TimeIndex', Attributes = None, Group_Attributes = None, Write_Bytes = Write_Bytes):
+        '''
+        Width is the number of values of a sample (e.g., the number of ports). With an Encoding of HDF5_FileWriter.Encodings the values
+        are stored in its type (e.g., the 12 bits codes of the ADC-DAC Pi as uint16 with 'adc12'), otherwise as dtype.
+        Group, Signal_Name, Time_Name, Time_Encoding and the (file and group) Attributes are those of the HDF5 file made by convert.
+        '''
+        self.File_name = File_name
+        self.Width = Width
+        self.Encoding = None if Encoding is None else HW.encoding(Encoding)
+        if self.Encoding is not None:
+            dtype = self.Encoding['dtype']
+        self.Record = recordType(Width, dtype)
+        self.Write_Bytes = Write_Bytes
+        self.Header = {'Width': Width, 'dtype': np.dtype(dtype).str, 'Encoding': Encoding, 'Time_Encoding': Time_Encoding,
+                       'Group': Group, 'Signal_Name': Signal_Name, 'Time_Name': Time_Name,
+                       'Attributes': jsonValue(Attributes or {}), 'Group_Attributes': jsonValue(Group_Attributes or {}),
+                       'Created': time.time(), 'Samples': None, 'Clipped': 0}
+        self.Descriptor = os.open(File_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o644)
+        self.writeBytes(self.headerBytes())
+        self.Pending = []
+        self.Pending_Bytes = 0
+        self.Samples = 0
+        self.Clipped = 0
+        self.Position = 0                       # Number of rows of the Chunked_Buffer already written (appendBuffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def headerBytes(self):
+        Text = Magic + json.dumps(self.Header).encode('utf-8')
+        if len(Text) > Header_Size:
+            raise ValueError('The header of %s is larger than %i bytes (attributes too long)' % (self.File_name, Header_Size))
+        return Text + b' '*(Header_Size - len(Text))
+
+    def writeBytes(self, Data):
+        View = memoryview(Data)
+        while len(View):
+            View = View[os.write(self.Descriptor, View):]
+
+    def append(self, Values, Times, Encoded = False):
+        '''
+        Appending samples (samples x width, or one value per sample with Width = 1) and their time stamps. The values are physical
+        values encoded with the Encoding of the capture, or already encoded (e.g., ADC codes) with Encoded. The number of values out
+        of the range of an integer encoding is counted in Clipped, which is written in the header by close.
+        '''
+        Times = np.asarray(Times, dtype = float).ravel()
+        Values = np.asarray(Values).reshape(len(Times), self.Width)
+        if self.Encoding is not None and not Encoded:
+            Values, Clipped = HW.encode(Values, self.Encoding)
+            self.Clipped = self.Clipped + Clipped
+        Block = np.empty(len(Times), dtype = self.Record)
+        Block['Time'] = Times
+        Block['Values'] = Values
+        self.Pending.append(Block)
+        self.Pending_Bytes = self.Pending_Bytes + Block.nbytes
+        self.Samples = self.Samples + len(Times)
+        if self.Pending_Bytes >= self.Write_Bytes:
+            self.flush()
+        return self.Samples
+
+    def appendBuffer(self, Buffer):
+        ''' Appending the rows of a Chunked_Buffer which were not written yet (as HDF5_FileWriter.HDF5Writer.appendBuffer) '''
+        Start, End, Row = self.Position, len(Buffer), 0
+        for (Values, Times) in Buffer.chunks():
+            Chunk_Start, Chunk_End = max(Start - Row, 0), min(End - Row, len(Times))
+            if Chunk_Start < Chunk_End:
+                self.append(Values[Chunk_Start:Chunk_End], Times[Chunk_Start:Chunk_End])
+            Row = Row + len(Times)
+        self.Position = End
+        return End - Start
+
+    def flush(self):
+        ''' Writing the pending records in one write '''
+        if self.Pending:
+            self.writeBytes(np.concatenate(self.Pending).tobytes() if len(self.Pending) > 1 else self.Pending[0].tobytes())
+            self.Pending, self.Pending_Bytes = [], 0
+
+    def close(self, Sync = False):
+        ''' Writing the pending records, the number of samples and of clipped values in the header; Sync waits until the file is on the disk '''
+        if self.Descriptor is None:
+            return
+        self.flush()
+        if Sync:
+            os.fsync(self.Descriptor)
+        os.close(self.Descriptor)
+        self.Descriptor = None
+        self.Header['Samples'] = self.Samples
+        self.Header['Clipped'] = self.Clipped
+        with open(self.File_name, 'r+b') as File:           # The header has a fixed size, it is written over
+            File.write(self.headerBytes())
+
+
+def convert(File_name, HDF5_File = None, Block_Size = 2**20, Pyramid = True, **Options):
+    '''
+    Converting a raw capture to an HDF5 file in the layout of HDF5_FileWriter.py (by default the same name with .hdf5), by blocks of
+    Block_Size records read from the memory map. Options are passed to HDF5_FileWriter.HDF5Writer (by default with its Save_Compression).
+    The number of values clipped by the encoding during the capture is written in the Clipped attribute of the signal dataset.
+    Returns the name of the HDF5 file.
+    '''
+    Options.setdefault('Compression', HW.Save_Compression)
+    Header, Records = memoryMap(File_name)
+    HDF5_File = HDF5_File or os.path.splitext(File_name)[0] + '.hdf5'
+    Encoding = None if Header['Encoding'] is None else HW.encoding(Header['Encoding'])
+    Signal_Path = Header['Group'] + '/' + Header['Signal_Name']
+    Time_Path = Header['Group'] + '/' + Header['Time_Name']
+    with HW.HDF5Writer(HDF5_File, Attributes = Header['Attributes'], **Options) as Writer:
+        Writer.createGroup(Header['Group'], Header['Group_Attributes'])
+        Writer.createSeries(Signal_Path, Shape = () if Header['Width'] == 1 else (Header['Width'],), dtype = Header['dtype'],
+                            Encoding = Header['Encoding'])
+        Writer.createSeries(Time_Path, Encoding = Header['Time_Encoding'])
+        if Pyramid and Header['Width'] == 1:
+            Writer.createPyramid(Signal_Path)
+        for Start in range(0, len(Records), Block_Size):
+            Block = Records[Start:Start + Block_Size]
+            Values = Block['Values']
+            if Encoding is not None and 'Scale' in Encoding:
+                Values = Values*Encoding['Scale'] + Encoding['Offset']          # Encoded again, exactly, by the writer
+            Writer.appendSeries(Signal_Path, Time_Path, Values[:, 0] if Header['Width'] == 1 else Values.T, Block['Time'])
+        if Header.get('Clipped'):
+            Writer.setAttributes(Signal_Path, {'Clipped': Writer.File[Signal_Path].attrs.get('Clipped', 0) + Header['Clipped']})
+    return HDF5_File
+
+
+def syncFile(File_name):
+    ''' Waiting until a closed file is on the disk '''
+    Descriptor = os.open(File_name, os.O_RDONLY)
+    os.fsync(Descriptor)
+    os.close(Descriptor)
+
+
+def benchmark(Directory = '.', Samples = 10**7, Width = 1, Block = 1000, Rate = 100000.0, Encoding = 'volts'):
+    '''
+    Throughput of the raw capture and of the HDF5 writer (lzf and uncompressed) for Samples samples appended Block at a time, as in an
+    acquisition loop, and of the conversion of the raw capture. The files are synced to the disk before the time is taken.
+    Returns a list of (name, seconds, samples per second, MB per second of the file).
+    '''
+    Values = np.clip(np.cumsum(np.random.randn(Samples, Width), axis = 0)*0.01, -10, 10)
+    Times = np.arange(Samples)/Rate
+    Results = []
+
+    def result(Name, Start, File_name):
+        Duration = time.time() - Start
+        Results.append((Name, Duration, Samples/Duration, os.path.getsize(File_name)/Duration/2**20))
+        print ('%-28s %8.3f s %12.0f samples/s %8.1f MB/s' % Results[-1])
+
+    Raw_File = os.path.join(Directory, 'Benchmark.raw')
+    Start = time.time()
+    Capture = RawCapture(Raw_File, Width = Width, Encoding = Encoding)
+    for First in range(0, Samples, Block):
+        Capture.append(Values[First:First + Block], Times[First:First + Block])
+    Capture.close(Sync = True)
+    result('Raw capture', Start, Raw_File)
+
+    for Compression in ['lzf', None]:
+        HDF5_File = os.path.join(Directory, 'Benchmark.hdf5')
+        Start = time.time()
+        with HW.HDF5Writer(HDF5_File, Compression = Compression) as Writer:
+            Writer.createSeries('DAQT7/Voltages', Shape = () if Width == 1 else (Width,), Encoding = Encoding)
+            Writer.createSeries('DAQT7/TimeIndex')
+            for First in range(0, Samples, Block):
+                Writer.appendSeries('DAQT7/Voltages', 'DAQT7/TimeIndex', Values[First:First + Block].T, Times[First:First + Block])
+        syncFile(HDF5_File)
+        result('HDF5 writer (%s)' % (Compression or 'uncompressed'), Start, HDF5_File)
+
+    Start = time.time()
+    convert(Raw_File, HDF5_File)
+    syncFile(HDF5_File)
+    result('Conversion to HDF5 (lzf)', Start, HDF5_File)
+    os.remove(Raw_File)
+    os.remove(HDF5_File)
+    return Results
+
+
+if __name__ == "__main__":
+    import argparse
+    Parser = argparse.ArgumentParser(description = 'Raw capture files: conversion to HDF5 and throughput benchmark')
+    Parser.add_argument('command', choices = ['convert', 'benchmark'])
+    Parser.add_argument('files', nargs = '*', help = 'convert: raw capture files')
+    Parser.add_argument('--dir', default = '.', help = 'benchmark: folder of the test files (e.g., on the SD card)')
+    Parser.add_argument('--samples', type = int, default = 10**7, help = 'benchmark: number of samples')
+    Parser.add_argument('--width', type = int, default = 1, help = 'benchmark: values per sample (ports)')
+    Parser.add_argument('--block', type = int, default = 1000, help = 'benchmark: samples appended at a time')
+    Arguments = Parser.parse_args()
+
+    if Arguments.command == 'convert':
+        for File_name in Arguments.files:
+            print ('%s -> %s' % (File_name, convert(File_name)))
+    else:
+        benchmark(Arguments.dir, Arguments.samples, Arguments.width, Arguments.block)
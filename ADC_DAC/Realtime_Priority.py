@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+CPU affinity, real-time priority and memory locking of the acquisition workers.
+On the Pi, the DAQ, spectrometer, power meter and shutter timing compete with each other, the camera server and matplotlib on four cores.
+Each worker role (e.g., 'DAQ', 'Spectrometer', 'PowerMeter', 'Scheduler') can be pinned to its own cores, run with SCHED_FIFO or a
+lower nice value, and lock its memory (mlockall) so it is never paged out. These need root (or CAP_SYS_NICE / CAP_IPC_LOCK);
+when a setting is not permitted it is skipped and the reason is reported, the worker keeps running with the default scheduling.
+On request (Measure_Latency) the scheduling latency achieved by the worker (how late it wakes up from a sleep) is measured
+after its run, so it does not delay the acquisition, and added to the report, which is saved in the metadata of the recording.
+
+A configuration is a dictionary of role: settings, for example:
+Realtime = {'DAQ': {'CPU': [3], 'Policy': 'fifo', 'Priority': 80, 'Lock_Memory': True, 'Measure_Latency': True},
+            'Scheduler': {'CPU': [2], 'Policy': 'fifo', 'Priority': 90},
+            'Spectrometer': {'CPU': [1], 'Nice': -10}}
+
+To use this module, following syntax is recommended:
+import Realtime_Priority as RP
+Report = RP.configureWorker('DAQ', Realtime['DAQ'])     # In the worker process (or thread), before its loop
+Report = RP.measureWorker(Report, Realtime['DAQ'])      # After its loop
+Report['Latency']                                       # p50, p99 and max of the wake up latency (seconds), with Measure_Latency
+"""
+
+import ctypes
+import ctypes.util
+import os
+import time
+import numpy as np
+import Clock_Service as Clock
+
+
+SCHED_OTHER = 0
+SCHED_FIFO = 1
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+Policies = {'other': SCHED_OTHER, 'fifo': SCHED_FIFO}
+
+try:
+    Libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+except OSError:
+    Libc = None
+
+
+def libcCall(Name, *Args):
+    ''' Calling a function of the C library and raising OSError with errno on failure '''
+    if Libc is None or not hasattr(Libc, Name):
+        raise OSError(0, '%s is not available' % Name)
+    if getattr(Libc, Name)(*Args) != 0:
+        Error = ctypes.get_errno()
+        raise OSError(Error, os.strerror(Error))
+
+
+def setAffinity(CPUs):
+    ''' Pinning the calling process (or thread on Linux) to the given cores. Returns the cores it is allowed to run on. '''
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, CPUs)
+        return sorted(os.sched_getaffinity(0))
+    Mask = (ctypes.c_ulong*16)()                # cpu_set_t of 1024 cores
+    Bits = ctypes.sizeof(ctypes.c_ulong)*8
+    for CPU in CPUs:
+        Mask[CPU//Bits] |= 1 << (CPU % Bits)
+    libcCall('sched_setaffinity', 0, ctypes.sizeof(Mask), ctypes.byref(Mask))
+    return sorted(CPUs)
+
+
+def setPolicy(Policy, Priority):
+    ''' Setting the scheduling policy ('fifo' or 'other') and the real-time priority (1 to 99 for 'fifo') '''
+    if hasattr(os, 'sched_setscheduler'):
+        os.sched_setscheduler(0, Policies[Policy], os.sched_param(Priority))
+    else:
+        libcCall('sched_setscheduler', 0, Policies[Policy], ctypes.byref(ctypes.c_int(Priority)))
+
+
+def setNice(Nice):
+    ''' Setting the nice value of the calling process. Returns the achieved nice value. '''
+    return os.nice(Nice - os.nice(0))
+
+
+def lockMemory():
+    ''' Locking the current and future pages of the process in memory '''
+    libcCall('mlockall', MCL_CURRENT | MCL_FUTURE)
+
+
+def schedulingLatency(No_Tests = 50, Interval = 0.001):
+    ''' Measuring how late the calling worker wakes up from a sleep of Interval seconds (p50, p99 and max in seconds) '''
+    Latencies = np.zeros(No_Tests)
+    for I in range(No_Tests):
+        Start = Clock.monotonic()
+        time.sleep(Interval)
+        Latencies[I] = Clock.monotonic() - Start - Interval
+    return {'p50': float(np.percentile(Latencies, 50)),
+            'p99': float(np.percentile(Latencies, 99)),
+            'Max': float(np.max(Latencies))}
+
+
+def configureWorker(Role, Settings):
+    '''
+    Applying the settings of a role to the calling worker. Settings may contain CPU (list of cores), Policy ('fifo' or 'other'),
+    Priority, Nice, Lock_Memory and Measure_Latency (see measureWorker). Settings which are not permitted are skipped.
+    Returns a report of what was achieved, with the reason of every failure in Errors.
+    '''
+    Report = {'Role': Role, 'PID': os.getpid(), 'CPU': None, 'Policy': 'other', 'Priority': 0, 'Nice': None,
+              'Memory_Locked': False, 'Errors': []}
+    if not Settings:
+        return Report
+    if Settings.get('CPU') is not None:
+        try:
+            Report['CPU'] = setAffinity(Settings['CPU'])
+        except (OSError, ValueError) as e:
+            Report['Errors'].append('CPU affinity: %s' % e)
+    if Settings.get('Policy', 'other') != 'other':
+        try:
+            setPolicy(Settings['Policy'], Settings.get('Priority', 50))
+            Report['Policy'] = Settings['Policy']
+            Report['Priority'] = Settings.get('Priority', 50)
+        except (OSError, ValueError, KeyError) as e:
+            Report['Errors'].append('Scheduling policy %s: %s' % (Settings['Policy'], e))
+    if Settings.get('Nice') is not None:
+        try:
+            Report['Nice'] = setNice(Settings['Nice'])
+        except OSError as e:
+            Report['Errors'].append('Nice %i: %s' % (Settings['Nice'], e))
+    if Settings.get('Lock_Memory'):
+        try:
+            lockMemory()
+            Report['Memory_Locked'] = True
+        except OSError as e:
+            Report['Errors'].append('Memory locking: %s' % e)
+    for Error in Report['Errors']:
+        print ('Warning: %s worker runs without %s' % (Role, Error))
+    return Report
+
+
+def measureWorker(Report, Settings):
+    ''' Adding the scheduling latency of the calling worker to its report when Settings has Measure_Latency (after the run, it takes about 50 ms) '''
+    if Settings and Settings.get('Measure_Latency'):
+        Report['Latency'] = schedulingLatency()
+    return Report
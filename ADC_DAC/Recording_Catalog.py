@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Catalog of the recordings: a SQLite index over the Records folder.
+The recordings pile up as <prefix>-<date>.hdf5 files, and the only way to find one was the file dialog of Get_File_Path.py.
+The catalog scans the folder incrementally (a file is read again only when its modification time or size changed) and keeps, for
+every recording, its prefix and date, the file attributes (paradigm, laser, experiment of Batch_Runner.py, ...), and for every
+device group its details, number of samples, time span, sampling rate and summary statistics of its signal (see HDF5_FileReader.py).
+The runs can then be found by date, prefix, device or parameters without opening the files.
+
+To use this class, following syntax is recommended:
+import Recording_Catalog as RC
+Catalog = RC.RecordingCatalog('Records')             # The index is Records/Catalog.sqlite
+Catalog.scan()                                       # New, changed and deleted recordings
+Runs = Catalog.find(Since = '2016-10-18', Prefix = 'Trial', Device = 'Spectrometer', Paradigm = 'c', Laser = 'G')
+Runs[0]['path'], Runs[0]['duration'], Catalog.devices(Runs[0]['path']), Catalog.parameters(Runs[0]['path'])
+Catalog.close()
+
+or from the command line:
+python Recording_Catalog.py scan Records
+python Recording_Catalog.py find Records --since 2016-10-18 --prefix Trial --device Spectrometer --param Paradigm=c
+"""
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import numpy as np
+import HDF5_FileReader as HR
+
+
+Extensions = ('.hdf5', '.h5')
+Name_Pattern = re.compile(r'^(.*?)-?(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2})$')     # <prefix>-<date> of HDF5_FileWriter.timestampedName and the scripts
+Block_Size = 2**20          # Number of values read at once for the statistics
+
+Schema = '''
+CREATE TABLE IF NOT EXISTS recordings (path TEXT PRIMARY KEY, prefix TEXT, date TEXT, mtime REAL, size INTEGER,
+                                       duration REAL, attributes TEXT, error TEXT);
+CREATE TABLE IF NOT EXISTS devices (path TEXT, name TEXT, details TEXT, signal TEXT, samples INTEGER, start REAL, end REAL,
+                                    duration REAL, rate REAL, minimum REAL, maximum REAL, mean REAL);
+CREATE TABLE IF NOT EXISTS parameters (path TEXT, key TEXT, value TEXT);
+CREATE INDEX IF NOT EXISTS devices_path ON devices (path);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name);
+CREATE INDEX IF NOT EXISTS parameters_path ON parameters (path);
+CREATE INDEX IF NOT EXISTS parameters_key ON parameters (key, value);
+CREATE INDEX IF NOT EXISTS recordings_date ON recordings (date);
+'''
+
+
+def text(Value):
+    ''' Value of an attribute or parameter as text: strings as they are, the other values in JSON (e.g., 10, 0.5, [8, 16]) '''
+    if isinstance(Value, bytes):
+        return Value.decode('utf-8', 'replace')
+    if isinstance(Value, type(u'')):
+        return Value
+    if isinstance(Value, np.ndarray):
+        Value = Value.tolist()
+    elif isinstance(Value, np.generic):
+        Value = Value.item()
+    if isinstance(Value, float) and Value.is_integer():
+        Value = int(Value)                  # 5000.0 and 5000 are the same parameter
+    return json.dumps(Value)
+
+
+def parseName(File_name):
+    ''' Returning the prefix and the date (YYYY-MM-DD HH:MM:SS) of a recording from its name, or (name, None) '''
+    Name = os.path.splitext(os.path.basename(File_name))[0]
+    Match = Name_Pattern.match(Name)
+    if Match is None:
+        return Name, None
+    Date = datetime.datetime.strptime(Match.group(2), '%Y-%m-%d-%H-%M-%S')
+    return Match.group(1), Date.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def flatten(Values, Prefix = ''):
+    ''' Flattening nested dictionaries (e.g., the Experiment of Batch_Runner.py) to (key, value) pairs with keys like Devices.DAQ.PhotoDiod_Port '''
+    Pairs = []
+    for Key in sorted(Values):
+        if isinstance(Values[Key], dict):
+            Pairs.extend(flatten(Values[Key], Prefix + Key + '.'))
+        else:
+            Pairs.append((Prefix + Key, text(Values[Key])))
+    return Pairs
+
+
+def statistics(Dataset):
+    ''' Minimum, maximum and mean of a LazyDataset in physical units, read by blocks along its last axis '''
+    if not Dataset.shape or Dataset.shape[-1] == 0:
+        return None, None, None
+    Width = int(np.prod(Dataset.shape[:-1])) if len(Dataset.shape) > 1 else 1
+    Step = max(1, Block_Size//Width)
+    Minimum, Maximum, Total, Count = np.inf, -np.inf, 0.0, 0
+    for Start in range(0, Dataset.shape[-1], Step):
+        Block = np.asarray(Dataset[..., Start:Start + Step], dtype = float)
+        Minimum, Maximum = min(Minimum, Block.min()), max(Maximum, Block.max())
+        Total, Count = Total + Block.sum(), Count + Block.size
+    return float(Minimum), float(Maximum), Total/Count
+
+
+def describeDevice(Device, Statistics = True):
+    ''' Returning the row of a device group: details, main signal, number of samples, time span, rate and statistics '''
+    Details = [text(Device.attrs[Key]) for Key in Device.attrs.keys() if Key.endswith('Details')]
+    Row = {'name': Device.Name, 'details': '\n'.join(Details), 'signal': None, 'samples': None, 'start': None, 'end': None,
+           'duration': None, 'rate': None, 'minimum': None, 'maximum': None, 'mean': None}
+    if Device.Time is None:
+        return Row
+    Samples = len(Device.Time)
+    Row['samples'] = Samples
+    if Samples:
+        # The streams of several ports have time stamps for each port (ports x samples)
+        Row['start'], Row['end'] = float(np.min(Device.Time[..., 0])), float(np.max(Device.Time[..., -1]))
+        Row['duration'] = Row['end'] - Row['start']
+        if Samples > 1 and Row['duration'] > 0:
+            Row['rate'] = (Samples - 1)/Row['duration']
+    # The signal is the first dataset sampled at the time stamps (e.g., PhotoDiode, Intensities, Power)
+    for Name in Device.keys():
+        if Name in HR.Time_Names:
+            continue
+        Dataset = Device[Name]
+        if len(Dataset.shape) and Dataset.shape[-1] == Samples:
+            Row['signal'] = Name
+            if Statistics:
+                Row['minimum'], Row['maximum'], Row['mean'] = statistics(Dataset)
+            break
+    return Row
+
+
+class RecordingCatalog(object):
+    '''
+    SQLite index of the recordings of a folder (and its subfolders)
+    '''
+    def __init__(self, Records_Path = 'Records', Catalog_File = None):
+        self.Records_Path = Records_Path
+        self.Catalog_File = Catalog_File or os.path.join(Records_Path, 'Catalog.sqlite')
+        self.Connection = sqlite3.connect(self.Catalog_File)
+        self.Connection.row_factory = sqlite3.Row
+        self.Connection.executescript(Schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+    def files(self):
+        ''' Paths of the recordings of the folder, relative to it '''
+        Paths = []
+        for Folder, Folders, Names in os.walk(self.Records_Path):
+            for Name in Names:
+                if Name.lower().endswith(Extensions):
+                    Paths.append(os.path.relpath(os.path.join(Folder, Name), self.Records_Path))
+        return sorted(Paths)
+
+    def scan(self, Statistics = True, Verbose = True):
+        '''
+        Indexing the new and changed recordings (by modification time and size) and removing the deleted ones.
+        The recordings which could not be read are tried again.
+        Statistics reads the signals for their minimum, maximum and mean; without it only the structure of the files is read.
+        Returns the number of (indexed, unchanged, removed) recordings.
+        '''
+        Known = dict((Row['path'], (Row['mtime'], Row['size'], Row['error'])) for Row in self.Connection.execute('SELECT path, mtime, size, error FROM recordings'))
+        Paths = self.files()
+        Indexed = 0
+        for Path in Paths:
+            State = os.stat(os.path.join(self.Records_Path, Path))
+            if Known.get(Path) == (State.st_mtime, State.st_size, None):
+                continue
+            self.index(Path, State, Statistics)
+            Indexed = Indexed + 1
+            if Verbose:
+                print ('Indexed %s' % Path)
+        Present = set(Paths)
+        Removed = [Path for Path in Known if Path not in Present]
+        for Path in Removed:
+            self.remove(Path)
+        self.Connection.commit()
+        return Indexed, len(Paths) - Indexed, len(Removed)
+
+    def remove(self, Path):
+        for Table in ('recordings', 'devices', 'parameters'):
+            self.Connection.execute('DELETE FROM %s WHERE path = ?' % Table, (Path,))
+
+    def index(self, Path, State, Statistics = True):
+        ''' Reading one recording (lazily) into the catalog; a file which cannot be read is kept with its error '''
+        self.remove(Path)
+        Prefix, Date = parseName(Path)
+        if Date is None:
+            Date = datetime.datetime.fromtimestamp(State.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        Attributes, Parameters, Devices, Error = {}, [], [], None
+        try:
+            with HR.Recording(os.path.join(self.Records_Path, Path)) as Data:
+                for Key in Data.attrs.keys():
+                    Attributes[Key] = text(Data.attrs[Key])
+                    if Key == 'Experiment':
+                        Parameters.extend(flatten(json.loads(Attributes[Key])))
+                    else:
+                        Parameters.append((Key, Attributes[Key]))
+                for Name in Data.keys():
+                    Devices.append(describeDevice(Data[Name], Statistics))
+        except Exception as e:
+            Error = '%s: %s' % (type(e).__name__, e)
+        Durations = [Row['duration'] for Row in Devices if Row['duration'] is not None]
+        self.Connection.execute('INSERT INTO recordings VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                (Path, Prefix, Date, State.st_mtime, State.st_size, max(Durations) if Durations else None,
+                                 json.dumps(Attributes), Error))
+        for Row in Devices:
+            self.Connection.execute('INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (Path, Row['name'], Row['details'], Row['signal'], Row['samples'], Row['start'], Row['end'],
+                                     Row['duration'], Row['rate'], Row['minimum'], Row['maximum'], Row['mean']))
+        self.Connection.executemany('INSERT INTO parameters VALUES (?, ?, ?)', [(Path, Key, Value) for (Key, Value) in Parameters])
+
+    def find(self, Since = None, Until = None, Prefix = None, Device = None, **Parameters):
+        '''
+        Returning the recordings (dictionaries of the recordings table) ordered by date. Since and Until are dates (YYYY-MM-DD,
+        optionally with the time), Until includes the whole day; Prefix matches the start of the prefix, Device the name of a group,
+        and the other keywords the parameters, e.g. Paradigm = 'c', Integration_Time = 10.
+        '''
+        Conditions, Values = [], []
+        if Since is not None:
+            Conditions.append('date >= ?')
+            Values.append(Since)
+        if Until is not None:
+            Conditions.append('substr(date, 1, length(?)) <= ?')
+            Values.extend([Until, Until])
+        if Prefix is not None:
+            Conditions.append("prefix LIKE ? ESCAPE '\\'")
+            Values.append(Prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if Device is not None:
+            Conditions.append('path IN (SELECT path FROM devices WHERE name = ?)')
+            Values.append(Device)
+        for Key in sorted(Parameters):
+            Conditions.append('path IN (SELECT path FROM parameters WHERE key = ? AND value = ?)')
+            Values.extend([Key, text(Parameters[Key])])
+        Query = 'SELECT * FROM recordings' + (' WHERE ' + ' AND '.join(Conditions) if Conditions else '') + ' ORDER BY date, path'
+        return [dict(Row) for Row in self.Connection.execute(Query, Values)]
+
+    def devices(self, Path):
+        ''' Returning the device rows of a recording '''
+        return [dict(Row) for Row in self.Connection.execute('SELECT * FROM devices WHERE path = ? ORDER BY name', (Path,))]
+
+    def parameters(self, Path):
+        ''' Returning the parameters of a recording as a dictionary of texts '''
+        return dict((Row['key'], Row['value']) for Row in self.Connection.execute('SELECT key, value FROM parameters WHERE path = ?', (Path,)))
+
+    def close(self):
+        self.Connection.close()
+
+
+def parameterValue(Text):
+    ''' Value of a --param on the command line: JSON if it can be read (10, 0.5, [8, 16]), otherwise the text '''
+    try:
+        return json.loads(Text)
+    except ValueError:
+        return Text
+
+
+if __name__ == "__main__":
+    import argparse
+    Parser = argparse.ArgumentParser(description = 'SQLite catalog of the recordings of a folder')
+    Parser.add_argument('command', choices = ['scan', 'find'])
+    Parser.add_argument('records', nargs = '?', default = 'Records', help = 'folder of the recordings')
+    Parser.add_argument('--catalog', help = 'catalog file (records/Catalog.sqlite by default)')
+    Parser.add_argument('--no-statistics', action = 'store_true', help = 'scan: do not read the signals for their statistics')
+    Parser.add_argument('--since', help = 'find: first date, YYYY-MM-DD')
+    Parser.add_argument('--until', help = 'find: last date, YYYY-MM-DD')
+    Parser.add_argument('--prefix', help = 'find: start of the file name prefix')
+    Parser.add_argument('--device', help = 'find: name of a device group, e.g. Spectrometer')
+    Parser.add_argument('--param', action = 'append', default = [], help = 'find: parameter as Key=Value, e.g. Paradigm=c (repeatable)')
+    Arguments = Parser.parse_args()
+
+    Catalog = RecordingCatalog(Arguments.records, Arguments.catalog)
+    if Arguments.command == 'scan':
+        print ('%i recordings indexed, %i unchanged, %i removed' % Catalog.scan(not Arguments.no_statistics))
+    else:
+        Parameters = dict((Pair.split('=', 1)[0], parameterValue(Pair.split('=', 1)[1])) for Pair in Arguments.param)
+        Runs = Catalog.find(Arguments.since, Arguments.until, Arguments.prefix, Arguments.device, **Parameters)
+        for Run in Runs:
+            Devices = ', '.join('%s %s samples' % (Row['name'], Row['samples']) for Row in Catalog.devices(Run['path']))
+            Duration = '' if Run['duration'] is None else '%.3f s' % Run['duration']
+            print ('%s  %-40s %10s  %s%s' % (Run['date'], Run['path'], Duration, Devices, '  ' + Run['error'] if Run['error'] else ''))
+        print ('%i recordings' % len(Runs))
+    Catalog.close()
@@ -6,6 +6,7 @@ https://github.com/ap--/python-seabreeze"
 To use this class and its functions, following syntax is recommended:
 import SeaBreeze_Objective as SBO
 DeviceName = SBO.DetectSpectrometer()
+To open a particular spectrometer use DeviceName = SBO.DetectSpectrometer(Serial), the serial numbers of the connected spectrometers are returned by SBO.listSerials()
 To clear the spectrometer use DeviceName.clear()
 To reset the spectrometer use DeviceName.reset()
 To close the spectrometer use DeviceName.close()
@@ -13,6 +14,8 @@ To get the detailed information about connected spectrometer use DeviceName.read
 To read the intensities the recommended format is Intensities = DeviceName.readIntensity(True, True). The True values refer to Correct_dark_counts and Correct_nonlinearity
 The first element of Intensities (Intensities[0]) is the moment when the intensities are read (in unix time format)
 To read the wavelengthes the recommended format is Wavelengthes = DeviceName.readWavelenght()
+To record a hardware triggered sequence (one spectrum per integration time) use Intensities, Times = DeviceName.readTriggeredSequence(Integration_list_MilSec, Trigger_Function, TriggerValue)
+where Trigger_Function(Index, Integration_MilSec) generates the trigger edge on the DAQ (e.g., DAQ1.triggerPulse('FIO2')) and opens the shutter for the window
 
 
 To chose an integration time use DeviceName.setIntegrationTime(IntegrationTime), where IntegrationTime is in microseconds and is from minimum integration time to maximum integration time
@@ -76,12 +79,23 @@ June 24, 2016
 '''
 
 import time
-import seabreeze.spectrometers as sb
+import Clock_Service as Clock
+import threading
+import numpy as np
+import Lazy_Import as Lazy
+sb = Lazy.module('seabreeze.spectrometers')     # Loaded when a spectrometer is opened
+
+
+def listSerials():
+    ''' Returning the serial numbers of all the connected spectrometers '''
+    return [Device.serial for Device in sb.list_devices()]
 
 
 class DetectSpectrometer:
     ''' ************** Detection of the OceanOptics spectrumeter **************** '''
-    def __init__(self):
+    def __init__(self, Serial = None):
+        ''' Serial is the serial number of the spectrometer to open. If it is None the first detected spectrometer is opened. '''
+        self.Serial = Serial
         try:
             sb.list_devices()
             if len(sb.list_devices()) == 0:
@@ -89,24 +103,38 @@ class DetectSpectrometer:
                 self.Error = 1
                 return         
             else:
-                self.detect()
+                self.detect(Serial)
         except Exception, e:
             if (e.message == 'This should not have happened. Apparently this device has 0 serial number features. The code expects it to have 1 and only 1. Please file a bug report including a description of your device.'):
                 #print ('Please unplug the spectrometer and then plug again. Then close the python command line and reopen it. Last')
                 print ('Unplug the spectrometer and then plug again, then close the python command line and reopen it.')
                 self.Error = 1
                 return
+            print ('Failed to detect the spectrometer: %s \n' % e)      # e.g., the seabreeze library is not installed
+            self.Error = 1
+            return
         #return             
     
     
+    def findDevice(self, Serial = None):
+        ''' Returning the device with the given serial number (or the first device if Serial is None) '''
+        devices = sb.list_devices()
+        if Serial is None:
+            return devices[0]
+        for Device in devices:
+            if Device.serial == Serial:
+                return Device
+        raise Exception('Spectrometer with serial number %s is not connected' % Serial)
     
-    def detect(self):
+    
+    def detect(self, Serial = None):
         try:                 
-            devices = sb.list_devices()
-            sb.Spectrometer(devices[0]).close()
-            self.Handle = sb.Spectrometer(devices[0])
+            Device = self.findDevice(Serial)
+            sb.Spectrometer(Device).close()
+            self.Handle = sb.Spectrometer(Device)
+            self.Serial = self.Handle.serial_number
             self.Error = 0
-            print (devices)
+            print (Device)
             print ('Serial number:%s' % self.Handle.serial_number)
             print ('Model:%s' % self.Handle.model)
             print ('minimum_integration_time_micros: %s microseconds' % self.Handle.minimum_integration_time_micros)
@@ -137,13 +165,13 @@ class DetectSpectrometer:
 
     def reset(self):
         ''' This function resets the spectrometer. To make a hardware reset unplug it from the computer and then plug in again. '''
-        devices = sb.list_devices()
         if len(sb.list_devices()) == 0:
             print ("No spectrometer is detected! \n")
             return
         else:
             self.Handle.close()
-            self.Handle = sb.Spectrometer(devices[0])
+            self.Handle = sb.Spectrometer(self.findDevice(self.Serial))
+            self.Pending_Reader = None          # A reading pending on the closed handle does not block the new one
         self.clear()
 
 
@@ -156,6 +184,7 @@ class DetectSpectrometer:
     def setTriggerMode(self, Trigger_mode):
         ''' Setting the triggering mode (e.g., free running or external trigger) '''
         self.Handle.trigger_mode(Trigger_mode)
+        self.Trigger_Mode = Trigger_mode
         time.sleep(0.01)
 
 
@@ -165,7 +194,95 @@ class DetectSpectrometer:
         Important! the first element in the Intensities array is the unix time for when the reading is finished.
         '''
         Intensities = self.Handle.intensities(correct_dark_counts=Correct_dark_counts, correct_nonlinearity=Correct_nonlinearity)
-        return Intensities, time.time()
+        return Intensities, Clock.timestamp()
+
+
+    def readTriggeredSequence(self, Integration_list_MilSec, Trigger_Function, Trigger_mode=4, Correct_dark_counts=True, Correct_nonlinearity=True, Arm_Delay=0.001, Timeout=1.0):
+        '''
+        Reading one spectrum per integration time (milliseconds) in external trigger mode.
+        For each acquisition the integration time is set and the spectrometer is armed, then Trigger_Function(Index, Integration_MilSec)
+        is called from a helper thread after Arm_Delay seconds. Trigger_Function must produce the trigger edge on the DAQ and drive the shutter,
+        so every spectrum is aligned to its shutter window by the hardware and not by polling.
+        Trigger_mode is the external (edge or synchronization) trigger value of the spectrometer, see the table above.
+        The sequence is aborted if Trigger_Function raises or a spectrum cannot be read (the error is raised again here) or if a spectrum
+        is not read Timeout seconds after its trigger window. A reading still blocked in the USB read is released by abortRead before any
+        other command is sent, and the trigger mode which was set before is then restored.
+        Returns the intensities (one row per acquisition) and the moments when each reading is finished.
+        '''
+        if getattr(self, 'Needs_Clear', False):
+            raise Exception('A triggered reading of the spectrometer was aborted, call clear() or reset() before reading again')
+        Wave_len = len(self.Handle.wavelengths())
+        Intensities = np.zeros(shape=(len(Integration_list_MilSec), Wave_len), dtype = float)
+        Spec_Time = np.zeros(shape=(len(Integration_list_MilSec), ), dtype = float)
+        Previous_Mode = getattr(self, 'Trigger_Mode', 0)
+        self.setTriggerMode(Trigger_mode)
+        Reader = None
+        try:
+            for I in range(len(Integration_list_MilSec)):
+                self.setIntegrationTime(int(Integration_list_MilSec[I]*1000))       # Converting it to microseconds
+                Reading = []
+                Read_Error = []
+                Trigger_Error = []
+                # The reading blocks until the triggered integration is over, so it is waited for with a timeout
+                Reader = threading.Thread(target=self.readTriggered, args=(Reading, Read_Error, Correct_dark_counts, Correct_nonlinearity))
+                Reader.daemon = True
+                Reader.start()
+                Trigger = threading.Timer(Arm_Delay, self.callTrigger, args=(Trigger_Error, Trigger_Function, I, Integration_list_MilSec[I]))
+                Trigger.daemon = True
+                Trigger.start()
+                Window = Arm_Delay + Integration_list_MilSec[I]/float(1000)
+                Trigger.join(Window + Timeout)
+                if Trigger_Error:
+                    raise Trigger_Error[0]
+                if Trigger.is_alive():
+                    raise Exception('Trigger of acquisition %i did not finish within %f s' % (I, Window + Timeout))
+                Reader.join(Timeout)
+                if Read_Error:
+                    raise Read_Error[0]
+                if len(Reading) == 0:
+                    raise Exception('Spectrum %i was not read within %f s of its trigger, check the trigger cable and mode' % (I, Timeout))
+                Intensities[I], Spec_Time[I] = Reading[0]
+        finally:
+            # No command is sent over the handle while a reading is pending on it
+            if Reader is None or not Reader.is_alive() or self.abortRead(Reader, Timeout):
+                self.setTriggerMode(Previous_Mode)
+        return Intensities, Spec_Time
+
+
+    def readTriggered(self, Reading, Read_Error, Correct_dark_counts, Correct_nonlinearity):
+        ''' Helper thread of readTriggeredSequence: appending one (intensities, time) reading to the Reading list, or its error to Read_Error '''
+        try:
+            Reading.append(self.readIntensity(Correct_dark_counts, Correct_nonlinearity))
+        except Exception, e:
+            Read_Error.append(e)
+
+
+    def abortRead(self, Reader, Timeout):
+        '''
+        Releasing a triggered reading which is still blocked in the USB read after an abort: the handle is closed, which ends the read, and
+        once the reading thread is over the spectrometer is opened again and cleared. Returns False if that is not possible; the device is
+        then marked with Needs_Clear and no other command is sent to it until clear() or reset() is called.
+        '''
+        try:
+            self.Handle.close()
+            Reader.join(Timeout)
+            if not Reader.is_alive():
+                self.Handle = sb.Spectrometer(self.findDevice(self.Serial))
+                self.clear()
+                return True
+        except Exception, e:
+            print ('Failed to release the spectrometer after an aborted reading: %s' % e)
+        self.Needs_Clear = True
+        self.Pending_Reader = Reader
+        return False
+
+
+    def callTrigger(self, Trigger_Error, Trigger_Function, Index, Integration_MilSec):
+        ''' Helper thread of readTriggeredSequence: the errors of Trigger_Function are handed to the reading thread '''
+        try:
+            Trigger_Function(Index, Integration_MilSec)
+        except Exception, e:
+            Trigger_Error.append(e)
 
 
     def readWavelength(self):
@@ -174,6 +291,9 @@ class DetectSpectrometer:
 
 
     def clear(self):
+        Reader = getattr(self, 'Pending_Reader', None)
+        if Reader is not None and Reader.is_alive():
+            raise Exception('A triggered reading is still pending on the spectrometer, use reset() or unplug it and plug it again')
         for I in range(3):
             self.Handle.trigger_mode(0)            #Flushing the stuff down and make the spectrometer ready for the next steps!
             time.sleep(0.01)
@@ -181,6 +301,9 @@ class DetectSpectrometer:
             time.sleep(0.01)
             self.Handle.intensities(correct_dark_counts=True, correct_nonlinearity=True)
             time.sleep(0.01)
+        self.Trigger_Mode = 0
+        self.Needs_Clear = False
+        self.Pending_Reader = None
 
 
     def close(self):
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated DAQ, spectrometer and power meter with the same functions as DetectDAQT7/DetectPi, DetectSpectrometer and DetectPM100D.
+They are used to run the acquisition code (benchmarks, sessions, batch runs) without the lab hardware.
+Every call takes a configurable time with a gaussian jitter. The simulated DAQ has a shutter and a photodiode:
+the photodiode port sees the light Shutter_Latency seconds after the shutter port is opened (or closed).
+The shutter state is kept in shared memory, so the photodiode can be read in a forked process.
+
+To use these classes, following syntax is recommended:
+import Simulated_Devices as SD
+DAQ1 = SD.SimulatedDAQ(Read_Time = 0.0001, Shutter_Latency = 0.004)
+Spec1 = SD.SimulatedSpectrometer(Light = DAQ1)          # The spectra are brighter while the shutter of DAQ1 is open
+Power_meter = SD.SimulatedPM100(Light = DAQ1)
+"""
+
+import random
+import time
+import numpy as np
+import Clock_Service as Clock
+from multiprocessing import RawValue
+
+
+def busyWait(Duration):
+    ''' Waiting for Duration seconds: sleeping for the long part and spinning for the last millisecond '''
+    Deadline = Clock.monotonic() + Duration
+    if Duration > 0.002:
+        time.sleep(Duration - 0.001)
+    while Clock.monotonic() < Deadline:
+        pass
+
+
+class SimulatedDevice:
+    def __init__(self, Read_Time, Jitter, Light, Seed):
+        self.Read_Time = Read_Time
+        self.Jitter = Jitter
+        self.Light = Light
+        self.Random = random.Random(Seed)
+        self.Error = 0
+
+    def delay(self, Duration = None):
+        busyWait(max(0, (self.Read_Time if Duration is None else Duration) + self.Random.gauss(0, self.Jitter)))
+
+    def isLit(self):
+        return self.Light is not None and self.Light.isLit()
+
+    def close(self):
+        return
+
+
+class SimulatedDAQ(SimulatedDevice):
+    '''
+    A DAQ whose Shutter_Port drives the light seen on PhotoDiod_Port
+    '''
+    def __init__(self, Read_Time = 0.0001, Jitter = 0.00002, Shutter_Latency = 0.004, Shutter_Port = 'DAC0', PhotoDiod_Port = 'AIN1', Seed = None):
+        SimulatedDevice.__init__(self, Read_Time, Jitter, None, Seed)
+        self.Shutter_Latency = Shutter_Latency
+        self.Shutter_Port = Shutter_Port
+        self.PhotoDiod_Port = PhotoDiod_Port
+        self.Shutter_Open = RawValue('i', 0)
+        self.Shutter_Time = RawValue('d', 0)         # Monotonic time of the last shutter edge
+        self.Light = self
+
+    def getDetails(self):
+        return 'Simulated DAQ, read time %f s, shutter latency %f s' % (self.Read_Time, self.Shutter_Latency)
+
+    def isLit(self):
+        Settled = Clock.monotonic() - self.Shutter_Time.value >= self.Shutter_Latency
+        return bool(self.Shutter_Open.value) == Settled
+
+    def writePort(self, Port, Volt):
+        if type(Port) == str:
+            Port = [Port]
+        if type(Volt) in [int, float]:
+            Volt = [Volt]
+        for (Each_Port, Each_Volt) in zip(Port, Volt):
+            if Each_Port == self.Shutter_Port and int(Each_Volt > 1) != self.Shutter_Open.value:
+                self.Shutter_Time.value = Clock.monotonic()
+                self.Shutter_Open.value = int(Each_Volt > 1)
+
+    def triggerPulse(self, Port, Pulse_Width = 0.0001):
+        Rising_Edge = Clock.timestamp()
+        busyWait(Pulse_Width)
+        return Rising_Edge
+
+    def readPort(self, Port):
+        self.delay()
+        Volt = self.Random.gauss(0.05, 0.005)
+        if self.isLit():
+            Volt = Volt + 2.0
+        return np.float64(Volt), Clock.timestamp()
+
+    def streamRead(self, scanRate, scansPerRead, Port):
+        if type(Port) == str:
+            Port = [Port]
+        StartingMoment = Clock.timestamp()
+        Read = [[], 1, 2]
+        for I in range(int(scansPerRead)*len(Port)):
+            Read[0].append(self.readPort(Port[I % len(Port)])[0])
+            busyWait(1/float(scanRate*len(Port)) - self.Read_Time)
+        return Read, StartingMoment, Clock.timestamp()
+
+
+class SimulatedHandle:
+    ''' The attributes of the seabreeze handle which are used by the acquisition code '''
+    def __init__(self, No_Pixels):
+        self.Wavelengths = np.linspace(340, 1030, No_Pixels)
+        self.minimum_integration_time_micros = 1000
+        self.serial_number = 'SIM00001'
+        self.model = 'Simulated'
+
+    def wavelengths(self):
+        return self.Wavelengths
+
+
+class SimulatedSpectrometer(SimulatedDevice):
+    '''
+    A free running spectrometer: each reading takes the integration time plus the transfer time
+    '''
+    def __init__(self, No_Pixels = 2048, Transfer_Time = 0.0005, Jitter = 0.0001, Light = None, Seed = None):
+        SimulatedDevice.__init__(self, Transfer_Time, Jitter, Light, Seed)
+        self.Handle = SimulatedHandle(No_Pixels)
+        self.Serial = self.Handle.serial_number
+        self.Integration_Time = 0.01
+        self.Trigger_Mode = 0
+        self.Spectrum = 100*np.exp(-((self.Handle.Wavelengths - 532)/10.0)**2)
+
+    def readDetails(self):
+        return {'model': self.Handle.model, 'serial_number': self.Serial}
+
+    def reset(self):
+        return
+
+    def setIntegrationTime(self, Integration_time):
+        ''' Setting the integration time (microseconds) '''
+        self.Integration_Time = Integration_time/1e6
+
+    def setTriggerMode(self, Trigger_mode):
+        self.Trigger_Mode = Trigger_mode
+
+    def readWavelength(self):
+        return self.Handle.wavelengths()
+
+    def readIntensity(self, Correct_dark_counts, Correct_nonlinearity):
+        self.delay(self.Integration_Time + self.Read_Time)
+        Intensities = np.random.normal(10, 1, len(self.Spectrum))
+        if self.isLit():
+            Intensities = Intensities + self.Spectrum*self.Integration_Time*1000
+        return Intensities, Clock.timestamp()
+
+
+class SimulatedPM100(SimulatedDevice):
+    '''
+    A power meter reading 1 mW while the light is on
+    '''
+    def __init__(self, Read_Time = 0.003, Jitter = 0.0003, Light = None, Seed = None):
+        SimulatedDevice.__init__(self, Read_Time, Jitter, Light, Seed)
+        self.Average_Count = 1
+        self.Serial = 'SIM00002'
+
+    def getDetails(self):
+        return 'Simulated PM100, read time %f s' % self.Read_Time
+
+    def setAverageCount(self, Count):
+        self.Average_Count = int(Count)
+
+    def getAverageCount(self):
+        return self.Average_Count
+
+    def readPower(self):
+        self.delay(self.Read_Time*self.Average_Count)
+        return (0.001 if self.isLit() else 0.0) + self.Random.gauss(0, 1e-6), Clock.timestamp()
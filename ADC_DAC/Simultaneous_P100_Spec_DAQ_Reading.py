@@ -1,4 +1,5 @@
-import h5py
+import Lazy_Import as Lazy
+h5py = Lazy.module('h5py')
 #import DAQT7_Objective as DAQ
 import ADC_DAC_PiC
 import SeaBreeze_Objective as SBO
@@ -6,40 +7,14 @@ import ThorlabsPM100_Objective as P100
 import time
 import datetime
 import numpy as np
-from multiprocessing import Process, Value, Array
-import matplotlib.pyplot as plt
+plt = Lazy.module('matplotlib.pyplot')
+import Acquisition_Session as AS
 
 time_start =  time.time()
 
 
 
 
-def Spec_Read_Process(No_Spec_Sample):
-    # ########## A function for reading the spectrometer intensities ###########
-    while Spec_Index[0] < (No_Spec_Sample -1):
-        #Time_Label = time.time()
-        Current_Spec_Record[:], Spec_Time[Spec_Index[0]]  = Spec1.readIntensity(True, True)
-        Spec_Is_Read.value = 1
-        Spec_Index[0] = Spec_Index[0] + 1
-        print "spectrometer Index is %i" % Spec_Index[0]
-    Spec_Is_Done.value = 1
-
-
-def DAQ_Read_Process(No_DAC_Sample,):
-    # ######## A function for reading the DAQ analogue inpute on AINX ########
-    while DAQ_Index[0] < No_DAC_Sample:
-        DAQ_Signal[DAQ_Index[0]], DAQ_Time[DAQ_Index[0]] = DAQ1.readPort('AIN1')
-        DAQ_Index[0] = DAQ_Index[0] + 1
-    DAQ_Is_Read.value = 1
-
-def Power_Read_Process(No_Power_Sample):
-    # ######## A function for reading the Power meter ########
-    while Power_Index[0] < No_Power_Sample:
-        Power_Signal[Power_Index[0]], Power_Time[Power_Index[0]] = Power_meter.readPower()
-        Power_Index[0] = Power_Index[0] + 1
-    Power_Is_Read.value = 1
-
-
 if __name__ == "__main__":
 
     PhotoDiod_Port = "AIN1"
@@ -50,57 +25,31 @@ if __name__ == "__main__":
     #DAQ1 = DAQ.DetectDAQT7()
     DAQ1 = ADC_DAC_PiC.DetectPi()
     Power_meter = P100.DetectPM100D()
-    Spec_Is_Read = Value('i', 0)
-    Spec_Is_Read.value = 0
-    Spec_Is_Done = Value('i', 0)
-    Spec_Is_Done.value = 0
-    DAQ_Is_Read = Value('i', 0)
-    DAQ_Is_Read.value = 0
-    Power_Is_Read = Value('i', 0)
-    Power_Is_Read.value = 0
-    Timer_Is_Over = Value('i', 0)
-    Timer_Is_Over.value = 0
 
     DurationOfReading = 1.12      # Duration of reading in seconds.
     No_DAC_Sample =   int(round(DurationOfReading*1000/0.5))                # Number of samples for DAQ analogue to digital converter (AINx). Roughly DAQ can read AINx every 0.4 ms
     No_Power_Sample = int(round(DurationOfReading*1000/5.1))                # Number of samples for P100D Power meter to read. Roughly P100 can read the power every 2.7 ms.
     No_Spec_Sample =  int(round(DurationOfReading*1000/(Integration_Time))) # Number of samples for spectrometer to read.
 
-    Current_Spec_Record = Array('d', np.zeros(shape=( len(Spec1.Handle.wavelengths()) ,1), dtype = float ))
-    #Spec_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
-    Full_Spec_Records = np.zeros(shape=(len(Spec1.Handle.wavelengths()), No_Spec_Sample ), dtype = float )
-    Spec_Time   = Array('d', np.zeros(shape=( No_Spec_Sample ,1), dtype = float ))
-    #Spec_Index = 0
-    Spec_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
-
-    DAQ_Signal = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
-    DAQ_Time   = Array('d', np.zeros(shape=( No_DAC_Sample ,1), dtype = float ))
-    DAQ_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
-
-
-    Power_Signal = Array('d', np.zeros(shape=( No_Power_Sample ,1), dtype = float ))
-    Power_Time   = Array('d', np.zeros(shape=( No_Power_Sample ,1), dtype = float ))
-    Power_Index = Array('i', np.zeros(shape=( 1 ,1), dtype = int ))
-
-    # ########### The file containing the records (HDF5 format)###########'''
-
-
-    Pros_DAQ = Process(target=DAQ_Read_Process, args=(No_DAC_Sample,))
-    Pros_DAQ.start()
-    Pros_Power = Process(target=Power_Read_Process, args=(No_Power_Sample,))
-    Pros_Power.start()
-    Pros_Spec = Process(target=Spec_Read_Process, args=(No_Spec_Sample,))
-    Pros_Spec.start()
-
-
-    while((Spec_Is_Done.value == 0)):
-        if  Spec_Is_Read.value == 1:
-            Spec_Is_Read.value = 0
-            Full_Spec_Records[:, np.int(Spec_Index[0])-1] = Current_Spec_Record[:]
+    # ########### Every device is read by a worker of the acquisition session ###########
+    Session = AS.AcquisitionSession()
+    Session.addDevice('DAQT7', DAQ1, No_DAC_Sample, Port = PhotoDiod_Port)
+    Session.addDevice('PM100_PowerMeter', Power_meter, No_Power_Sample)
+    Session.addDevice('Spectrometer', Spec1, No_Spec_Sample)
+    Session.start()
+    Session.wait()
     print('Spectrometer is done')
-    while True:
-        if ((DAQ_Is_Read.value == 1) & (Power_Is_Read.value == 1)):
-            break
+    Record = Session.records()
+
+    DAQ_Signal = Record['DAQT7']['Signal'][:, 0]
+    DAQ_Time = Record['DAQT7']['TimeIndex']
+    DAQ_Index = [len(DAQ_Time)]
+    Power_Signal = Record['PM100_PowerMeter']['Signal'][:, 0]
+    Power_Time = Record['PM100_PowerMeter']['TimeIndex']
+    Power_Index = [len(Power_Time)]
+    Full_Spec_Records = Record['Spectrometer']['Signal'].T
+    Spec_Time = Record['Spectrometer']['TimeIndex']
+    Spec_Index = [len(Spec_Time)]
 
     time.sleep(0.1)
     DAQ1.close()
@@ -6,10 +6,11 @@ Created on Tue May 24 10:30:33 2016
 """
 
 import SeaBreeze_Objective as SBO
-import matplotlib.pyplot as plt
+import Lazy_Import as Lazy
+plt = Lazy.module('matplotlib.pyplot')
 import numpy as np
 import time
-import h5py
+h5py = Lazy.module('h5py')
 import datetime
 
 Spec = SBO.DetectSpectrometer()
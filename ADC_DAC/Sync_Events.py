@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Event-driven synchronization between the acquisition processes.
+The scripts used Value('i') flags and waited for them in busy loops (e.g., while (Spec_Is_Done.value == 0)), which takes a whole core of the Pi.
+A Flag is a drop-in replacement of these Value flags (Flag.value = 1 still works) backed by a multiprocessing.Event,
+so a process can block on it without using the CPU. The moment the flag is set is shared with the waiting process,
+and the wake up latency of every wait is recorded. The moments and the deadlines are taken from the monotonic clock of Clock_Service.py,
+so a step of the wall clock (e.g., NTP) does not change the latencies or the timeouts.
+
+To use this class, following syntax is recommended:
+import Sync_Events as Sync
+DAQ_Is_Read = Sync.Flag()              # Instead of DAQ_Is_Read = Value('i', 0)
+DAQ_Is_Read.value = 1                  # In the worker process, or DAQ_Is_Read.set()
+DAQ_Is_Read.wait()                     # In the main process, instead of polling DAQ_Is_Read.value
+Sync.waitAll([DAQ_Is_Read, Power_Is_Read, Spec_Is_Done])
+Processes, Done = Sync.startProcesses([(Target1, Args1), (Target2, Args2)])
+Sync.waitFirst(Processes, Done)        # Blocks until one of the processes is finished and terminates the others
+DAQ_Is_Read.Latencies                  # Seconds between setting the flag and waking up the waiting process
+"""
+
+import Clock_Service as Clock
+from multiprocessing import Event, RawValue, Process
+
+
+class Flag(object):
+    '''
+    A flag shared between processes which can be waited for without polling
+    '''
+    def __init__(self, Value = 0):
+        self.Event = Event()
+        self.Set_Time = RawValue('d', 0)
+        self.Latencies = []
+        self.value = Value
+
+    def __getValue(self):
+        return int(self.Event.is_set())
+
+    def __setValue(self, Value):
+        if Value:
+            self.set()
+        else:
+            self.clear()
+
+    value = property(__getValue, __setValue)
+
+    def set(self):
+        self.Set_Time.value = Clock.monotonic()
+        self.Event.set()
+
+    def clear(self):
+        self.Event.clear()
+
+    def is_set(self):
+        return self.Event.is_set()
+
+    def wait(self, Timeout = None):
+        ''' Blocking until the flag is set. Returns True if the flag is set (False if the timeout is over). '''
+        if self.Event.is_set():
+            return True
+        if not self.Event.wait(Timeout):
+            return False
+        self.Latencies.append(Clock.monotonic() - self.Set_Time.value)
+        return True
+
+
+def waitAll(Flags, Timeout = None):
+    ''' Blocking until all the flags are set. Returns True if all of them are set. '''
+    Deadline = None if Timeout is None else Clock.monotonic() + Timeout
+    for Each in Flags:
+        if not Each.wait(None if Deadline is None else max(0, Deadline - Clock.monotonic())):
+            return False
+    return True
+
+
+def notifyOnExit(Done, Target, Args):
+    ''' Running Target(*Args) and setting the Done flag when it returns (also when it fails) '''
+    try:
+        Target(*Args)
+    finally:
+        Done.set()
+
+
+def startProcesses(Targets, Done = None):
+    '''
+    Starting one process per (Target, Args) in Targets. The Done flag is set as soon as any of them is finished.
+    Returns the processes and the Done flag.
+    '''
+    if Done is None:
+        Done = Flag()
+    Processes = [Process(target=notifyOnExit, args=(Done, Target, Args)) for (Target, Args) in Targets]
+    for Each in Processes:
+        Each.start()
+    return Processes, Done
+
+
+def waitFirst(Processes, Done, Timeout = None, Terminate = True):
+    '''
+    Blocking until the first of the processes started by startProcesses is finished, then terminating the others.
+    Returns True if one of the processes is finished.
+    '''
+    Finished = Done.wait(Timeout)
+    if Terminate:
+        for Each in Processes:
+            if Each.is_alive():
+                Each.terminate()
+            Each.join()
+    return Finished
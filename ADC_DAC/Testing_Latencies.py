@@ -5,7 +5,8 @@ Created on Wed Jul  6 14:53:46 2016
 @author: fred
 """
 
-import h5py
+import Lazy_Import as Lazy
+h5py = Lazy.module('h5py')
 #import DAQT7_Objective as DAQ
 import ADC_DAC_PiC
 import SeaBreeze_Objective as SBO
@@ -13,8 +14,9 @@ import ThorlabsPM100_Objective as P100
 import time
 #import datetime
 import numpy as np
-from multiprocessing import Process, Value, Array
-import matplotlib.pyplot as plt
+from multiprocessing import Process, Array
+import Sync_Events as Sync
+plt = Lazy.module('matplotlib.pyplot')
 import os.path
 
 time_start =  time.time()
@@ -31,9 +33,7 @@ def Timer_Multi_Process(Time_In_Seconds):
 
 def DAQ_Read_Process(No_DAC_Sample,):
     I = 0
-    while DAQ_Is_Read.value == 0:
-    #while I < Shutter_Index_Cycle[0]:
-    
+    while I < Shutter_Index_Cycle[0]:
         if  Shutter_Open.value == 1:
             Shutter_Open.value = 0
             DAQ1.writePort(Shutter_Port, 5)
@@ -68,6 +68,7 @@ def DAQ_Read_Process(No_DAC_Sample,):
         print (I)
         print (time.time())
     DAQ1.writePort(Shutter_Port, 0)
+    DAQ_Is_Read.value = 1
     
     
     
@@ -105,18 +106,14 @@ if __name__ == "__main__":
     DAQ1.writePort(Shutter_Port, 0)
     time.sleep(0.4)
     #Power_meter = P100.open()
-    Spec_Is_Read = Value('i', 0)
-    Spec_Is_Read.value = 0
-    Timer_Is_Done = Value('i', 0)
-    Timer_Is_Done.value = 0
-    Spec_Is_Done = Value('i', 0)
-    Spec_Is_Done.value = 0
-    DAQ_Is_Read = Value('i', 0)
-    DAQ_Is_Read.value = 0
-    Power_Is_Read = Value('i', 0)
-    Power_Is_Read.value = 0
-    Timer_Is_Over = Value('i', 0)
-    Timer_Is_Over.value = 0
+    # Flags which the processes can wait for without polling (see Sync_Events.py)
+    Spec_Is_Read = Sync.Flag()
+    Timer_Is_Done = Sync.Flag()
+    Spec_Is_Done = Sync.Flag()
+    DAQ_Is_Read = Sync.Flag()
+    Power_Is_Read = Sync.Flag()
+    Timer_Is_Over = Sync.Flag()
+    Shutter_Open = Sync.Flag()
 
     No_Shutter_Cycles = 20
     DurationOfReading = 0.010      # Duration of reading in seconds.
@@ -158,15 +155,14 @@ if __name__ == "__main__":
     Pros_Spec.start()
 
 
-    while((Spec_Is_Done.value == 0)):
-        if  Spec_Is_Read.value == 1:
-            Spec_Is_Read.value = 0
+    while not Spec_Is_Done.is_set():
+        if Spec_Is_Read.wait(0.1):
+            Spec_Is_Read.clear()
             Full_Spec_Records[:, np.int(Spec_Index[0])] = Current_Spec_Record[:]
     print('Spectrometer is done')
     '''
     II = 0 
-    while (DAQ_Is_Read.value == 0):
-        time.sleep(1)
+    while not DAQ_Is_Read.wait(1):         # Blocks until the DAQ process is done, printing the time every second
         print (time.time())
         '''        
         try:
@@ -5,7 +5,12 @@ To use this class and its functions, folowing syntax is recommended:
 import ThorlabsPM100_Objective
 Assuming that your device name is DeviceName then here are some sample commands:
 DeviceName = ThorlabsPM100_Objective.DetectPM100D()
+To open a particular power meter: DeviceName = ThorlabsPM100_Objective.DetectPM100D(Serial)
 To read power Power = DevieceName.readPower()
+To average N samples inside the power meter for every reading: DeviceName.setAverageCount(N) (one sample of the power meter takes about 3 ms)
+To read a burst of powers as NumPy arrays: Power, TimeIndex = DeviceName.readPowerBurst(No_Power_Sample)
+To read the power in the background: DeviceName.startReader(Power_Buffer), then DeviceName.waitReadings(Count, Timeout) and DeviceName.getReadings() while it runs,
+and Power, TimeIndex = DeviceName.stopReader() when it is not needed any more. The readings are appended to Power_Buffer (a growable Chunked_Buffer.ChunkedBuffer)
 
 To close the device: DeviceName.close()
 
@@ -31,58 +36,209 @@ June 24, 2016
 '''
 
 
-from ThorlabsPM100 import ThorlabsPM100, USBTMC
+import numpy as np
+import glob
+import json
 import os
+import threading
 import time
+import Clock_Service as Clock
+import Chunked_Buffer as CB
+import Lazy_Import as Lazy
+Driver = Lazy.module('ThorlabsPM100')          # Loaded when a usbtmc node is opened
+
+
+Sample_Period = 0.003           # Duration of one internal sample of the power meter (seconds)
+Cache_File = os.path.join(os.path.expanduser('~'), '.ThorlabsPM100_USBTMC.json')       # Cached {usbtmc node: [model, serial number]} of the discovered instruments
+
+
+def listUSBTMC():
+    ''' Returning the usbtmc device nodes (e.g., /dev/usbtmc0) '''
+    return sorted(glob.glob('/dev/usbtmc*'))
+
+
+def openUSBTMC(Node):
+    ''' Opening a usbtmc device node. On a permission error the node is made accessible and opened again. '''
+    try:
+        return Driver.USBTMC(device=Node)
+    except OSError, er:
+        if er.errno == 13:                  # ==> Permission denied: '/dev/usbtmcX'
+            os.system('sudo chmod 777 %s' % Node)
+            return Driver.USBTMC(device=Node)
+        raise
+
+
+def closeUSBTMC(Inst):
+    if hasattr(Inst, 'FILE'):
+        os.close(Inst.FILE)
+
+
+def identify(Inst):
+    ''' Returning the manufacturer, model, serial number and firmware of an instrument from its *IDN? answer '''
+    Inst.write("*IDN?")
+    Identity = [Field.strip() for Field in Inst.read(300).split(',')]
+    return (Identity + ['', '', '', ''])[:4]
+
+
+def loadDiscoveryCache():
+    ''' Returning the cached {device node: [model, serial number]} mapping of the usbtmc instruments '''
+    try:
+        with open(Cache_File) as File:
+            return json.load(File)
+    except (IOError, ValueError):
+        return {}
+
+
+def saveDiscoveryCache(Cache):
+    try:
+        with open(Cache_File, 'w') as File:
+            json.dump(Cache, File)
+    except IOError, er:
+        print ('Could not save the power meter discovery cache: %s' % er)
 
 
 class DetectPM100D:
     '''
     Initialization and detection of the Thorlab device
     '''
-    def __init__(self):
-        # Open first found LabJack
-        try:
-            USBTMC(device="/dev/usbtmc0")
-            inst = USBTMC(device="/dev/usbtmc0")
-            self.Handle = ThorlabsPM100(inst=inst)
-        except OSError, er0:
-            print ('er0:%s' % er0)
-            if er0.errno == 13:				# ==> Permission denied: '/dev/usbtmc0'
-                os.system('sudo chmod 777 /dev/usbtmc0')
-                inst = USBTMC(device="/dev/usbtmc0")
-                self.Handle = ThorlabsPM100(inst=inst)
-            elif er0.errno == 2:			# ==> [Errno 2] No such file or directory: '/dev/usbtmc0'
-                try:
-                    USBTMC(device="/dev/usbtmc1")
-                    inst = USBTMC(device="/dev/usbtmc1")
-                    self.Handle = ThorlabsPM100(inst=inst)
-                except OSError, er1:
-                    print ('er1:%s' % er1)
-                    if er1.errno == 13:		       # ==> Permission denied: '/dev/usbtmc1'
-                        os.system('sudo chmod 777 /dev/usbtmc1')
-                        inst = USBTMC(device="/dev/usbtmc1")
-                        self.Handle = ThorlabsPM100(inst=inst)
-                    elif er1.errno == 2:	# ==> [Errno 2] No such file or directory: '/dev/usbtmc1'
-                        try:
-                            USBTMC(device="/dev/usbtmc2")
-                            inst = USBTMC(device="/dev/usbtmc2")
-                            self.Handle = ThorlabsPM100(inst=inst)
-                        except OSError, er2:
-                            print ('er2:%s' % er2)
-                            if er2.errno == 13:		# ==> Permission denied: '/dev/usbtmc2'
-                                os.system('sudo chmod 777 /dev/usbtmc2')
-                                inst = USBTMC(device="/dev/usbtmc2")
-                                self.Handle = ThorlabsPM100(inst=inst)
-                            elif er2.errno == 2:	# ==> [Errno 2] No such file or directory: '/dev/usbtmc2'
-                                self.Error = 1
-                                print ("Power meter is not connected! \n")
-                                return
-
-        print ("A Thorlabs PM100 device is opened.")
-        self.Error = 0
+    def __init__(self, Serial = None):
+        '''
+        Serial is the serial number of the power meter to open. If it is None the first PM100 found is opened.
+        The usbtmc nodes are identified by *IDN? and the node to serial number mapping is cached, so the next start opens the right node first.
+        '''
+        self.Error = 1
+        Cache = loadDiscoveryCache()
+        Nodes = listUSBTMC()
+        # The cached nodes of the requested power meter are tried first
+        Cached = [Node for Node in Nodes if Node in Cache and ('PM100' in Cache[Node][0]) and (Serial is None or Cache[Node][1] == Serial)]
+        for Node in Cached + [Node for Node in Nodes if Node not in Cached]:
+            inst = None
+            try:
+                inst = openUSBTMC(Node)
+                Manufacturer, Model, Node_Serial, Firmware = identify(inst)
+                if ('PM100' in Model) and (Serial is None or Node_Serial == Serial):
+                    self.Handle = Driver.ThorlabsPM100(inst=inst)
+                    self.Node = Node
+                    self.Serial = Node_Serial
+                    self.Model = Model
+                    self.Error = 0
+            except (OSError, IOError), er:
+                print ('%s: %s' % (Node, er))
+                continue
+            finally:
+                if (inst is not None) and (self.Error == 1):      # The node is not used (or *IDN? failed), so it is closed before the next node is tried
+                    closeUSBTMC(inst)
+            if Cache.get(Node) != [Model, Node_Serial]:
+                Cache[Node] = [Model, Node_Serial]
+                saveDiscoveryCache(Cache)
+            if self.Error == 0:
+                break
+
+        if self.Error == 1:
+            print ("Power meter is not connected! \n")
+            return
+        print ("A Thorlabs %s device (serial number %s) is opened on %s." % (self.Model, self.Serial, self.Node))
         return
 
     def readPower(self):
         ''' This function returns the analogue value recorde on one of the AIN ports (e.g., 'AIN0') '''
-        return self.Handle.read, time.time()
+        return self.Handle.read, Clock.timestamp()
+
+
+    def setAverageCount(self, Count):
+        ''' Setting the number of samples averaged inside the power meter for each reading '''
+        self.Handle.sense.average.count = int(Count)
+
+
+    def getAverageCount(self):
+        return int(self.Handle.sense.average.count)
+
+
+    def setSamplingPeriod(self, Period):
+        '''
+        Setting the averaging count so that every reading covers Period seconds.
+        Reading at a lower but steady rate saves the USBTMC round trips of reading every sample.
+        '''
+        self.setAverageCount(max(1, int(round(Period/Sample_Period))))
+        return self.getAverageCount()*Sample_Period
+
+
+    def readPowerBurst(self, No_Power_Sample, Average_Count = None):
+        '''
+        Reading No_Power_Sample powers back to back. Returns NumPy arrays of the powers and the moments they were read (unix time).
+        If Average_Count is given then the averaging count of the power meter is set before the burst.
+        '''
+        if Average_Count is not None:
+            self.setAverageCount(Average_Count)
+        Power = np.zeros(No_Power_Sample, dtype = float)
+        TimeIndex = np.zeros(No_Power_Sample, dtype = float)
+        Handle = self.Handle
+        for I in range(No_Power_Sample):
+            Power[I] = Handle.read                  # Blocks on the USBTMC device until the averaged reading is ready
+            TimeIndex[I] = Clock.timestamp()
+        return Power, TimeIndex
+
+
+    def startReader(self, Buffer = None, Chunk_Rows = 4096):
+        '''
+        Starting a background thread that reads the power continuously and appends every reading to Buffer, a Chunked_Buffer.ChunkedBuffer
+        of width 1 which grows by chunks of Chunk_Rows readings, so no reading is lost however long the reader runs.
+        Without Buffer the buffer of the previous reader is reset and reused (or a new one is made). Reader_Condition is notified after every reading.
+        '''
+        if Buffer is None:
+            Buffer = getattr(self, 'Own_Buffer', None)
+            if Buffer is None or Buffer.Chunk_Rows != Chunk_Rows:
+                Buffer = self.Own_Buffer = CB.ChunkedBuffer(Width = 1, Chunk_Rows = Chunk_Rows)
+            Buffer.reset()
+        self.Reader_Buffer = Buffer
+        self.Reader_Start = len(Buffer)                 # The readings of this reader follow the rows already in the buffer
+        self.Reader_Condition = threading.Condition()
+        self.Reader_Stop = threading.Event()
+        self.Reader = threading.Thread(target=self.readerLoop)
+        self.Reader.daemon = True
+        self.Reader.start()
+
+
+    def readerLoop(self):
+        Handle = self.Handle
+        Buffer = self.Reader_Buffer
+        while not self.Reader_Stop.is_set():
+            Power = Handle.read                         # The GIL is released while waiting for the USBTMC device
+            TimeIndex = Clock.timestamp()
+            Buffer.append(Power, TimeIndex)             # The only writer of the buffer
+            with self.Reader_Condition:
+                self.Reader_Condition.notify_all()
+
+
+    def readCount(self):
+        ''' Returning the number of readings made since the reader is started '''
+        return len(self.Reader_Buffer) - self.Reader_Start
+
+
+    def waitReadings(self, Count, Timeout = None):
+        ''' Waiting (without polling) until Count readings are made since the reader is started. Returns the number of readings. '''
+        with self.Reader_Condition:
+            Deadline = None if Timeout is None else Clock.monotonic() + Timeout
+            while self.readCount() < Count and self.Reader.is_alive():
+                if Deadline is not None:
+                    if Clock.monotonic() >= Deadline:
+                        break
+                    self.Reader_Condition.wait(Deadline - Clock.monotonic())
+                else:
+                    self.Reader_Condition.wait(0.1)
+            return self.readCount()
+
+
+    def getReadings(self):
+        ''' Returning copies of the powers and times read since the reader is started, in the order they are read '''
+        Count = len(self.Reader_Buffer)                 # Rows are complete up to the fill level, also while the reader runs
+        Power = self.Reader_Buffer.values()[self.Reader_Start:Count, 0]
+        TimeIndex = self.Reader_Buffer.times()[self.Reader_Start:Count]
+        return Power, TimeIndex
+
+
+    def stopReader(self):
+        ''' Stopping the background reader after its current reading and returning the readings (which are also in its buffer) '''
+        self.Reader_Stop.set()
+        self.Reader.join()
+        return self.getReadings()
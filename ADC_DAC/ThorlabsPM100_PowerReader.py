@@ -1,8 +1,9 @@
 import numpy as np
 import time
-import h5py
+import Lazy_Import as Lazy
+h5py = Lazy.module('h5py')
 import datetime
-import matplotlib.pyplot as plt
+plt = Lazy.module('matplotlib.pyplot')
 import ThorlabsPM100_Objective
 
 
@@ -21,6 +21,10 @@ import subprocess
 import io
 import threading
 
+# The event-driven waits are shared with the acquisition scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ADC_DAC'))
+import Sync_Events as Sync
+
 
 BRIGHTNESS_MIN = 0
 BRIGHTNESS_MAX = 100
@@ -208,6 +212,16 @@ class cameraModuleServer:
 				break
 		
 	
+	def waitFirstProcess(self, targets):
+		'''
+		Start a process for each (target, args) pair, and block until the 
+		first one finishes. The remaining processes are then terminated.
+		'''
+		
+		procs, done = Sync.startProcesses(targets)
+		Sync.waitFirst(procs, done)
+		
+	
 	def capturePhoto(self, fname):
 		'''
 		Capture a photo and store on Pi.
@@ -263,20 +277,24 @@ class cameraModuleServer:
 		# Start recording
 		self.camera.start_recording(output, format='mjpeg')
 		
-		# Start the trigger process
+		# Start the trigger process, <done> is set when it returns
 		self.trigger.value = 0
 		fn = sys.stdin.fileno()
-		pt = Process(target = self.paraTrigger, args=(fn,))
-		pt.start()
+		procs, done = Sync.startProcesses([(self.paraTrigger, (fn,))])
+		
+		# The loop wakes up on the trigger, or once per frame to check the recorded frames
+		frame_period = 1.0/float(self.camera.framerate)
 		
 		while True:
 			# End condition
 			if endflag == 1 and self.imno == len(output.fnames):
-				pt.terminate()
+				procs[0].terminate()
 				break
 			
 			# Condition for when the trigger is triggered
-			if not pt.is_alive():
+			if done.wait(frame_period):
+				procs[0].join()
+				
 				# Save the frame number
 				if self.trigger.value == 1:
 					self.trigtime.append(self.camera.timestamp)
@@ -287,10 +305,8 @@ class cameraModuleServer:
 					endflag = 1
 
 				# Restart the trigger process
-				pt.terminate()
 				self.trigger.value = 0
-				pt = Process(target = self.paraTrigger, args=(fn,))
-				pt.start()
+				procs, done = Sync.startProcesses([(self.paraTrigger, (fn,))])
 			
 			# Determine whether the current frame was recorded when the trigger occured
 			if len(self.trigtime) > 0:
@@ -326,28 +342,27 @@ class cameraModuleServer:
 		pt.start()
 
 		while True:
-			# Condition for when the trigger is triggered
-			if not pt.is_alive():
-				if self.trigger.value == 1:
-					# Capture an image and store in file <fname>
-					fname = "../../Images/Image" + datetime.datetime.now().isoformat() + ".jpg"
-					self.fnames.append(fname)
-					self.ind += 1
-					self.start = time.time()
-					self.camera.capture(fname,'jpeg')
-					self.end = time.time()
-					print("Captured in: " + str(self.end-self.start) + " seconds")
-				
-				# Quit the loop
-				elif self.trigger.value == 2:
-					pt.terminate()
-					break
-				
-				# Restart the trigger process
-				pt.terminate()
-				self.trigger.value = 0
-				pt = Process(target = self.paraTrigger, args=(fn,))
-				pt.start()
+			# Block until the trigger process returns, instead of polling it
+			pt.join()
+			
+			if self.trigger.value == 1:
+				# Capture an image and store in file <fname>
+				fname = "../../Images/Image" + datetime.datetime.now().isoformat() + ".jpg"
+				self.fnames.append(fname)
+				self.ind += 1
+				self.start = time.time()
+				self.camera.capture(fname,'jpeg')
+				self.end = time.time()
+				print("Captured in: " + str(self.end-self.start) + " seconds")
+			
+			# Quit the loop
+			elif self.trigger.value == 2:
+				break
+			
+			# Restart the trigger process
+			self.trigger.value = 0
+			pt = Process(target = self.paraTrigger, args=(fn,))
+			pt.start()
 		
 		# Close the camera preview
 		self.camera.stop_preview()
@@ -369,17 +384,8 @@ class cameraModuleServer:
 		self.camera.start_recording("../../Videos/input.h264")
 		
 		if self.network == 1:
-			# Set up camera wait processes
-			p1 = Process(target = self.waitProcess, args=(duration,))
-			p2 = Process(target = self.stopProcess)
-		
 			# Multiprocessing to determine when to stop recording
-			p1.start()
-			p2.start()
-			while p1.is_alive() and p2.is_alive():
-				continue
-			p1.terminate()
-			p2.terminate()
+			self.waitFirstProcess([(self.waitProcess, (duration,)), (self.stopProcess, ())])
 		else:
 			try:
 				self.camera.wait_recording(duration)
@@ -400,10 +406,6 @@ class cameraModuleServer:
 		'''
 		
 		if self.network == 1:
-			# Set up camera wait processes
-			p1 = Process(target = self.waitProcess, args=(duration,))
-			p2 = Process(target = self.stopProcess)
-
 			# Send framerate to client
 			self.send_msg(sock, str(self.camera.framerate))
 			
@@ -418,12 +420,7 @@ class cameraModuleServer:
 				self.camera.start_recording(connection, format = 'h264')
 				
 				# Multiprocessing to determine when to stop recording
-				p1.start()
-				p2.start()
-				while p1.is_alive() and p2.is_alive():
-					continue
-				p1.terminate()
-				p2.terminate()
+				self.waitFirstProcess([(self.waitProcess, (duration,)), (self.stopProcess, ())])
 				
 				# Stop recording once one process has finished
 				self.camera.stop_recording()
@@ -441,10 +438,6 @@ class cameraModuleServer:
 		'''
 			
 		if self.network == 1:
-			# Set up camera wait processes
-			p1 = Process(target = self.delayProcess, args=(duration,))
-			p2 = Process(target = self.stopProcess)
-
 			# Send framerate to client
 			self.send_msg(self.hostSock, str(self.camera.framerate))
 
@@ -454,12 +447,7 @@ class cameraModuleServer:
 			self.camera.start_recording(pcm.stdin, format='h264')
 			
 			# Multiprocessing to determine when to stop recording
-			p1.start()
-			p2.start()
-			while p1.is_alive() and p2.is_alive():
-				continue
-			p1.terminate()
-			p2.terminate()
+			self.waitFirstProcess([(self.delayProcess, (duration,)), (self.stopProcess, ())])
 			
 			# Stop recording
 			self.camera.stop_recording()